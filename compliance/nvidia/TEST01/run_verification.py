@@ -57,7 +57,10 @@ def main():
         "--dtype", default="byte", choices=["byte", "float32", "int32", "int64"], help="data type of the label (not needed in unixmode")
     parser.add_argument(
         "--unixmode", action="store_true",
-        help="Use UNIX commandline utilities to verify accuracy (uses less memory but much slower.")
+        help="Compare whole payloads instead of their first element. No UNIX commandline utility is needed anymore.")
+    parser.add_argument(
+        "--num_workers", "-j", type=int, default=1,
+        help="Number of processes verify_accuracy.py uses to scan each accuracy log.")
 
     args = parser.parse_args()
 
@@ -68,19 +71,12 @@ def main():
     unixmode = ""
     if args.unixmode:
         unixmode = " --unixmode"
-        for binary in ["wc", "md5sum", "grep", "awk", "sed", "head", "tail"]:
-            missing_binary = False
-            if shutil.which(binary) == None:
-                print("Error: This script requires the {:} commandline utility".format(binary))
-                missing_binary = True
-        if missing_binary:
-            exit()
 
     dtype = args.dtype
 
     verify_accuracy_binary = os.path.join(os.path.dirname(__file__),"verify_accuracy.py")
     # run verify accuracy
-    verify_accuracy_command = "python3 " + verify_accuracy_binary + " --dtype " + args.dtype + unixmode + " -r " + results_dir + "/accuracy/mlperf_log_accuracy.json" + " -t " + compliance_dir + "/mlperf_log_accuracy.json | tee verify_accuracy.txt"
+    verify_accuracy_command = "python3 " + verify_accuracy_binary + " --dtype " + args.dtype + unixmode + " -j " + str(args.num_workers) + " -r " + results_dir + "/accuracy/mlperf_log_accuracy.json" + " -t " + compliance_dir + "/mlperf_log_accuracy.json | tee verify_accuracy.txt"
     try:
         os.system(verify_accuracy_command)
     except Exception:
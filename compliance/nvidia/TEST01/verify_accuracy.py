@@ -14,16 +14,19 @@
 # limitations under the License.
 # =============================================================================
 import os
-import subprocess
 import sys
-import shutil
 sys.path.append(os.getcwd())
 
 import argparse
-import json
+import binascii
+import hashlib
+import multiprocessing
 
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import BinaryAccuracyLog, is_binary_accuracy_log, iter_raw_records, parse_record
+
 dtype_map = {
     "byte": np.byte,
     "float32": np.float32,
@@ -31,9 +34,43 @@ dtype_map = {
     "int64": np.int64
 }
 
-def main():
 
-    py3 = sys.version_info >= (3,0)
+def summarize(qsl_idx, payload, dtype):
+    """Returns the (qsl_idx, digest, first element, size in bytes) kept for one record instead of its payload."""
+    first = np.frombuffer(payload[:dtype.itemsize], dtype)[0] if len(payload) >= dtype.itemsize else None
+    return qsl_idx, hashlib.md5(payload).digest(), first, len(payload)
+
+
+def scan_range(path, dtype, begin=0, stop=None):
+    """Summarizes the records of a JSON accuracy log whose opening brace lies in [begin, stop)."""
+    dtype = np.dtype(dtype)
+    summaries = []
+    with open(path, "rb") as f:
+        for raw in iter_raw_records(f, begin=begin, stop=stop):
+            fields = parse_record(raw)
+            summaries.append(summarize(fields["qsl_idx"], binascii.unhexlify(fields["data"]), dtype))
+    return summaries
+
+
+def scan_log(path, dtype, num_workers=1):
+    """Summaries of all the records of an accuracy log, in file order.
+
+    JSON logs are split into num_workers byte ranges that are scanned in parallel.
+    """
+    if is_binary_accuracy_log(path):
+        log = BinaryAccuracyLog(path)
+        return [summarize(qsl_idx, data.tobytes(), np.dtype(dtype)) for _, qsl_idx, data in log]
+
+    if num_workers <= 1:
+        return scan_range(path, dtype)
+    size = os.path.getsize(path)
+    bounds = [size * i // num_workers for i in range(num_workers + 1)]
+    with multiprocessing.Pool(num_workers) as pool:
+        ranges = pool.starmap(scan_range, [(path, dtype, bounds[i], bounds[i + 1]) for i in range(num_workers)])
+    return [summary for summaries in ranges for summary in summaries]
+
+
+def main():
     # Parse arguments to identify the path to the accuracy logs from
     #   the accuracy and performance runs
     parser = argparse.ArgumentParser()
@@ -50,135 +87,72 @@ def main():
     parser.add_argument(
         "--dtype", default="byte", choices=["byte", "float32", "int32", "int64"], help="data type of the label")
 
+    parser.add_argument(
+        "--num_workers", "-j", type=int, default=1,
+        help="Number of processes used to scan each log. Useful for multi-GB logs.")
+
     parser.add_argument(
         "--unixmode", action="store_true",
-        help="Use unix commandline utilities instead of python JSON library (uses less memory but much slower.")
+        help="This flag has been deprecated. The logs are always streamed with bounded memory. As before, it compares whole payloads instead of their first element.")
 
     parser.add_argument(
         "--fastmode", action="store_true",
-        help="This flag has been deprecated. This script runs in fastmode by default. Use --unixmode to run in low memory consumption mode.")
+        help="This flag has been deprecated. This script runs in fastmode by default.")
     args = parser.parse_args()
 
     print("Verifying accuracy. This might take a while...")
     acc_log  = args.reference_accuracy
     perf_log = args.test_accuracy
-
-    if not args.unixmode:
-        with open(acc_log, "r") as acc_json:
-            acc_data = json.load(acc_json)
-
-        with open(perf_log, "r") as perf_json:
-            perf_data = json.load(perf_json)
-
-        # read accuracy log json and create a dictionary of qsl_idx/data pairs
-        results_dict = {}
-        num_acc_log_duplicate_keys = 0
-        num_acc_log_data_mismatch = 0
-        num_perf_log_qsl_idx_match = 0
-        num_perf_log_data_mismatch = 0
-        num_missing_qsl_idxs = 0
-
-        print("Reading accuracy mode results...")
-        for sample in acc_data:
-            #print sample["qsl_idx"]
-            qsl_idx = sample["qsl_idx"]
-            data = sample["data"]
-            if data == '':
-                data = ""
-            if qsl_idx in results_dict.keys():
-                num_acc_log_duplicate_keys += 1
-                if results_dict[qsl_idx] != data:
-                    num_acc_log_data_mismatch += 1
-            else:
-                results_dict[qsl_idx] = data
-
-        print("Reading performance mode results...")
-        for sample in perf_data:
-            qsl_idx = sample["qsl_idx"]
-            data = np.frombuffer(bytes.fromhex(sample['data']), dtype_map[args.dtype]) if py3 == True \
-                else np.frombuffer(bytearray.fromhex(sample['data']), dtype_map[args.dtype])
-
-            if qsl_idx in results_dict.keys():
-                num_perf_log_qsl_idx_match += 1
-                data_perf = np.frombuffer(bytes.fromhex(results_dict[qsl_idx]), dtype_map[args.dtype]) \
-                    if py3 == True else np.frombuffer(bytearray.fromhex(results_dict[qsl_idx]), dtype_map[args.dtype])
-                if data_perf.size == 0 or data.size == 0:
-                    if data_perf.size != data.size:
-                        num_perf_log_data_mismatch += 1
-                elif data[0] != data_perf[0]:
+    dtype = dtype_map[args.dtype]
+    compare_whole_payload = args.unixmode
+
+    # Index of the accuracy log: qsl_idx -> (digest, first element, size) of its payload
+    results_dict = {}
+    num_acc_log_entries = 0
+    num_acc_log_duplicate_keys = 0
+    num_acc_log_data_mismatch = 0
+    num_perf_log_entries = 0
+    num_perf_log_qsl_idx_match = 0
+    num_perf_log_data_mismatch = 0
+    num_missing_qsl_idxs = 0
+
+    print("Reading accuracy mode results...")
+    for qsl_idx, digest, first, size in scan_log(acc_log, dtype, args.num_workers):
+        num_acc_log_entries += 1
+        if qsl_idx in results_dict:
+            num_acc_log_duplicate_keys += 1
+            if results_dict[qsl_idx][0] != digest:
+                num_acc_log_data_mismatch += 1
+        else:
+            results_dict[qsl_idx] = (digest, first, size)
+
+    print("Reading performance mode results...")
+    for qsl_idx, digest, first, size in scan_log(perf_log, dtype, args.num_workers):
+        num_perf_log_entries += 1
+        if qsl_idx in results_dict:
+            num_perf_log_qsl_idx_match += 1
+            acc_digest, acc_first, acc_size = results_dict[qsl_idx]
+            if compare_whole_payload:
+                if digest != acc_digest:
                     num_perf_log_data_mismatch += 1
-            else:
-                num_missing_qsl_idxs += 1
-
-            results_dict[sample["qsl_idx"]] = sample["data"]
-
-
-        print("num_acc_log_entries = {:}".format(len(acc_data)))
-        print("num_acc_log_duplicate_keys = {:}".format(num_acc_log_duplicate_keys))
-        print("num_acc_log_data_mismatch = {:}".format(num_acc_log_data_mismatch))
-        print("num_perf_log_entries = {:}".format(len(perf_data)))
-        print("num_perf_log_qsl_idx_match = {:}".format(num_perf_log_qsl_idx_match))
-        print("num_perf_log_data_mismatch = {:}".format(num_perf_log_data_mismatch))
-        print("num_missing_qsl_idxs = {:}".format(num_missing_qsl_idxs))
-        if num_perf_log_data_mismatch == 0 and num_perf_log_qsl_idx_match > 0:
-            print("TEST PASS\n")
+            elif acc_size == 0 or size == 0:
+                if acc_size != size:
+                    num_perf_log_data_mismatch += 1
+            elif first != acc_first:
+                num_perf_log_data_mismatch += 1
         else:
-            print("TEST FAIL\n")
-        exit()
-
-    py33 = sys.version_info >= (3,3)
-
-    if not py33:
-        print("Error: This script requires Python v3.3 or later")
-        exit()
+            num_missing_qsl_idxs += 1
 
+        results_dict[qsl_idx] = (digest, first, size)
 
-    get_perf_lines_cmd = "wc -l " + perf_log + "| awk '{print $1}'"
-    num_perf_lines = int(subprocess.check_output(get_perf_lines_cmd, shell=True).decode("utf-8"))
-
-    get_acc_lines_cmd = "wc -l " + acc_log + "| awk '{print $1}'"
-    num_acc_lines = int(subprocess.check_output(get_acc_lines_cmd, shell=True).decode("utf-8"))
-
-    num_acc_log_entries = num_acc_lines - 2
-    num_perf_log_entries = num_perf_lines - 2
-    #print(perf_qsl_idx)
-    #print(get_perf_lines_cmd)
-    #print(num_perf_lines)
-    
-    num_perf_log_data_mismatch = 0
-    num_perf_log_data_match = 0
-    print("Each dot represents 1% completion:")
-    for perf_line in range(0, num_perf_lines):
-        if perf_line % int(num_perf_lines/100) == 0:
-            sys.stdout.write(".")
-            sys.stdout.flush()
-        # first and last line are brackets
-        if perf_line == 0 or perf_line == int(num_perf_lines)-1:
-            continue
-
-        # calculate md5sum of line in perf mode accuracy_log
-        perf_md5sum_cmd = "head -n " + str(perf_line + 1) + " " + perf_log + "| tail -n 1| sed -r 's/,//g' | sed -r 's/\"seq_id\" : \S+//g' | md5sum"
-        #print(perf_md5sum_cmd)
-        perf_md5sum = subprocess.check_output(perf_md5sum_cmd, shell=True).decode("utf-8")
-
-        # get qsl idx
-        get_qsl_idx_cmd = "head -n " + str(perf_line + 1) + " " + perf_log + "| tail -n 1| awk -F\": |,\" '{print $4}'"
-        qsl_idx = subprocess.check_output(get_qsl_idx_cmd, shell=True).decode("utf-8").rstrip()
-
-        # calculate md5sum of line in acc mode accuracy_log
-        acc_md5sum_cmd = "grep \"qsl_idx\\\" : " + qsl_idx + ",\" " + acc_log + "| sed -r 's/,//g' | sed -r 's/\"seq_id\" : \S+//g' | md5sum"
-        acc_md5sum = subprocess.check_output(acc_md5sum_cmd, shell=True).decode("utf-8")
-
-        if perf_md5sum != acc_md5sum:
-            num_perf_log_data_mismatch += 1
-        else:
-            num_perf_log_data_match += 1
-
-    print("")
     print("num_acc_log_entries = {:}".format(num_acc_log_entries))
-    print("num_perf_log_data_mismatch = {:}".format(num_perf_log_data_mismatch))
+    print("num_acc_log_duplicate_keys = {:}".format(num_acc_log_duplicate_keys))
+    print("num_acc_log_data_mismatch = {:}".format(num_acc_log_data_mismatch))
     print("num_perf_log_entries = {:}".format(num_perf_log_entries))
-    if num_perf_log_data_mismatch == 0 and num_perf_log_data_match > 0:
+    print("num_perf_log_qsl_idx_match = {:}".format(num_perf_log_qsl_idx_match))
+    print("num_perf_log_data_mismatch = {:}".format(num_perf_log_data_mismatch))
+    print("num_missing_qsl_idxs = {:}".format(num_missing_qsl_idxs))
+    if num_perf_log_data_mismatch == 0 and num_perf_log_qsl_idx_match > 0:
         print("TEST PASS\n")
     else:
         print("TEST FAIL\n")
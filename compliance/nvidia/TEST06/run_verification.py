@@ -17,10 +17,12 @@ import os
 import sys
 import shutil
 import argparse
-import json
 
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import AccuracyLogReader
+
 EOS_TOKEN = 2
 DTYPE_MAP = {
     "int64": np.int64,
@@ -42,9 +44,9 @@ def get_args():
     args = parser.parse_args()
     return args
 
-def eos_check(acc_data, dtype):
+def eos_check(acc_data):
     for sample in acc_data:
-        data = np.frombuffer(bytes.fromhex(sample["data"]), dtype=dtype)
+        data = sample.data
         i = data.shape[0] - 1
         n_eos_tokens = 0
         while (i > 0):
@@ -57,10 +59,12 @@ def eos_check(acc_data, dtype):
             i-=1
     return True
 
-def first_token_check(acc_data, dtype):
+def first_token_check(acc_data):
     for sample in acc_data:
-        data = np.frombuffer(bytes.fromhex(sample["data"]), dtype=dtype)
-        token_data = np.frombuffer(bytes.fromhex(sample["token_data"]), dtype=dtype)
+        data = sample.data
+        token_data = sample.token_data
+        if token_data is None:
+            raise KeyError("token_data")
         print(token_data)
         for t1, t2 in zip(data, token_data):
             if t1 != t2:
@@ -72,11 +76,11 @@ def main():
     args = get_args()
     accuracy_file = os.path.join(args.compliance_dir, "mlperf_log_accuracy.json")
     
-    with open(accuracy_file, "r") as acc_json:
-        acc_data = json.load(acc_json)
+    # Each check streams the log again instead of holding it in memory
+    acc_data = AccuracyLogReader(accuracy_file, DTYPE_MAP[args.dtype], token_data=True)
     
     try:
-        eos_pass = eos_check(acc_data, DTYPE_MAP[args.dtype])
+        eos_pass = eos_check(acc_data)
     except Exception:
         print("Unexpected error occured while doing the EOS check")
         eos_pass = False
@@ -85,7 +89,7 @@ def main():
     first_token_pass = True
     if need_first_token_check:
         try:
-            first_token_pass = first_token_check(acc_data, DTYPE_MAP[args.dtype])
+            first_token_pass = first_token_check(acc_data)
         except Exception:
             print("Unexpected error occured while doing the first token check")
             first_token_pass = False
@@ -54,6 +54,9 @@ elif "torch" in installed:
 import tokenization
 from create_squad_data import convert_examples_to_features, read_squad_examples
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools", "accuracy_log"))
+from accuracy_log import read_accuracy_log
+
 max_seq_length = 384
 max_query_length = 64
 doc_stride = 128
@@ -343,19 +346,12 @@ def write_predictions(all_examples, all_features, all_results, n_best_size,
 
 
 def load_loadgen_log(log_path, eval_features, dtype=np.float32, output_transposed=False):
-    with open(log_path) as f:
-        predictions = json.load(f)
-
     results = []
-    for prediction in predictions:
-        qsl_idx = prediction["qsl_idx"]
+    for _, qsl_idx, logits in read_accuracy_log(log_path, dtype):
         if output_transposed:
-            logits = np.frombuffer(bytes.fromhex(
-                prediction["data"]), dtype).reshape(2, -1)
-            logits = np.transpose(logits)
+            logits = np.transpose(logits.reshape(2, -1))
         else:
-            logits = np.frombuffer(bytes.fromhex(
-                prediction["data"]), dtype).reshape(-1, 2)
+            logits = logits.reshape(-1, 2)
         # Pad logits to max_seq_length
         seq_length = logits.shape[0]
         start_logits = np.ones(max_seq_length) * -10000.0
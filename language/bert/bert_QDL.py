@@ -15,114 +15,127 @@
 
 
 import threading
-import requests
-import array
-import time
+import queue
+import json
 import os
 import sys
 sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lon"))
 import numpy as np
 
 import mlperf_loadgen as lg
 import squad_QSL
-from time import sleep
+from network_client import NetworkClient
 
 class bert_QDL:
     """QDL acting as a proxy to the SUT.
-    This QDL communicates with the SUT via HTTP.
-    It uses two endpoints to communicate with the SUT:
-    - /predict/ : Send a query to the SUT and get a response.
-    - /getname/ : Get the name of the SUT. Send a getname to the SUT and get a response.
+    This QDL communicates with the SUT over TCP using the binary protocol in lon/network_protocol.py.
+    It uses two message types to communicate with the SUT:
+    - MSG_PREDICT : Send a query to the SUT and get a response.
+    - MSG_GET_NAME : Get the name of the SUT. Send a getname to the SUT and get a response.
+
+    Each SUT node is served by a pool of persistent connections on which requests are pipelined
+    (see lon/network_client.py). Responses are completed from the connections' receiver threads.
+    The node receiving each query is chosen by a dispatch policy (see lon/dispatch.py).
     """
 
-    def __init__(self, qsl: squad_QSL.SQuAD_v1_QSL, sut_server_addr: list):
+    def __init__(self, qsl: squad_QSL.SQuAD_v1_QSL, sut_server_addr: list,
+                 connections_per_node=2, max_inflight_per_node=64, num_dispatch_threads=1,
+                 dispatch_policy="round_robin"):
         """
         Constructor for the QDL.
         Args:
             qsl: The QSL to use.
             sut_server_addr: A list of addresses of the SUT.
+            connections_per_node: Number of persistent connections opened to each SUT node.
+            max_inflight_per_node: Maximum number of outstanding requests per SUT node.
+            num_dispatch_threads: Number of threads encoding and sending the issued samples.
+            dispatch_policy: round_robin, least_outstanding, power_of_two or weighted.
         """
         self.qsl = qsl
         self.quantized = False
+
+        self.sut_server_addr = sut_server_addr
+        self.num_nodes = len(sut_server_addr)
+        self.client = NetworkClient(sut_server_addr, connections_per_node, max_inflight_per_node, dispatch_policy)
  
         # Construct QDL from the python binding
         self.qdl = lg.ConstructQDL(
             self.issue_query, self.flush_queries, self.client_get_name)
-        self.sut_server_addr = sut_server_addr
-        self.num_nodes = len(sut_server_addr)
 
-        # For round robin between the SUTs:
-        self.next_sut_id = 0
-        self.lock = threading.Lock()
+        # Issued samples are handed to a fixed pool of dispatch threads
+        self.issue_queue = queue.Queue()
+        self.dispatch_threads = [threading.Thread(target=self.dispatch_worker, daemon=True)
+                                 for _ in range(num_dispatch_threads)]
+        for t in self.dispatch_threads:
+            t.start()
 
     def issue_query(self, query_samples):
         """Process the query to send to the SUT"""
-        threading.Thread(target=self.process_query_async,
-                         args=[query_samples]).start()
+        self.issue_queue.put(query_samples)
 
     def flush_queries(self):
         """Flush the queries. Dummy implementation."""
         pass
 
+    def dispatch_worker(self):
+        while True:
+            query_samples = self.issue_queue.get()
+            if query_samples is None:
+                break
+            self.process_query_async(query_samples)
+
     def process_query_async(self, query_samples):
         """
-        This function is called by the Loadgen in a separate thread.
+        This function is called from a dispatch thread.
         It is responsible for
             1. Creating a query for the SUT, by reading the features from the QSL.
             2. Sending the query to the SUT.
-            3. Waiting for the response from the SUT.
-            4. Deserializing the response.
-            5. Calling mlperf_loadgen.QuerySamplesComplete(query_samples, response)
+        The response is deserialized and completed with mlperf_loadgen.QuerySamplesComplete
+        by the receiver thread of the connection (see client_predict_done).
         Args:
             query_samples: A list of QuerySample objects.
         """
-
-        max_num_threads = int(os.environ.get('CM_MAX_NUM_THREADS', os.cpu_count()))
-
         for i in range(len(query_samples)):
             eval_features = self.qsl.get_features(query_samples[i].index)
             encoded_eval_features = {
-                    "input_ids": eval_features.input_ids,
-                    "input_mask": eval_features.input_mask,
-                    "segment_ids": eval_features.segment_ids
+                    "input_ids": np.array(eval_features.input_ids, dtype=np.int32)[np.newaxis, :],
+                    "input_mask": np.array(eval_features.input_mask, dtype=np.int32)[np.newaxis, :],
+                    "segment_ids": np.array(eval_features.segment_ids, dtype=np.int32)[np.newaxis, :]
                     }
-            n = threading.active_count()
-            while n >= max_num_threads:
-                sleep(0.0001)
-                n = threading.active_count()
-            threading.Thread(target=self.client_predict_worker,
-                         args=[encoded_eval_features, query_samples[i].id]).start()
-
-
-    def get_sut_id_round_robin(self):
-        """Get the SUT id in round robin."""
-        with self.lock:
-            res = self.next_sut_id
-            self.next_sut_id = (self.next_sut_id + 1) % self.num_nodes
-        return res
-
-    def client_predict_worker(self, query, query_id):
-        """Serialize the query, send it to the SUT in round robin, and return the deserialized response."""
-        url = '{}/predict/'.format(self.sut_server_addr[self.get_sut_id_round_robin()])
-        responses = []
-        response = requests.post(url, json={'query': query})
-        output = response.json()['result']
-        output = np.array(output).astype(np.float32)
-        response_array = array.array("B", output.tobytes())
-        bi = response_array.buffer_info()
-
-        responses.append(lg.QuerySampleResponse(query_id, bi[0], bi[1]))
-        lg.QuerySamplesComplete(responses)
+            self.client_predict(encoded_eval_features, query_samples[i].id)
+
+    def client_predict(self, query, query_id):
+        """Serialize the query and send it to the SUT chosen by the dispatch policy. Blocks only if the node is at its in-flight limit."""
+        self.client.predict(query, lambda result, error: self.client_predict_done(query_id, result, error))
+
+    def client_predict_done(self, query_id, result, error):
+        """Deserialize the response and complete the sample."""
+        if error is not None:
+            print("Request for query {} failed: {}".format(query_id, error))
+            output = np.zeros(0, dtype=np.float32)
+        else:
+            output = np.ascontiguousarray(result['result'][0], dtype=np.float32)
+        lg.QuerySamplesCompleteBuffers([query_id], [output])
 
     def client_get_name(self):
         """Get the name of the SUT from ALL the SUTS."""
-        if len(self.sut_server_addr) == 1:
-            return requests.post(f'{self.sut_server_addr[0]}/getname/').json()['name']
-    
-        sut_names = [requests.post(f'{addr}/getname/').json()['name'] for addr in self.sut_server_addr]
+        sut_names = [self.client.get_name(i) for i in range(self.num_nodes)]
+        if len(sut_names) == 1:
+            return sut_names[0]
         return "Multi-node SUT: " + ', '.join(sut_names)
 
+    def report_stats(self, path=None):
+        """Print the per-node in-flight and latency counters, and optionally write them to a json file."""
+        stats = self.client.stats()
+        for node_id, node in enumerate(stats):
+            print("SUT node {}: {}".format(node_id, node))
+        if path:
+            with open(path, "w") as f:
+                json.dump(stats, f, indent=4)
+
     def __del__(self):
+        for _ in self.dispatch_threads:
+            self.issue_queue.put(None)
+        self.client.close()
         lg.DestroyQDL(self.qdl)
-
-
@@ -24,8 +24,13 @@ import bert_QDL
 
 def set_args(argv, g_settings, g_log_settings, g_audit_conf, g_sut_server, g_backend, g_total_count_override=None, g_perf_count_override=None):
 
-    global settings, log_settings, audit_conf, sut_server, total_count_override, perf_count_override, backend
+    global settings, log_settings, audit_conf, sut_server, total_count_override, perf_count_override, backend, qdl_kwargs
     sys.argv = sys.argv[0:1]
+    qdl_kwargs = {
+        "connections_per_node": argv.connections_per_node,
+        "max_inflight_per_node": argv.max_inflight_per_node,
+        "dispatch_policy": argv.dispatch_policy,
+    }
     settings = g_settings
     log_settings = g_log_settings
     audit_conf = g_audit_conf
@@ -36,9 +41,10 @@ def set_args(argv, g_settings, g_log_settings, g_audit_conf, g_sut_server, g_bac
 
 def main(argv):
         qsl = squad_QSL.get_squad_QSL(total_count_override, perf_count_override)
-        qdl = bert_QDL.bert_QDL(qsl, sut_server_addr=sut_server)
+        qdl = bert_QDL.bert_QDL(qsl, sut_server_addr=sut_server, **qdl_kwargs)
 
         lg.StartTestWithLogSettings(qdl.qdl, qsl.qsl, settings, log_settings, audit_conf)
+        qdl.report_stats(os.path.join(log_settings.log_output.outdir, "network_dispatch_stats.json"))
 
 
 if __name__ == "__main__":
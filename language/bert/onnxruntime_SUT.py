@@ -15,7 +15,6 @@
 # limitations under the License.
 
 import threading
-import array
 import json
 import os
 import sys
@@ -70,39 +69,36 @@ class BERT_ONNXRuntime_SUT():
 
     def process_sample(self, eval_features, query_id=None):
 
-        '''For Loadgen over the network'''
+        '''For Loadgen over the network, eval_features is a batch: a dict of [N, max_seq_length] arrays'''
         if self.network == "sut":
-            input_ids = eval_features['input_ids']
-            input_mask = eval_features['input_mask']
-            segment_ids = eval_features['segment_ids']
+            input_ids = np.asarray(eval_features['input_ids'], dtype=np.int64)
+            input_mask = np.asarray(eval_features['input_mask'], dtype=np.int64)
+            segment_ids = np.asarray(eval_features['segment_ids'], dtype=np.int64)
         else:
-            input_ids = eval_features.input_ids
-            input_mask = eval_features.input_mask
-            segment_ids = eval_features.segment_ids
+            input_ids = np.array(eval_features.input_ids).astype(np.int64)[np.newaxis, :]
+            input_mask = np.array(eval_features.input_mask).astype(np.int64)[np.newaxis, :]
+            segment_ids = np.array(eval_features.segment_ids).astype(np.int64)[np.newaxis, :]
 
         if self.quantized:
             fd = {
-                "input_ids": np.array(input_ids).astype(np.int64)[np.newaxis, :],
-                "attention_mask": np.array(input_mask).astype(np.int64)[np.newaxis, :],
-                "token_type_ids": np.array(segment_ids).astype(np.int64)[np.newaxis, :]
+                "input_ids": input_ids,
+                "attention_mask": input_mask,
+                "token_type_ids": segment_ids
             }
         else:
             fd = {
-                "input_ids": np.array(input_ids).astype(np.int64)[np.newaxis, :],
-                "input_mask": np.array(input_mask).astype(np.int64)[np.newaxis, :],
-                "segment_ids": np.array(segment_ids).astype(np.int64)[np.newaxis, :]
+                "input_ids": input_ids,
+                "input_mask": input_mask,
+                "segment_ids": segment_ids
             }
 
         scores = self.sess.run([o.name for o in self.sess.get_outputs()], fd)
-        output = np.stack(scores, axis=-1)[0]
+        output = np.stack(scores, axis=-1)
 
         if self.network == "sut":
-            return output.tolist()
+            return output
 
-        response_array = array.array("B", output.tobytes())
-        bi = response_array.buffer_info()
-        response = lg.QuerySampleResponse(query_id, bi[0], bi[1])
-        lg.QuerySamplesComplete([response])
+        lg.QuerySamplesCompleteBuffers([query_id], [output[0]])
 
     def flush_queries(self):
         pass
@@ -15,7 +15,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import array
 import json
 import os
 import sys
@@ -72,33 +71,31 @@ class BERT_PyTorch_SUT():
 
     def process_sample(self, sample_input, query_id = None):
 
+        # For Loadgen over the network, sample_input is a batch: a dict of [N, max_seq_length] arrays
         if self.network == "sut":
-            input_ids = sample_input['input_ids']
-            input_mask = sample_input['input_mask']
-            segment_ids = sample_input['segment_ids']
+            input_ids = torch.from_numpy(np.asarray(sample_input['input_ids'], dtype=np.int64))
+            input_mask = torch.from_numpy(np.asarray(sample_input['input_mask'], dtype=np.int64))
+            segment_ids = torch.from_numpy(np.asarray(sample_input['segment_ids'], dtype=np.int64))
         else:
-            input_ids = sample_input.input_ids
-            input_mask = sample_input.input_mask
-            segment_ids = sample_input.segment_ids
+            input_ids = torch.LongTensor(sample_input.input_ids).unsqueeze(0)
+            input_mask = torch.LongTensor(sample_input.input_mask).unsqueeze(0)
+            segment_ids = torch.LongTensor(sample_input.segment_ids).unsqueeze(0)
 
         with torch.no_grad():
-            model_output = self.model.forward(input_ids=torch.LongTensor(input_ids).unsqueeze(0).to(self.dev),
-                attention_mask=torch.LongTensor(input_mask).unsqueeze(0).to(self.dev),
-                token_type_ids=torch.LongTensor(segment_ids).unsqueeze(0).to(self.dev))
+            model_output = self.model.forward(input_ids=input_ids.to(self.dev),
+                attention_mask=input_mask.to(self.dev),
+                token_type_ids=segment_ids.to(self.dev))
             if self.version >= '4.0.0':
                 start_scores = model_output.start_logits
                 end_scores = model_output.end_logits
             else:
                 start_scores, end_scores = model_output
-            output = torch.stack([start_scores, end_scores], axis=-1).squeeze(0).cpu().numpy()
+            output = torch.stack([start_scores, end_scores], axis=-1).cpu().numpy()
 
             if self.network == "sut":
-                return output.tolist()
-    
-            response_array = array.array("B", output.tobytes())
-            bi = response_array.buffer_info()
-            response = lg.QuerySampleResponse(query_id, bi[0], bi[1])
-            lg.QuerySamplesComplete([response])
+                return output
+
+            lg.QuerySamplesCompleteBuffers([query_id], [output[0]])
 
 
     def flush_queries(self):
@@ -15,7 +15,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import array
 import json
 import os
 import sys
@@ -176,13 +175,10 @@ class BERT_Ray_SUT():
 
         cur_query_index = 0
         for batch_inference_result in batch_inference_results:
-            batch_inference_result = batch_inference_result["output"]
-            for inference_result in batch_inference_result:
-                response_array = array.array("B", inference_result.tobytes())
-                bi = response_array.buffer_info()
-                response = lg.QuerySampleResponse(query_samples[cur_query_index].id, bi[0], bi[1])
-                lg.QuerySamplesComplete([response])
-                cur_query_index += 1
+            batch_inference_result = np.ascontiguousarray(batch_inference_result["output"])
+            batch_ids = [q.id for q in query_samples[cur_query_index:cur_query_index + len(batch_inference_result)]]
+            lg.QuerySamplesCompleteArray(batch_ids, batch_inference_result)
+            cur_query_index += len(batch_inference_result)
 
     def flush_queries(self):
         pass
@@ -48,6 +48,19 @@ def get_args():
     parser.add_argument("--network", choices=["sut","lon",None], default=None, help="Loadgen network mode")
     parser.add_argument('--node', type=str, default="")
     parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--connections_per_node', type=int, default=2,
+                        help='LON: persistent connections opened to each SUT node')
+    parser.add_argument('--max_inflight_per_node', type=int, default=64,
+                        help='LON: maximum number of outstanding requests per SUT node')
+    parser.add_argument('--dispatch_policy', default='round_robin',
+                        choices=['round_robin', 'least_outstanding', 'power_of_two', 'weighted'],
+                        help='LON: how queries are spread across the SUT nodes')
+    parser.add_argument('--capacity', type=float, default=None,
+                        help='Network SUT: capacity reported for weighted dispatch (default max_batch_size)')
+    parser.add_argument('--max_batch_size', type=int, default=32,
+                        help='Network SUT: maximum number of samples run in one backend call')
+    parser.add_argument('--batch_timeout_ms', type=float, default=2.0,
+                        help='Network SUT: how long to wait for more requests before running a batch')
     parser.add_argument('--sut_server', nargs="*", default= ['http://localhost:8000'],
                     help='Address of the server(s) under test.')
 
@@ -121,10 +134,11 @@ def main():
         app.run(app_main)
 
     elif args.network == "sut":
-        from network_SUT import app, node, set_backend
-        node = args.node
+        from network_SUT import run, set_node, set_backend
+        set_node(args.node)
         set_backend(sut)
-        app.run(debug=False, port=args.port)
+        run(port=args.port, max_batch_size=args.max_batch_size, batch_timeout_ms=args.batch_timeout_ms,
+            capacity=args.capacity)
 
     else:
         print("Running LoadGen test...")
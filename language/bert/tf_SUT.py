@@ -15,7 +15,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import array
 import os
 import sys
 sys.path.insert(0, os.path.join(os.getcwd(), "DeepLearningExamples", "TensorFlow", "LanguageModeling", "BERT"))
@@ -63,11 +62,8 @@ class BERT_TF_SUT():
             }
             result = self.sess.run(["logits:0"], feed_dict=feeds)
 
-            logits = [float(x) for x in result[0].flat]
-            response_array = array.array("B", np.array(logits).astype(np.float32).tobytes())
-            bi = response_array.buffer_info()
-            response = lg.QuerySampleResponse(query_samples[i].id, bi[0], bi[1])
-            lg.QuerySamplesComplete([response])
+            logits = np.ascontiguousarray(result[0], dtype=np.float32).reshape(-1)
+            lg.QuerySamplesCompleteBuffers([query_samples[i].id], [logits])
 
     def flush_queries(self):
         pass
@@ -14,7 +14,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import array
 import json
 import os
 import sys
@@ -69,11 +68,8 @@ class BERT_TF_ESTIMATOR_SUT():
             return tf.data.Dataset.from_tensor_slices(inputs)
 
         for i, result in enumerate(self.estimator.predict(input_fn)):
-            logits = [float(x) for x in result["logits"].flat]
-            response_array = array.array("B", np.array(logits).astype(np.float32).tobytes())
-            bi = response_array.buffer_info()
-            response = lg.QuerySampleResponse(query_samples[i].id, bi[0], bi[1])
-            lg.QuerySamplesComplete([response])
+            logits = np.ascontiguousarray(result["logits"], dtype=np.float32).reshape(-1)
+            lg.QuerySamplesCompleteBuffers([query_samples[i].id], [logits])
 
     def flush_queries(self):
         pass
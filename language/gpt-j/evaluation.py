@@ -2,7 +2,6 @@ from dataset import Dataset
 import os
 import time
 import numpy as np
-import json
 import nltk
 import array
 import torch
@@ -12,6 +11,10 @@ import evaluate
 import argparse
 import nltk
 from transformers import AutoModelForCausalLM, AutoTokenizer
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools", "accuracy_log"))
+from accuracy_log import read_accuracy_log
 
 
 def get_args():
@@ -59,19 +62,6 @@ def main():
 
     targets = data_object.targets
 
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
-
-    # Deduplicate the results loaded from the json
-    dedup_results = []
-    seen = set()
-    for result in results:
-        item = result['qsl_idx']
-        if item not in seen:
-            seen.add(item)
-            dedup_results.append(result)
-    results = dedup_results      
-
     target_required = []
     preds_token_ids = []
 
@@ -79,12 +69,11 @@ def main():
     if args.dtype == "int32":
         eval_dtype = np.int32
 
-    for pred in results:
-        qsl_idx = pred['qsl_idx']
+    # Deduplicate the results while streaming them from the log
+    for _, qsl_idx, pred in read_accuracy_log(args.mlperf_accuracy_file, eval_dtype, dedup=True):
         target = targets[qsl_idx]
         target_required.append(target)
-        preds_token_ids.append(np.frombuffer(
-            bytes.fromhex(pred['data']), eval_dtype))
+        preds_token_ids.append(pred)
 
     preds_decoded_text = tokenizer.batch_decode(
         preds_token_ids, skip_special_tokens=True)
@@ -6,7 +6,6 @@ import torch
 from torch.nn.functional import pad
 from torch.utils.data import DataLoader
 from transformers import AutoModelForCausalLM, AutoTokenizer, LlamaForCausalLM
-from transformers.generation.streamers import BaseStreamer
 
 import pickle
 import time
@@ -20,6 +19,8 @@ from pathlib import Path
 
 import mlperf_loadgen as lg
 from dataset import Dataset
+from continuous_batching import ContinuousBatchingEngine
+from kv_cache import PagedKVCache
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("Llama-70B-SUT")
@@ -34,49 +35,6 @@ gen_kwargs = {
 
 
 
-class FirstTokenStreamer(BaseStreamer):
-    """ Streams first tokens to a 'holder' """
-
-    def __init__(self, first_token, tokens_cache=[], is_first_token=True, response_ids=[] ):
-        """ Response ids added to 'sign' the first token"""
-
-        self.first_token = first_token # Queue for first token
-        self.is_first_token = is_first_token
-
-        # Cache for subsequent generated tokens
-        self.tokens_cache = tokens_cache
-
-        self.response_ids = response_ids
-
-        self.is_prompt = True # The first tokens sent to the streamer are actually the input prompts
-
-    def put(self, value):
-        """ Caches the tokens as they're generated. Assumes bs=1 """
-
-        # Prompts are streamed first so we need to skip the first time value that arrives
-        if self.is_prompt:
-            self.is_prompt = False
-            return
-
-        value = value.item()
-        if self.is_first_token:
-
-            # Add generated first token together with its query response_id to first tokens queue
-            self.first_token.put((value, self.response_ids[0]))
-
-            self.is_first_token = False
-            return
-
-        self.tokens_cache.append(value)
-
-
-    def end(self):
-        pass
-
-    def get_out_tokens(self):
-        return self.tokens_cache
-
-
 class SUT():
     def __init__(self,
                  model_path=None,
@@ -86,7 +44,8 @@ class SUT():
                  total_sample_count=24576,
                  dataset_path=None,
                  use_cached_outputs=False,  # Set this to True *only for test accuracy runs* in case your prior session was killed partway through
-                 workers=1):
+                 workers=1,
+                 batching="fixed"):
 
         self.model_path = model_path or "meta-llama/Llama-2-70b-chat-hf"
         self.device = device
@@ -98,6 +57,12 @@ class SUT():
                 batch_size = 32  # Reduce to 8 if using 4 GPUs, 16 for 8.
         self.batch_size = batch_size
 
+        # "fixed": batches in arrival order, padded to max_seq_len
+        # "bucketed": batches of similar input length, padded to the longest prompt in the batch
+        assert batching in ("fixed", "bucketed"), f"Unknown batching mode {batching}"
+        self.batching = batching
+        self.max_seq_len = 1024
+
         # dtype
         if dtype == 'bfloat16':
             self.amp_enabled = True
@@ -130,6 +95,10 @@ class SUT():
         self.sample_counter = 0
         self.sample_counter_lock = threading.Lock()
 
+        # Prompt tokens actually fed to prefill vs. what padding to max_seq_len would cost
+        self.prefill_tokens = 0
+        self.fixed_prefill_tokens = 0
+
 
     def start(self):
         # Create worker threads
@@ -170,13 +139,16 @@ class SUT():
                 tok = None
             else:
                 # Construct / collate batch
-                max_seq_len = 1024
+                input_len = [self.data_object.input_lens[q.index] for q in qitem]
+                if self.batching == "bucketed":
+                    max_seq_len = max(input_len)
+                else:
+                    max_seq_len = self.max_seq_len
 
                 tik1 = time.time()
 
                 input_ids_tensor = []
                 input_masks_tensor = []
-                input_len = []
                 for q in qitem:
                     input_ids_tensor.append(pad(self.data_object.input_ids[q.index],
                                                 (max_seq_len - self.data_object.input_lens[q.index], 0, 0, 0),
@@ -184,7 +156,6 @@ class SUT():
                     input_masks_tensor.append(pad(self.data_object.attention_masks[q.index],
                                                   (max_seq_len - self.data_object.input_lens[q.index], 0, 0, 0),
                                                  value=0))
-                    input_len.append(self.data_object.input_lens[q.index])
                 input_ids_tensor = torch.cat(input_ids_tensor)
                 input_masks_tensor = torch.cat(input_masks_tensor)
 
@@ -204,13 +175,15 @@ class SUT():
 
                 processed_output = self.data_object.postProcess(pred_output_tokens,
                                                                 input_seq_lens=input_len,
-                                                                query_id_list=query_ids)
+                                                                query_id_list=query_ids,
+                                                                padded_len=max_seq_len)
+
+                # Fraction of the prefill spent on padding tokens
+                padding_waste = 1.0 - sum(input_len) / (len(qitem) * max_seq_len)
 
-            for i in range(len(qitem)):
-                response_array = array.array("B", processed_output[i].tobytes())
-                bi = response_array.buffer_info()
-                response = [lg.QuerySampleResponse(qitem[i].id, bi[0], bi[1])]
-                lg.QuerySamplesComplete(response)
+            # One row of output tokens per query, completed in a single call
+            lg.QuerySamplesCompleteArray(np.array([q.id for q in qitem], dtype=np.uint64),
+                                         np.ascontiguousarray(processed_output))
 
             tok = time.time()
 
@@ -218,6 +191,10 @@ class SUT():
                 self.sample_counter += len(qitem)
                 print(f"Samples run: {self.sample_counter}")
                 if tik1:
+                    self.prefill_tokens += len(qitem) * max_seq_len
+                    self.fixed_prefill_tokens += len(qitem) * self.max_seq_len
+                    print(f"\tBatch size: {len(qitem)}, padded length: {max_seq_len}, padding waste: {padding_waste:.3f}")
+                    print(f"\tPrefill tokens saved vs. padding to {self.max_seq_len}: {self.fixed_prefill_tokens - self.prefill_tokens}")
                     print(f"\tBatchMaker time: {tik2 - tik1}")
                     print(f"\tInference time: {tik3 - tik2}")
                     print(f"\tPostprocess time: {tok - tik3}")
@@ -270,6 +247,10 @@ class SUT():
         list_prompts_attn_masks = []
 
         print(f"IssueQuery started with {len(query_samples)} samples")
+        if self.batching == "bucketed":
+            # Longest prompts first so that consecutive samples share a bucket and the heaviest batches start early.
+            # Responses are completed by query id, so the issue order does not need to be preserved.
+            query_samples = sorted(query_samples, key=lambda q: self.data_object.input_lens[q.index], reverse=True)
         while len(query_samples) > 0:
             self.query_queue.put(query_samples[:self.batch_size])
             query_samples = query_samples[self.batch_size:]
@@ -284,83 +265,59 @@ class SUT():
 
 
 class SUTServer(SUT):
-    def __init__(self, model_path=None, dtype="bfloat16", device="cpu", total_sample_count=24576, dataset_path=None, workers=1):
-
-        super().__init__(model_path=model_path, dtype=dtype, device=device, total_sample_count=total_sample_count, dataset_path=dataset_path, workers=workers)
-
-        self.first_token_queue = queue.Queue()
+    def __init__(self, model_path=None, dtype="bfloat16", device="cpu", batch_size=None, total_sample_count=24576, dataset_path=None, workers=1,
+                 kv_cache_blocks=0, kv_block_size=16):
+
+        super().__init__(model_path=model_path, dtype=dtype, device=device, batch_size=batch_size, total_sample_count=total_sample_count, dataset_path=dataset_path, workers=workers)
+
+        # Paged prefix cache shared by all requests, so common system-prompt prefixes are only prefilled once
+        self.kv_cache = None
+        if kv_cache_blocks > 0:
+            self.kv_cache = PagedKVCache.from_model_config(self.model.config,
+                                                           num_blocks=kv_cache_blocks,
+                                                           block_size=kv_block_size,
+                                                           dtype=self.model.dtype,
+                                                           device=self.device)
+
+        # A single step loop serves all in-flight queries; batch_size caps the running decode batch
+        self.engine = ContinuousBatchingEngine(self.model,
+                                               eos_token_id=self.tokenizer.eos_token_id,
+                                               pad_token_id=self.tokenizer.pad_token_id,
+                                               max_batch_size=self.batch_size,
+                                               max_new_tokens=gen_kwargs["max_new_tokens"],
+                                               min_new_tokens=gen_kwargs["min_new_tokens"],
+                                               first_token_callback=self.first_token_complete,
+                                               completion_callback=self.query_complete,
+                                               kv_cache=self.kv_cache,
+                                               device=self.device)
 
     def start(self):
+        self.engine_thread = threading.Thread(target=self.engine.run)
+        self.engine_thread.start()
 
-        # Create worker threads
-        for j in range(self.num_workers):
-            worker = threading.Thread(target=self.process_queries)
-            worker.start()
-            self.worker_threads[j] = worker
-
-        # Create first token response thread
-        self.ft_response_thread = threading.Thread(target=self.process_first_tokens)
-        self.ft_response_thread.start()
+    def first_token_complete(self, response_id, first_token):
+        """ Called from the engine step loop as soon as a query's first token is generated """
+        response_data = array.array("B", np.array([first_token], np.int32).tobytes())
+        bi = response_data.buffer_info()
+        response = [lg.QuerySampleResponse(response_id, bi[0], bi[1])]
+        lg.FirstTokenComplete(response)
 
+    def query_complete(self, response_id, output_tokens):
+        """ Called from the engine step loop when a query is evicted from the batch """
+        n_tokens = len(output_tokens)
+        lg.QuerySamplesCompleteBuffers([response_id], [np.array(output_tokens, np.int32)], n_tokens=[n_tokens])
 
-    def process_first_tokens(self):
-
-        while True:
-            first_token_item = self.first_token_queue.get()
-
-            if first_token_item is None:
-                log.info("Exiting First token response thread")
-                break
-
-            first_tokens, response_id = first_token_item
-
-            response_data = array.array("B", np.array(first_tokens, np.float32).tobytes())
-            bi = response_data.buffer_info()
-            response = [lg.QuerySampleResponse(response_id, bi[0], bi[1])]
-            lg.FirstTokenComplete(response)
-
-    def process_queries(self):
-        """Processor of the queued queries. User may choose to add batching logic """
-        while True:
-
-            qitem = self.query_queue.get()
-            if qitem is None:
-                break
-
-            input_ids_tensor = self.data_object.input_ids[qitem.index]
-            input_masks_tensor = self.data_object.attention_masks[qitem.index]
-
-            #TODO: This PoC is super slow with significant overhead. Best to create a patch to `generate`
-            tokens_cache = []
-            tokens_streamer = FirstTokenStreamer(self.first_token_queue, tokens_cache=tokens_cache, is_first_token=True, response_ids=[qitem.id])
-
-            _ = self.model.generate(    input_ids=input_ids_tensor,
-                                        attention_mask=input_masks_tensor,
-                                        pad_token_id=self.tokenizer.pad_token_id,
-                                        streamer = tokens_streamer,
-                                        **gen_kwargs
-                                        )
-
-            output_tokens = tokens_streamer.get_out_tokens()
-
-            response_array = array.array("B", np.array(output_tokens, np.int32).tobytes())
-            bi = response_array.buffer_info()
-            response = [lg.QuerySampleResponse(
-                qitem.id, bi[0], bi[1])]
-            lg.QuerySamplesComplete(response)
-
+        with self.sample_counter_lock:
+            self.sample_counter += 1
 
     def issue_queries(self, query_samples):
-
-        self.query_queue.put(query_samples[0])
-
+        for q in query_samples:
+            self.engine.add_request(q.id, self.data_object.input_ids[q.index])
 
     def stop(self):
-        for _ in range(self.num_workers):
-            self.query_queue.put(None)
-
-        for worker in self.worker_threads:
-            worker.join()
-
-        self.first_token_queue.put(None)
-        self.ft_response_thread.join()
+        self.engine.stop()
+        self.engine_thread.join()
+        log.info(f"Samples run: {self.sample_counter}, generated tokens: {self.engine.num_generated_tokens}")
+        if self.kv_cache is not None:
+            stats = self.kv_cache.stats()
+            log.info(f"Prefix cache hit rate: {stats['hit_rate']}, blocks in use: {stats['blocks_in_use']}/{stats['num_blocks']}")
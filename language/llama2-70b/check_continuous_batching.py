@@ -0,0 +1,126 @@
+"""
+Checks on CPU that the continuous batching engine decodes exactly like model.generate.
+
+A tiny randomly initialised Llama model is built and a set of prompts, most of them sharing a
+system-prompt-like prefix longer than a few KV blocks, is run through ContinuousBatchingEngine, once
+without the paged prefix cache and twice with it, cold then warm. With a batch size smaller than the
+number of prompts, sequences are admitted and evicted while others are decoding, and later prompts
+are prefilled on top of the cached prefix blocks. Every output must equal the greedy model.generate
+output of its prompt.
+
+    python3 check_continuous_batching.py
+"""
+import argparse
+import sys
+
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from continuous_batching import ContinuousBatchingEngine
+from kv_cache import PagedKVCache
+
+
+EOS_TOKEN_ID = 2
+PAD_TOKEN_ID = 2
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-prompts", type=int, default=12, help="Number of prompts to decode")
+    parser.add_argument("--batch-size", type=int, default=3, help="Max number of sequences in the running batch")
+    parser.add_argument("--max-new-tokens", type=int, default=24, help="Max number of tokens generated per prompt")
+    parser.add_argument("--kv-block-size", type=int, default=8, help="Number of tokens per prefix cache block")
+    parser.add_argument("--kv-cache-blocks", type=int, default=64, help="Number of blocks in the prefix cache")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the model weights and prompts")
+    args = parser.parse_args()
+    return args
+
+
+def build_model(vocab_size=128):
+    config = LlamaConfig(vocab_size=vocab_size, hidden_size=64, intermediate_size=128,
+                         num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2,
+                         eos_token_id=EOS_TOKEN_ID, pad_token_id=PAD_TOKEN_ID)
+    return LlamaForCausalLM(config).eval()
+
+
+def build_prompts(num_prompts, block_size, vocab_size):
+    """ Prompts of varying length, most starting with a shared prefix, plus a repeated prompt """
+    prefix = torch.randint(3, vocab_size, (3 * block_size + 2,))
+    prompts = []
+    for i in range(num_prompts - 1):
+        suffix = torch.randint(3, vocab_size, (1 + (i * 5) % (2 * block_size),))
+        prompts.append(torch.cat([prefix, suffix]) if i % 4 != 3 else suffix)
+    # A prompt made only of cached blocks still has its last token prefilled
+    prompts.append(prompts[0][:2 * block_size].clone())
+    return [p.view(1, -1) for p in prompts]
+
+
+@torch.no_grad()
+def generate_reference(model, prompts, max_new_tokens):
+    references = []
+    for input_ids in prompts:
+        output = model.generate(input_ids,
+                                attention_mask=torch.ones_like(input_ids),
+                                max_new_tokens=max_new_tokens,
+                                min_new_tokens=1,
+                                do_sample=False,
+                                eos_token_id=EOS_TOKEN_ID,
+                                pad_token_id=PAD_TOKEN_ID)
+        references.append(output[0, input_ids.shape[-1]:].tolist())
+    return references
+
+
+def run_engine(model, prompts, args, kv_cache=None):
+    outputs = {}
+    engine = ContinuousBatchingEngine(model,
+                                      eos_token_id=EOS_TOKEN_ID,
+                                      pad_token_id=PAD_TOKEN_ID,
+                                      max_batch_size=args.batch_size,
+                                      max_new_tokens=args.max_new_tokens,
+                                      completion_callback=lambda request_id, tokens: outputs.__setitem__(request_id, tokens),
+                                      kv_cache=kv_cache)
+    for i, input_ids in enumerate(prompts):
+        engine.add_request(i, input_ids)
+    engine.stop()
+    engine.run()
+    return [outputs.get(i) for i in range(len(prompts))]
+
+
+def compare(name, outputs, references):
+    mismatches = [i for i, (output, reference) in enumerate(zip(outputs, references)) if output != reference]
+    for i in mismatches:
+        print(f"{name}: prompt {i} decoded {outputs[i]}, expected {references[i]}")
+    print(f"{name}: {len(outputs) - len(mismatches)}/{len(outputs)} outputs match model.generate")
+    return not mismatches
+
+
+def main():
+    args = get_args()
+    torch.manual_seed(args.seed)
+    model = build_model()
+    prompts = build_prompts(args.num_prompts, args.kv_block_size, model.config.vocab_size)
+    references = generate_reference(model, prompts, args.max_new_tokens)
+    num_early = sum(1 for reference in references if len(reference) < args.max_new_tokens)
+    print(f"{num_early}/{len(references)} prompts stop at EOS before max_new_tokens")
+
+    ok = compare("no prefix cache", run_engine(model, prompts, args), references)
+
+    kv_cache = PagedKVCache.from_model_config(model.config, args.kv_cache_blocks, block_size=args.kv_block_size)
+    ok &= compare("prefix cache", run_engine(model, prompts, args, kv_cache), references)
+    print(f"Prefix cache: {kv_cache.stats()}")
+    if kv_cache.hit_tokens == 0:
+        print("prefix cache: no prompt was served from cached blocks")
+        ok = False
+    if kv_cache.blocks_in_use != 0:
+        print("prefix cache: blocks are still referenced after all requests completed")
+        ok = False
+
+    # A second run on the warm cache prefills every shared prefix from cached blocks
+    ok &= compare("warm prefix cache", run_engine(model, prompts, args, kv_cache), references)
+
+    print("PASSED" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import queue
+import time
+
+import torch
+
+try:
+    from transformers.cache_utils import DynamicCache
+except ImportError:
+    DynamicCache = None
+
+import logging
+log = logging.getLogger("Llama-70B-ContinuousBatching")
+
+
+class Sequence():
+    """ A request that is being (or waiting to be) decoded by the engine """
+
+    def __init__(self, request_id, input_ids):
+        self.request_id = request_id
+        self.input_ids = input_ids.view(-1)
+        self.input_len = self.input_ids.shape[-1]
+        self.output_tokens = []
+        self.block_ids = []  # Prefix blocks referenced in the PagedKVCache
+        self.finished = False
+        self.arrival_time = time.time()
+        self.first_token_time = None
+
+
+class ContinuousBatchingEngine():
+    """ Token-level scheduler for greedy decoding with a HF causal LM.
+
+    Requests are admitted into the running decode batch at every step, and
+    sequences are evicted as soon as they emit EOS (or hit max_new_tokens),
+    so the batch never waits for its slowest member. The running batch keeps
+    a left-padded KV cache: new sequences are prefilled on their own and their
+    cache is concatenated to the running one, finished rows are dropped and
+    columns that only hold padding are trimmed.
+
+    If a PagedKVCache is given, prompts are looked up in it before prefill:
+    a sequence whose prompt starts with cached blocks only runs its remaining
+    tokens through the model, and the full blocks of every prompt are added
+    to the cache for later requests.
+
+    The engine does not depend on loadgen. Completion is reported through
+    `first_token_callback(request_id, token)` and
+    `completion_callback(request_id, output_tokens)`, both invoked from the
+    thread that runs `step()`/`run()`.
+    """
+
+    def __init__(self,
+                 model,
+                 eos_token_id,
+                 pad_token_id,
+                 max_batch_size=32,
+                 max_new_tokens=1024,
+                 min_new_tokens=1,
+                 max_prefill_batch_size=None,
+                 first_token_callback=None,
+                 completion_callback=None,
+                 kv_cache=None,
+                 device="cpu"):
+
+        self.model = model
+        self.eos_token_id = eos_token_id
+        self.pad_token_id = pad_token_id
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.min_new_tokens = min_new_tokens
+        self.max_prefill_batch_size = max_prefill_batch_size or max_batch_size
+        self.first_token_callback = first_token_callback
+        self.completion_callback = completion_callback
+        self.kv_cache = kv_cache
+        self.device = device
+
+        self.pending = queue.Queue()
+        self.pending_head = None
+        self.stopping = False
+
+        # Running batch state
+        self.running = []
+        self.past_key_values = None
+        self.attention_mask = None
+        self.next_tokens = None
+
+        # Counters
+        self.num_steps = 0
+        self.num_completed = 0
+        self.num_generated_tokens = 0
+        self.batch_size_sum = 0
+
+    def add_request(self, request_id, input_ids):
+        """ Queues a request. Safe to call from any thread """
+        self.pending.put(Sequence(request_id, input_ids))
+
+    def stop(self):
+        """ Lets `run()` drain the queued and running requests, then return """
+        self.pending.put(None)
+
+    def run(self):
+        """ Step loop. Blocks on the request queue while the batch is empty """
+        while True:
+            if not self.running:
+                if self.stopping:
+                    break
+                seq = self.pending.get()
+                if seq is None:
+                    self.stopping = True
+                    continue
+                self.pending_head = seq
+            self.step()
+
+        log.info(f"Engine stopped after {self.num_steps} steps, {self.num_completed} requests, "
+                 f"avg batch size {self.batch_size_sum / max(self.num_steps, 1):.2f}")
+        if self.kv_cache is not None:
+            log.info(f"Prefix cache: {self.kv_cache.stats()}")
+
+    @torch.inference_mode()
+    def step(self):
+        """ Runs one scheduler iteration: admit, decode one token, evict """
+        new_seqs = self._get_new_sequences()
+        if self.kv_cache is not None:
+            # Sequences with a cached prefix are prefilled one by one on top of their prefix blocks
+            cold_seqs = []
+            for seq in new_seqs:
+                # Keep at least one prompt token uncached so there are logits for the first generated token
+                seq.block_ids = self.kv_cache.match_prefix(seq.input_ids.tolist(), max_tokens=seq.input_len - 1)
+                if seq.block_ids:
+                    self._prefill_with_prefix(seq)
+                else:
+                    cold_seqs.append(seq)
+        else:
+            cold_seqs = new_seqs
+
+        for i in range(0, len(cold_seqs), self.max_prefill_batch_size):
+            self._prefill(cold_seqs[i:i + self.max_prefill_batch_size])
+        if new_seqs:
+            self._evict_finished()
+
+        if not self.running:
+            return
+
+        self._decode()
+        self._evict_finished()
+
+    def _get_new_sequences(self):
+        new_seqs = []
+        if self.pending_head is not None:
+            new_seqs.append(self.pending_head)
+            self.pending_head = None
+
+        while not self.stopping and len(self.running) + len(new_seqs) < self.max_batch_size:
+            try:
+                seq = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if seq is None:
+                self.stopping = True
+                break
+            new_seqs.append(seq)
+        return new_seqs
+
+    def _prefill(self, seqs):
+        """ Runs the prompts of newly admitted sequences and merges their cache into the batch """
+        max_len = max(seq.input_len for seq in seqs)
+        input_ids = torch.full((len(seqs), max_len), self.pad_token_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.zeros((len(seqs), max_len), dtype=torch.long, device=self.device)
+        for i, seq in enumerate(seqs):
+            input_ids[i, max_len - seq.input_len:] = seq.input_ids.to(self.device)
+            attention_mask[i, max_len - seq.input_len:] = 1
+
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        outputs = self.model(input_ids=input_ids,
+                             attention_mask=attention_mask,
+                             position_ids=position_ids,
+                             past_key_values=None,
+                             use_cache=True)
+
+        past_key_values = to_legacy_cache(outputs.past_key_values)
+        if self.kv_cache is not None:
+            for i, seq in enumerate(seqs):
+                seq.block_ids = self.kv_cache.store_prefix(seq.input_ids.tolist(), past_key_values,
+                                                           row=i, offset=max_len - seq.input_len)
+
+        next_tokens = self._select_tokens(outputs.logits[:, -1, :], seqs)
+        self._merge_into_batch(seqs, past_key_values, attention_mask, next_tokens)
+
+    def _prefill_with_prefix(self, seq):
+        """ Runs only the uncached tail of the prompt, attending to the cached prefix blocks """
+        prefix_len = len(seq.block_ids) * self.kv_cache.block_size
+        input_ids = seq.input_ids[prefix_len:].to(self.device).view(1, -1).long()
+        attention_mask = torch.ones((1, seq.input_len), dtype=torch.long, device=self.device)
+        position_ids = torch.arange(prefix_len, seq.input_len, dtype=torch.long, device=self.device).view(1, -1)
+
+        outputs = self.model(input_ids=input_ids,
+                             attention_mask=attention_mask,
+                             position_ids=position_ids,
+                             past_key_values=from_legacy_cache(self.kv_cache.gather(seq.block_ids)),
+                             use_cache=True)
+
+        past_key_values = to_legacy_cache(outputs.past_key_values)
+        seq.block_ids = self.kv_cache.store_prefix(seq.input_ids.tolist(), past_key_values, block_ids=seq.block_ids)
+
+        next_tokens = self._select_tokens(outputs.logits[:, -1, :], [seq])
+        self._merge_into_batch([seq], past_key_values, attention_mask, next_tokens)
+
+    def _decode(self):
+        """ Feeds the last token of every running sequence through the model """
+        position_ids = self.attention_mask.sum(-1, keepdim=True)
+        attention_mask = torch.cat([self.attention_mask, self.attention_mask.new_ones((self.attention_mask.shape[0], 1))], dim=-1)
+
+        outputs = self.model(input_ids=self.next_tokens,
+                             attention_mask=attention_mask,
+                             position_ids=position_ids,
+                             past_key_values=from_legacy_cache(self.past_key_values),
+                             use_cache=True)
+
+        self.past_key_values = to_legacy_cache(outputs.past_key_values)
+        self.attention_mask = attention_mask
+        self.next_tokens = self._select_tokens(outputs.logits[:, -1, :], self.running).view(-1, 1)
+
+        self.num_steps += 1
+        self.batch_size_sum += len(self.running)
+
+    def _select_tokens(self, logits, seqs):
+        """ Greedy selection, honouring min_new_tokens, and bookkeeping of generated tokens """
+        for i, seq in enumerate(seqs):
+            if len(seq.output_tokens) < self.min_new_tokens:
+                logits[i, self.eos_token_id] = -float("inf")
+        tokens = logits.argmax(dim=-1)
+
+        for seq, token in zip(seqs, tokens.tolist()):
+            if not seq.output_tokens:
+                seq.first_token_time = time.time()
+                if self.first_token_callback is not None:
+                    self.first_token_callback(seq.request_id, token)
+            seq.output_tokens.append(token)
+            self.num_generated_tokens += 1
+            if token == self.eos_token_id or len(seq.output_tokens) >= self.max_new_tokens:
+                seq.finished = True
+        return tokens
+
+    def _merge_into_batch(self, seqs, past_key_values, attention_mask, next_tokens):
+        next_tokens = next_tokens.view(-1, 1)
+        if not self.running:
+            self.running = list(seqs)
+            self.past_key_values = past_key_values
+            self.attention_mask = attention_mask
+            self.next_tokens = next_tokens
+            return
+
+        # Left-pad whichever side is shorter so both caches end at the same column
+        cur_len = self.attention_mask.shape[-1]
+        new_len = attention_mask.shape[-1]
+        total_len = max(cur_len, new_len)
+
+        self.past_key_values = tuple(
+            (torch.cat([left_pad(k0, total_len), left_pad(k1, total_len)], dim=0),
+             torch.cat([left_pad(v0, total_len), left_pad(v1, total_len)], dim=0))
+            for (k0, v0), (k1, v1) in zip(self.past_key_values, past_key_values))
+        self.attention_mask = torch.cat([left_pad(self.attention_mask, total_len),
+                                         left_pad(attention_mask, total_len)], dim=0)
+        self.next_tokens = torch.cat([self.next_tokens, next_tokens], dim=0)
+        self.running.extend(seqs)
+
+    def _evict_finished(self):
+        finished = [seq for seq in self.running if seq.finished]
+        if not finished:
+            return
+
+        for seq in finished:
+            self.num_completed += 1
+            if self.kv_cache is not None:
+                self.kv_cache.release(seq.block_ids)
+                seq.block_ids = []
+            if self.completion_callback is not None:
+                self.completion_callback(seq.request_id, seq.output_tokens)
+
+        keep = [i for i, seq in enumerate(self.running) if not seq.finished]
+        self.running = [self.running[i] for i in keep]
+        if not keep:
+            self.past_key_values = None
+            self.attention_mask = None
+            self.next_tokens = None
+            return
+
+        keep = torch.tensor(keep, dtype=torch.long, device=self.attention_mask.device)
+        attention_mask = self.attention_mask.index_select(0, keep)
+
+        # Drop leading columns that are padding for every remaining sequence
+        start = int((attention_mask.sum(0) > 0).nonzero()[0])
+        self.attention_mask = attention_mask[:, start:]
+        self.past_key_values = tuple(
+            (k.index_select(0, keep)[:, :, start:], v.index_select(0, keep)[:, :, start:])
+            for k, v in self.past_key_values)
+        self.next_tokens = self.next_tokens.index_select(0, keep)
+
+
+def to_legacy_cache(past_key_values):
+    """ Returns the cache as a tuple of per-layer (key, value) tensors of shape [batch, heads, seq, head_dim] """
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    if hasattr(past_key_values, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+    return past_key_values
+
+
+def from_legacy_cache(past_key_values):
+    """ Wraps a tuple cache for transformers versions that expect a Cache object """
+    if DynamicCache is None:
+        return past_key_values
+    cache = DynamicCache()
+    for layer_idx, (k, v) in enumerate(past_key_values):
+        cache.update(k, v, layer_idx)
+    return cache
+
+
+def left_pad(tensor, length):
+    """ Left-pads dim 2 (KV cache) or dim 1 (attention mask) with zeros up to `length` """
+    dim = 2 if tensor.dim() == 4 else 1
+    missing = length - tensor.shape[dim]
+    if missing == 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
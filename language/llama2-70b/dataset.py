@@ -66,7 +66,7 @@ class Dataset():
         print("Finished loading dataset.")
 
 
-    def postProcess(self, out_tokens, input_seq_lens=None, query_id_list=None, sample_index_list=None):
+    def postProcess(self, out_tokens, input_seq_lens=None, query_id_list=None, sample_index_list=None, padded_len=1024):
         """ Postprocesses output prediction """
 
         #TODO: Create response object in postProcess(?)
@@ -79,8 +79,8 @@ class Dataset():
             pred = out_tokens[i, input_len:].reshape(-1).cpu().numpy()
             preds.append(pred)
         """
-        # Everything is padded to max_len (1024), so prune the input and parse to numpy
-        output_seq = out_tokens[:, 1024:].cpu().numpy()
+        # Every prompt in the batch is left-padded to padded_len, so prune the input and parse to numpy
+        output_seq = out_tokens[:, padded_len:].cpu().numpy()
         assert len(query_id_list) == output_seq.shape[0]
 
         # Save outputs
@@ -3,8 +3,11 @@ from transformers import AutoTokenizer
 import nltk
 import evaluate
 import numpy as np
-import json
+import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools", "accuracy_log"))
+from accuracy_log import read_accuracy_log
 
 
 def get_args():
@@ -67,20 +70,10 @@ def main():
     elif args.dtype == "float":
         eval_dtype = np.float32
 
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
-
-    seen = set()
     gen_tok_len = 0
-    for pred in results:
-        qsl_idx = pred['qsl_idx']
-        if qsl_idx in seen:
-            continue
-
-        seen.add(qsl_idx)
+    for _, qsl_idx, pred in read_accuracy_log(args.mlperf_accuracy_file, eval_dtype, dedup=True):
         target = targets[qsl_idx]
         target_required.append(target)
-        pred = np.frombuffer( bytes.fromhex(pred['data']), eval_dtype)
 
         gen_tok_len += len(pred)
         preds_token_ids.append(pred)
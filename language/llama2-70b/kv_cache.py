@@ -0,0 +1,173 @@
+from collections import OrderedDict
+
+import torch
+
+import logging
+log = logging.getLogger("Llama-70B-KVCache")
+
+
+class PagedKVCache():
+    """ Block-based KV-cache pool with reference-counted prefix sharing.
+
+    Prompt KV entries are stored in fixed-size blocks of `block_size` tokens,
+    preallocated as one [layers, num_blocks, kv_heads, block_size, head_dim]
+    tensor for keys and one for values. A full block is identified by the
+    hash of its tokens chained with the hash of the block before it, so two
+    prompts share a block only if they share the whole prefix up to the end
+    of that block.
+
+    Sequences take a reference on the blocks they matched or stored. Blocks
+    whose reference count drops to zero stay cached and are only reclaimed,
+    least recently used first, when the free list runs out.
+    """
+
+    def __init__(self, num_blocks, block_size, num_layers, num_kv_heads, head_dim, dtype=torch.float32, device="cpu"):
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        self.num_layers = num_layers
+
+        shape = (num_layers, num_blocks, num_kv_heads, block_size, head_dim)
+        self.key_blocks = torch.zeros(shape, dtype=dtype, device=device)
+        self.value_blocks = torch.zeros(shape, dtype=dtype, device=device)
+
+        self.free_blocks = list(range(num_blocks - 1, -1, -1))
+        self.ref_counts = [0] * num_blocks
+        self.block_hashes = [None] * num_blocks
+        self.cached_blocks = {}           # prefix hash -> block id
+        self.evictable = OrderedDict()    # block id -> None, cached blocks with no reference, LRU first
+
+        # Counters
+        self.lookup_tokens = 0
+        self.hit_tokens = 0
+        self.num_evictions = 0
+
+    @classmethod
+    def from_model_config(cls, config, num_blocks, block_size=16, dtype=torch.float32, device="cpu"):
+        num_heads = config.num_attention_heads
+        num_kv_heads = getattr(config, "num_key_value_heads", None) or num_heads
+        return cls(num_blocks, block_size,
+                   num_layers=config.num_hidden_layers,
+                   num_kv_heads=num_kv_heads,
+                   head_dim=config.hidden_size // num_heads,
+                   dtype=dtype,
+                   device=device)
+
+    @property
+    def blocks_in_use(self):
+        return sum(1 for count in self.ref_counts if count > 0)
+
+    @property
+    def hit_rate(self):
+        return self.hit_tokens / self.lookup_tokens if self.lookup_tokens else 0.0
+
+    def block_hashes_for(self, token_ids, num_blocks):
+        hashes = []
+        prefix_hash = None
+        for i in range(num_blocks):
+            block = tuple(token_ids[i * self.block_size:(i + 1) * self.block_size])
+            prefix_hash = hash((prefix_hash, block))
+            hashes.append(prefix_hash)
+        return hashes
+
+    def match_prefix(self, token_ids, max_tokens=None):
+        """ Returns the ids of the cached blocks covering the longest cached prefix of `token_ids`.
+
+        At most `max_tokens` tokens are matched. The caller owns a reference on
+        every returned block and must hand them back through `release`.
+        """
+        max_tokens = len(token_ids) if max_tokens is None else min(max_tokens, len(token_ids))
+        self.lookup_tokens += len(token_ids)
+
+        block_ids = []
+        for prefix_hash in self.block_hashes_for(token_ids, max_tokens // self.block_size):
+            block_id = self.cached_blocks.get(prefix_hash)
+            if block_id is None:
+                break
+            self._acquire(block_id)
+            block_ids.append(block_id)
+
+        self.hit_tokens += len(block_ids) * self.block_size
+        return block_ids
+
+    def gather(self, block_ids):
+        """ Returns the blocks as a contiguous tuple cache of [1, kv_heads, len(block_ids) * block_size, head_dim] per layer """
+        index = torch.tensor(block_ids, dtype=torch.long, device=self.key_blocks.device)
+        past_key_values = []
+        for layer in range(self.num_layers):
+            keys = self.key_blocks[layer].index_select(0, index)
+            values = self.value_blocks[layer].index_select(0, index)
+            past_key_values.append((blocks_to_sequence(keys), blocks_to_sequence(values)))
+        return tuple(past_key_values)
+
+    def store_prefix(self, token_ids, past_key_values, row=0, offset=0, block_ids=None):
+        """ Caches every full block of `token_ids` not already present.
+
+        `past_key_values` is a tuple cache holding the prompt at batch `row`,
+        starting at column `offset`. `block_ids` are the blocks the sequence
+        already holds for its matched prefix; the returned list extends them
+        with the blocks stored (or found) here, each with a reference taken.
+        """
+        block_ids = list(block_ids or [])
+        hashes = self.block_hashes_for(token_ids, len(token_ids) // self.block_size)
+
+        for i in range(len(block_ids), len(hashes)):
+            block_id = self.cached_blocks.get(hashes[i])
+            if block_id is not None:
+                self._acquire(block_id)
+                block_ids.append(block_id)
+                continue
+
+            block_id = self._allocate()
+            if block_id is None:
+                break
+
+            start = offset + i * self.block_size
+            end = start + self.block_size
+            for layer, (k, v) in enumerate(past_key_values):
+                self.key_blocks[layer, block_id].copy_(k[row, :, start:end])
+                self.value_blocks[layer, block_id].copy_(v[row, :, start:end])
+
+            self.block_hashes[block_id] = hashes[i]
+            self.cached_blocks[hashes[i]] = block_id
+            self.ref_counts[block_id] = 1
+            block_ids.append(block_id)
+
+        return block_ids
+
+    def release(self, block_ids):
+        for block_id in block_ids:
+            self.ref_counts[block_id] -= 1
+            if self.ref_counts[block_id] == 0:
+                self.evictable[block_id] = None
+
+    def stats(self):
+        return {"blocks_in_use": self.blocks_in_use,
+                "blocks_cached": len(self.cached_blocks),
+                "num_blocks": self.num_blocks,
+                "hit_rate": round(self.hit_rate, 4),
+                "hit_tokens": self.hit_tokens,
+                "lookup_tokens": self.lookup_tokens,
+                "evictions": self.num_evictions}
+
+    def _acquire(self, block_id):
+        if self.ref_counts[block_id] == 0:
+            self.evictable.pop(block_id, None)
+        self.ref_counts[block_id] += 1
+
+    def _allocate(self):
+        if self.free_blocks:
+            return self.free_blocks.pop()
+        if not self.evictable:
+            return None
+
+        block_id, _ = self.evictable.popitem(last=False)
+        del self.cached_blocks[self.block_hashes[block_id]]
+        self.block_hashes[block_id] = None
+        self.num_evictions += 1
+        return block_id
+
+
+def blocks_to_sequence(blocks):
+    """ [num_blocks, heads, block_size, head_dim] -> [1, heads, num_blocks * block_size, head_dim] """
+    num_blocks, heads, block_size, head_dim = blocks.shape
+    return blocks.permute(1, 0, 2, 3).reshape(1, heads, num_blocks * block_size, head_dim)
@@ -26,6 +26,10 @@ def get_args():
     parser.add_argument("--output-log-dir", type=str, default="output-logs", help="Where logs are saved")
     parser.add_argument("--enable-log-trace", action="store_true", help="Enable log tracing. This file can become quite large")
     parser.add_argument("--num-workers", type=int, default=1, help="Number of workers to process queries")
+    parser.add_argument("--batching", type=str, choices=["fixed", "bucketed"], default="fixed", help="Offline only. 'bucketed' groups samples by input length and pads each batch to its longest prompt")
+    parser.add_argument("--kv-cache-blocks", type=int, default=0, help="Server only. Number of blocks in the paged prefix KV cache (0 disables it)")
+    parser.add_argument("--kv-block-size", type=int, default=16, help="Server only. Tokens per paged KV cache block")
+    parser.add_argument("--batch-size", type=int, default=None, help="Offline: samples per generate call. Server: max sequences in the running decode batch")
 
     args = parser.parse_args()
     return args
@@ -66,12 +70,22 @@ def main():
 
     sut_cls = sut_map[args.scenario.lower()]
 
+    sut_kwargs = {}
+    if args.scenario.lower() == "offline":
+        sut_kwargs["batching"] = args.batching
+    else:
+        sut_kwargs["kv_cache_blocks"] = args.kv_cache_blocks
+        sut_kwargs["kv_block_size"] = args.kv_block_size
+
     sut = sut_cls(
         model_path=args.model_path,
         dtype=args.dtype,
         dataset_path=args.dataset_path,
         total_sample_count=args.total_sample_count,
         device=args.device,
+        batch_size=args.batch_size,
+        workers=args.num_workers,
+        **sut_kwargs
     )
 
     # Start sut before loadgen starts
@@ -25,6 +25,7 @@ limitations under the License.
 #include "../system_under_test.h"
 #include "../test_settings.h"
 #include "pybind11/functional.h"
+#include "pybind11/numpy.h"
 #include "pybind11/pybind11.h"
 #include "pybind11/stl.h"
 #include "pybind11/stl_bind.h"
@@ -36,6 +37,8 @@ namespace {
 using IssueQueryCallback = std::function<void(std::vector<QuerySample>)>;
 using FastIssueQueriesCallback =
     std::function<void(std::vector<ResponseId>, std::vector<QuerySampleIndex>)>;
+using ArrayIssueQueriesCallback =
+    std::function<void(pybind11::array_t<uint64_t>, pybind11::array_t<uint64_t>)>;
 using FlushQueriesCallback = std::function<void()>;
 using NameCallback = std::function<std::string()>;
 
@@ -77,6 +80,8 @@ class FastSystemUnderTestTrampoline : public SystemUnderTestTrampoline {
     pybind11::gil_scoped_acquire gil_acquirer;
     std::vector<ResponseId> responseIds;
     std::vector<QuerySampleIndex> querySampleIndices;
+    responseIds.reserve(samples.size());
+    querySampleIndices.reserve(samples.size());
     for (auto& s : samples) {
       responseIds.push_back(s.id);
       querySampleIndices.push_back(s.index);
@@ -88,6 +93,34 @@ class FastSystemUnderTestTrampoline : public SystemUnderTestTrampoline {
   FastIssueQueriesCallback fast_issue_cb_;
 };
 
+// Hands the response ids and sample indices to Python as two uint64 NumPy
+// arrays, filled directly without creating a Python object per sample.
+class ArraySystemUnderTestTrampoline : public SystemUnderTestTrampoline {
+ public:
+  ArraySystemUnderTestTrampoline(std::string name,
+                                 ArrayIssueQueriesCallback array_issue_cb,
+                                 FlushQueriesCallback flush_queries_cb)
+      : SystemUnderTestTrampoline(name, nullptr, flush_queries_cb),
+        array_issue_cb_(array_issue_cb) {}
+  ~ArraySystemUnderTestTrampoline() override = default;
+
+  void IssueQuery(const std::vector<QuerySample>& samples) override {
+    pybind11::gil_scoped_acquire gil_acquirer;
+    pybind11::array_t<uint64_t> responseIds(samples.size());
+    pybind11::array_t<uint64_t> querySampleIndices(samples.size());
+    uint64_t* ids = responseIds.mutable_data();
+    uint64_t* indices = querySampleIndices.mutable_data();
+    for (size_t i = 0; i < samples.size(); i++) {
+      ids[i] = samples[i].id;
+      indices[i] = samples[i].index;
+    }
+    array_issue_cb_(responseIds, querySampleIndices);
+  }
+
+ private:
+  ArrayIssueQueriesCallback array_issue_cb_;
+};
+
 using LoadSamplesToRamCallback =
     std::function<void(std::vector<QuerySampleIndex>)>;
 using UnloadSamplesFromRamCallback =
@@ -194,6 +227,19 @@ void DestroyFastSUT(uintptr_t sut) {
   delete sut_cast;
 }
 
+uintptr_t ConstructArraySUT(ArrayIssueQueriesCallback array_issue_cb,
+                            FlushQueriesCallback flush_queries_cb) {
+  ArraySystemUnderTestTrampoline* sut = new ArraySystemUnderTestTrampoline(
+      "PyArraySUT", array_issue_cb, flush_queries_cb);
+  return reinterpret_cast<uintptr_t>(sut);
+}
+
+void DestroyArraySUT(uintptr_t sut) {
+  ArraySystemUnderTestTrampoline* sut_cast =
+      reinterpret_cast<ArraySystemUnderTestTrampoline*>(sut);
+  delete sut_cast;
+}
+
 uintptr_t ConstructQSL(
     size_t total_sample_count, size_t performance_sample_count,
     LoadSamplesToRamCallback load_samples_to_ram_cb,
@@ -264,6 +310,101 @@ void FirstTokenComplete(std::vector<QuerySampleResponse> responses,
   mlperf::FirstTokenComplete(responses.data(), responses.size(), response_cb);
 }
 
+namespace {
+
+// Size in bytes of a C-contiguous buffer. Throws for any other layout, since
+// the loadgen reads responses as a single contiguous range.
+size_t ContiguousSize(const pybind11::buffer_info& info) {
+  pybind11::ssize_t expected_stride = info.itemsize;
+  for (pybind11::ssize_t i = info.ndim - 1; i >= 0; i--) {
+    if (info.shape[i] != 1 && info.strides[i] != expected_stride) {
+      throw std::invalid_argument("Response buffer must be C-contiguous.");
+    }
+    expected_stride *= info.shape[i];
+  }
+  return info.size * info.itemsize;
+}
+
+using NTokensArray =
+    pybind11::array_t<int64_t, pybind11::array::c_style |
+                                   pybind11::array::forcecast>;
+
+int64_t NTokensAt(const pybind11::object& n_tokens, const NTokensArray& array,
+                  size_t i) {
+  return n_tokens.is_none() ? 0 : array.at(i);
+}
+
+}  // namespace
+
+/// \brief Completes one sample per buffer, pointing the responses directly
+/// at the buffers' memory (NumPy arrays, memoryviews, bytes, ...).
+/// The loadgen copies what it logs before returning, so the buffers only
+/// need to stay alive for the duration of the call.
+void QuerySamplesCompleteBuffers(std::vector<ResponseId> ids,
+                                 std::vector<pybind11::buffer> buffers,
+                                 pybind11::object n_tokens,
+                                 ResponseCallback response_cb = {}) {
+  if (ids.size() != buffers.size()) {
+    throw std::invalid_argument("ids and buffers differ in length.");
+  }
+  NTokensArray n_tokens_array;
+  if (!n_tokens.is_none()) {
+    n_tokens_array = NTokensArray::ensure(n_tokens);
+    if (!n_tokens_array || static_cast<size_t>(n_tokens_array.size()) != ids.size()) {
+      throw std::invalid_argument("n_tokens must hold one count per id.");
+    }
+  }
+
+  // The buffer views are released when infos is destroyed, with the GIL held.
+  std::vector<pybind11::buffer_info> infos;
+  infos.reserve(buffers.size());
+  std::vector<QuerySampleResponse> responses(ids.size());
+  for (size_t i = 0; i < ids.size(); i++) {
+    infos.push_back(buffers[i].request());
+    responses[i] = {ids[i], reinterpret_cast<uintptr_t>(infos[i].ptr),
+                    ContiguousSize(infos[i]),
+                    NTokensAt(n_tokens, n_tokens_array, i)};
+  }
+
+  pybind11::gil_scoped_release gil_releaser;
+  mlperf::QuerySamplesComplete(responses.data(), responses.size(), response_cb);
+}
+
+/// \brief Completes len(ids) samples at once: sample i is row i of the
+/// C-contiguous array `data`, whose leading dimension must equal len(ids).
+/// No per-sample Python object is created.
+void QuerySamplesCompleteArray(
+    pybind11::array_t<ResponseId, pybind11::array::c_style |
+                                      pybind11::array::forcecast> ids,
+    pybind11::buffer data, pybind11::object n_tokens,
+    ResponseCallback response_cb = {}) {
+  pybind11::buffer_info info = data.request();
+  size_t count = ids.size();
+  if (info.ndim < 1 || static_cast<size_t>(info.shape[0]) != count) {
+    throw std::invalid_argument(
+        "data must have one row per id on its leading dimension.");
+  }
+  NTokensArray n_tokens_array;
+  if (!n_tokens.is_none()) {
+    n_tokens_array = NTokensArray::ensure(n_tokens);
+    if (!n_tokens_array || static_cast<size_t>(n_tokens_array.size()) != count) {
+      throw std::invalid_argument("n_tokens must hold one count per id.");
+    }
+  }
+  size_t row_size = count ? ContiguousSize(info) / count : 0;
+
+  const ResponseId* id_data = ids.data();
+  uint8_t* row = reinterpret_cast<uint8_t*>(info.ptr);
+  std::vector<QuerySampleResponse> responses(count);
+  for (size_t i = 0; i < count; i++, row += row_size) {
+    responses[i] = {id_data[i], reinterpret_cast<uintptr_t>(row), row_size,
+                    NTokensAt(n_tokens, n_tokens_array, i)};
+  }
+
+  pybind11::gil_scoped_release gil_releaser;
+  mlperf::QuerySamplesComplete(responses.data(), responses.size(), response_cb);
+}
+
 PYBIND11_MODULE(mlperf_loadgen, m) {
   m.doc() = "MLPerf Inference load generator.";
 
@@ -343,6 +484,11 @@ PYBIND11_MODULE(mlperf_loadgen, m) {
       .value("EndOfTestOnly", LoggingMode::EndOfTestOnly)
       .value("Synchronous", LoggingMode::Synchronous);
 
+  pybind11::enum_<AccuracyLogFormat>(m, "AccuracyLogFormat")
+      .value("Json", AccuracyLogFormat::Json)
+      .value("Binary", AccuracyLogFormat::Binary)
+      .value("JsonAndBinary", AccuracyLogFormat::JsonAndBinary);
+
   pybind11::class_<LogOutputSettings>(m, "LogOutputSettings")
       .def(pybind11::init<>())
       .def_readwrite("outdir", &LogOutputSettings::outdir)
@@ -353,7 +499,9 @@ PYBIND11_MODULE(mlperf_loadgen, m) {
       .def_readwrite("copy_detail_to_stdout",
                      &LogOutputSettings::copy_detail_to_stdout)
       .def_readwrite("copy_summary_to_stdout",
-                     &LogOutputSettings::copy_summary_to_stdout);
+                     &LogOutputSettings::copy_summary_to_stdout)
+      .def_readwrite("accuracy_log_format",
+                     &LogOutputSettings::accuracy_log_format);
 
   pybind11::class_<LogSettings>(m, "LogSettings")
       .def(pybind11::init<>())
@@ -427,6 +575,12 @@ PYBIND11_MODULE(mlperf_loadgen, m) {
   m.def("DestroyFastSUT", &py::DestroyFastSUT,
         "Destroy the object created by ConstructFastSUT.");
 
+  m.def("ConstructArraySUT", &py::ConstructArraySUT,
+        "Construct the system under test, issuing queries as two uint64 "
+        "NumPy arrays of response ids and sample indices.");
+  m.def("DestroyArraySUT", &py::DestroyArraySUT,
+        "Destroy the object created by ConstructArraySUT.");
+
   m.def("ConstructQSL", &py::ConstructQSL,
         "Construct the query sample library.");
   m.def("DestroyQSL", &py::DestroyQSL,
@@ -454,6 +608,20 @@ PYBIND11_MODULE(mlperf_loadgen, m) {
         "IssueQuery calls have finished.",
         pybind11::arg("responses"),
         pybind11::arg("response_cb") = ResponseCallback{});
+  m.def("QuerySamplesCompleteBuffers", &py::QuerySamplesCompleteBuffers,
+        "Like QuerySamplesComplete, taking the response ids and one object "
+        "supporting the buffer protocol per sample (e.g. a NumPy array). "
+        "The buffers are not copied.",
+        pybind11::arg("ids"), pybind11::arg("buffers"),
+        pybind11::arg("n_tokens") = pybind11::none(),
+        pybind11::arg("response_cb") = ResponseCallback{});
+  m.def("QuerySamplesCompleteArray", &py::QuerySamplesCompleteArray,
+        "Like QuerySamplesComplete, taking an array of response ids and a "
+        "C-contiguous array with one row per id. Completes all the samples "
+        "in one call without copying the rows.",
+        pybind11::arg("ids"), pybind11::arg("data"),
+        pybind11::arg("n_tokens") = pybind11::none(),
+        pybind11::arg("response_cb") = ResponseCallback{});
   m.def("FirstTokenComplete", &py::FirstTokenComplete,
         "Called by the SUT to indicate that tokens from some combination of"
         "IssueQuery calls have finished.",
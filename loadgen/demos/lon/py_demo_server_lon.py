@@ -18,30 +18,43 @@ Python demo showing how to use the MLPerf Inference LoadGen over the Network bin
 This programs runs in the LON Node side.
 It runs the demo in MLPerf server mode over the network.
 It communicates over the network with a Network SUT node,
-which is running the Network SUT demo based on a flask server, implemented in SUT_over_network.py
+which is running the Network SUT demo based on an asyncio server, implemented in sut_over_network_demo.py
 """
 
 import threading
-import requests
+import queue
 import array
-import time
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "lon"))
 
+import numpy as np
 from absl import app
 from absl import flags
 import mlperf_loadgen
+from network_client import NetworkClient
 
 FLAGS = flags.FLAGS
 
 flags.DEFINE_list('sut_server', 'http://localhost:8000',
                     'Address of the server(s) under test.')
+flags.DEFINE_integer('connections_per_node', 2,
+                     'Persistent connections opened to each SUT node.')
+flags.DEFINE_integer('max_inflight_per_node', 64,
+                     'Maximum number of outstanding requests per SUT node.')
+flags.DEFINE_enum('dispatch_policy', 'round_robin',
+                  ['round_robin', 'least_outstanding', 'power_of_two', 'weighted'],
+                  'How queries are spread across the SUT nodes.')
 
 
 class QSL:
     """Demo QuerySampleLibrary with dummy features."""
 
     def __init__(self, total_sample_count, performance_sample_count):
+        # Fixed-width uint8 rows so that the SUT can batch queries together
         self.eval_features = {
-            i: f"what_is_my_dummy_feature_{i}?" for i in range(total_sample_count)}
+            i: np.frombuffer(f"what_is_my_dummy_feature_{i}?".ljust(32).encode("utf-8"), dtype=np.uint8)
+            for i in range(total_sample_count)}
         self.qsl = mlperf_loadgen.ConstructQSL(
             total_sample_count, performance_sample_count, self.load_samples_to_ram, self.unload_samples_from_ram)
 
@@ -67,10 +80,12 @@ class QSL:
 
 class QDL:
     """QDL acting as a proxy to the SUT.
-    This QDL communicates with the SUT via HTTP.
-    It uses two endpoints to communicate with the SUT:
-    - /predict/ : Send a query to the SUT and get a response.
-    - /getname/ : Get the name of the SUT. Send a getname to the SUT and get a response.
+    This QDL communicates with the SUT over TCP using the binary protocol in lon/network_protocol.py.
+    It uses two message types to communicate with the SUT:
+    - MSG_PREDICT : Send a query to the SUT and get a response.
+    - MSG_GET_NAME : Get the name of the SUT. Send a getname to the SUT and get a response.
+    Requests are pipelined over a pool of persistent connections per SUT node (lon/network_client.py),
+    and each query goes to the node chosen by the dispatch policy (lon/dispatch.py).
     """
 
     def __init__(self, qsl: QSL, sut_server_addr: list):
@@ -81,78 +96,79 @@ class QDL:
             sut_server_addr: A list of addresses of the SUT.
         """
         self.qsl = qsl
+        self.sut_server_addr = sut_server_addr
+        self.num_nodes = len(sut_server_addr)
+        self.client = NetworkClient(sut_server_addr,
+                                    connections_per_node=FLAGS.connections_per_node,
+                                    max_inflight_per_node=FLAGS.max_inflight_per_node,
+                                    policy=FLAGS.dispatch_policy)
  
         # Construct QDL from the python binding
         self.qdl = mlperf_loadgen.ConstructQDL(
             self.issue_query, self.flush_queries, self.client_get_name)
-        self.sut_server_addr = sut_server_addr
-        self.num_nodes = len(sut_server_addr)
 
-        # For round robin between the SUTs:
-        self.next_sut_id = 0
-        self.lock = threading.Lock()
+        # A single dispatch thread sends the issued samples; responses complete on the receiver threads
+        self.issue_queue = queue.Queue()
+        self.dispatch_thread = threading.Thread(target=self.dispatch_worker, daemon=True)
+        self.dispatch_thread.start()
 
     def issue_query(self, query_samples):
         """Process the query to send to the SUT"""
-        threading.Thread(target=self.process_query_async,
-                         args=[query_samples]).start()
+        self.issue_queue.put(query_samples)
 
     def flush_queries(self):
         """Flush the queries. Dummy implementation."""
         pass
 
+    def dispatch_worker(self):
+        while True:
+            query_samples = self.issue_queue.get()
+            if query_samples is None:
+                break
+            self.process_query_async(query_samples)
+
     def process_query_async(self, query_samples):
         """
-        This function is called by the Loadgen in a separate thread.
+        This function is called from the dispatch thread.
         It is responsible for
             1. Creating a query for the SUT, by reading the features from the QSL.
             2. Sending the query to the SUT.
-            3. Waiting for the response from the SUT.
-            4. Deserializing the response.
-            5. Calling mlperf_loadgen.QuerySamplesComplete(query_samples, response)
+        When the response arrives, client_predict_done deserializes it and
+        calls mlperf_loadgen.QuerySamplesComplete.
         Args:
             query_samples: A list of QuerySample objects.
         """
-        responses = []
         for s in query_samples:
             # Overall process:
             # QDL builds a real-world query and sends to SUT --> SUT processes --> SUT sends back to QDL
             # Read features from the QSL
             features = self.qsl.get_features(s.index)
 
-            time.sleep(.001)  # Ensure a maximal rate of queries to the SUT
-
-            # Send the query to SUT in round robin
-            # Wait for a response
-            sut_result = self.client_predict(features, s.index)
-            response_array = array.array('B', sut_result.encode('utf-8'))
-            bi = response_array.buffer_info()
-            responses.append(mlperf_loadgen.QuerySampleResponse(
-                s.id, bi[0], bi[1]))
-        mlperf_loadgen.QuerySamplesComplete(responses)
-
-    def get_sut_id_round_robin(self):
-        """Get the SUT id in round robin."""
-        with self.lock:
-            res = self.next_sut_id
-            self.next_sut_id = (self.next_sut_id + 1) % self.num_nodes
-        return res
+            # Send the query to the SUT chosen by the dispatch policy, without waiting for the response
+            self.client_predict(features, s.id)
 
     def client_predict(self, query, id):
-        """Serialize the query, send it to the SUT in round robin, and return the deserialized response."""
-        url = '{}/predict/'.format(self.sut_server_addr[self.get_sut_id_round_robin()])
-        response = requests.post(url, json={'query': query, id: id})
-        return response.json()['result']
+        """Serialize the query and send it to the SUT chosen by the dispatch policy."""
+        self.client.predict({'query': query[np.newaxis, :]},
+                            lambda result, error: self.client_predict_done(id, result, error))
+
+    def client_predict_done(self, id, result, error):
+        """Deserialize the response and complete the sample."""
+        sut_result = result['result'][0] if error is None else np.zeros(0, dtype=np.uint8)
+        response_array = array.array('B', sut_result.tobytes())
+        bi = response_array.buffer_info()
+        mlperf_loadgen.QuerySamplesComplete([mlperf_loadgen.QuerySampleResponse(id, bi[0], bi[1])])
 
     def client_get_name(self):
         """Get the name of the SUT from ALL the SUTS."""
-        if len(self.sut_server_addr) == 1:
-            return requests.post(f'{self.sut_server_addr[0]}/getname/').json()['name']
-    
-        sut_names = [requests.post(f'{addr}/getname/').json()['name'] for addr in self.sut_server_addr]
+        sut_names = [self.client.get_name(i) for i in range(self.num_nodes)]
+        if len(sut_names) == 1:
+            return sut_names[0]
         return "Multi-node SUT: " + ', '.join(sut_names)
 
     def __del__(self):
+        self.issue_queue.put(None)
+        self.client.close()
         mlperf_loadgen.DestroyQDL(self.qdl)
 
 
@@ -172,6 +188,10 @@ def main(argv):
 
     mlperf_loadgen.StartTest(qdl.qdl, qsl.qsl, settings)
 
+    # Per-node in-flight and latency counters
+    for node_id, stats in enumerate(qdl.client.stats()):
+        print("SUT node {}: {}".format(node_id, stats))
+
 
 if __name__ == "__main__":
     app.run(main)
@@ -19,64 +19,46 @@ Python demo showing how to use the MLPerf Inference load generator bindings over
 This part of the demo runs the "demo SUT" which is connected over the network to the LON node.
 A corresponding "demo LON node" with the demo test is implemented in py_demo_server_lon.py.
 
-The SUT is implemented using a Flask server, with dummy implementation of the inference processing.
-Two endpoints are exposed:
-- /predict/ : Receives a query (e.g., a text) runs inference, and returns a prediction.
-- /getname/ : Get the name of the SUT.
-
-The current implementation is a dummy implementation, which does not use 
-a real DNN model, batching, or pre/postprocessing code,
-but rather just returns subset of the input query as a response,
+The SUT is the asyncio network SUT from lon/network_SUT.py, with a dummy implementation of the
+inference processing. It speaks the binary protocol of lon/network_protocol.py and supports
+two requests:
+- MSG_PREDICT : Receives a batch of queries (e.g., texts) runs inference, and returns predictions.
+- MSG_GET_NAME : Get the name of the SUT.
+- MSG_GET_HEALTH : Get the capacity and queue depth of the SUT, used by weighted dispatch.
+
+Concurrent requests are coalesced into one call of the dummy backend within --batch_timeout_ms.
+The current implementation is a dummy implementation, which does not use
+a real DNN model, or pre/postprocessing code,
+but rather just returns the input query as a response,
 Yet, it illustrates the basic structure of a SUT server.
 """
 
 import argparse
-from flask import Flask, request, jsonify
-
-
-app = Flask(__name__)
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "lon"))
 
+import network_SUT
 
-node = ""
-def preprocess(query):
-    """[SUT Node] A dummy preprocess."""
-    # Here may come for example batching, tokenization, resizing, normalization, etc.
-    response = query
-    return response
 
-
-def dnn_model(query):
+class DemoBackend:
     """[SUT Node] A dummy DNN model."""
-    # Here may come for example a call to a dnn model such as resnet, bert, etc.
-    response = query
-    return response
-
-
-def postprocess(query):
-    """[SUT Node] A dummy postprocess."""
-    # Here may come for example a postprocessing call, e.g., NMS, detokenization, etc.
-    response = query
-    return response
-
-
-@app.route('/predict/', methods=['POST'])
-def predict():
-    """Receives a query (e.g., a text) runs inference, and returns a prediction."""
-    query = request.get_json(force=True)['query']
-    result = postprocess(dnn_model(preprocess(query)))
-    return jsonify(result=result)
-
 
-@app.route('/getname/', methods=['POST', 'GET'])
-def getname():
-    """Returns the name of the SUT."""
-    return jsonify(name=f'Demo SUT (Network SUT) node' + (' ' + node) if node else '')
+    def process_sample(self, batch):
+        # Here may come for example a call to a dnn model such as resnet, bert, etc.
+        # batch["query"] holds the queries as fixed-width uint8 rows, one per sample.
+        return batch["query"]
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--port', type=int, default=8000)
     parser.add_argument('--node', type=str, default="")
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--batch_timeout_ms', type=float, default=2.0)
+    parser.add_argument('--capacity', type=float, default=None)
     args = parser.parse_args()
-    node = args.node
-    app.run(debug=False, port=args.port)
+    network_SUT.set_node(args.node)
+    network_SUT.set_backend(DemoBackend())
+    network_SUT.run(port=args.port, max_batch_size=args.max_batch_size, batch_timeout_ms=args.batch_timeout_ms,
+                    capacity=args.capacity)
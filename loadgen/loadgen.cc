@@ -681,7 +681,15 @@ struct LogOutputs {
 
     summary_out.open(prefix + "summary" + suffix + ".txt");
     detail_out.open(prefix + "detail" + suffix + ".txt");
-    accuracy_out.open(prefix + "accuracy" + suffix + ".json");
+    if (output_settings.accuracy_log_format != AccuracyLogFormat::Binary) {
+      accuracy_out.open(prefix + "accuracy" + suffix + ".json");
+      accuracy_json = true;
+    }
+    if (output_settings.accuracy_log_format != AccuracyLogFormat::Json) {
+      accuracy_binary_out.open(prefix + "accuracy" + suffix + ".bin",
+                               std::ios::out | std::ios::binary);
+      accuracy_binary = true;
+    }
     trace_out.open(prefix + "trace" + suffix + ".json");
   }
 
@@ -699,6 +707,10 @@ struct LogOutputs {
       all_ofstreams_good = false;
       std::cerr << "LoadGen: Failed to open accuracy log file.";
     }
+    if (!accuracy_binary_out.good()) {
+      all_ofstreams_good = false;
+      std::cerr << "LoadGen: Failed to open binary accuracy log file.";
+    }
     if (!trace_out.good()) {
       all_ofstreams_good = false;
       std::cerr << "LoadGen: Failed to open trace file.";
@@ -709,7 +721,10 @@ struct LogOutputs {
   std::ofstream summary_out;
   std::ofstream detail_out;
   std::ofstream accuracy_out;
+  std::ofstream accuracy_binary_out;
   std::ofstream trace_out;
+  bool accuracy_json = false;
+  bool accuracy_binary = false;
 };
 
 /// \brief Find boundaries of performance settings by widening bounds
@@ -1150,8 +1165,12 @@ void StartTest(SystemUnderTest* sut, QuerySampleLibrary* qsl,
     return;
   }
 
+  std::ostream* accuracy_out =
+      log_outputs.accuracy_json ? &log_outputs.accuracy_out : nullptr;
+  std::ostream* accuracy_binary_out =
+      log_outputs.accuracy_binary ? &log_outputs.accuracy_binary_out : nullptr;
   GlobalLogger().StartLogging(&log_outputs.summary_out, &log_outputs.detail_out,
-                              &log_outputs.accuracy_out,
+                              accuracy_out, accuracy_binary_out,
                               log_settings.log_output.copy_detail_to_stdout,
                               log_settings.log_output.copy_summary_to_stdout);
             
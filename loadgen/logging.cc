@@ -28,6 +28,7 @@ limitations under the License.
 
 #include <cassert>
 #include <cmath>
+#include <cstring>
 #include <future>
 #include <iomanip>
 #include <iostream>
@@ -110,7 +111,7 @@ const std::string ArgValueTransform(const LogBinaryAsHexString& value) {
     return "\"\"";
   }
   std::string hex;
-  hex.reserve(value.data->size() + 2);
+  hex.reserve(2 * value.data->size() + 2);
   hex.push_back('"');
   for (auto b : *value.data) {
     hex.push_back(Bin2Hex(b >> 4));
@@ -210,7 +211,9 @@ void AsyncLog::SetCurrentPidTid(uint64_t pid, uint64_t tid) {
 }
 
 void AsyncLog::SetLogFiles(std::ostream* summary, std::ostream* detail,
-                           std::ostream* accuracy, bool copy_detail_to_stdout,
+                           std::ostream* accuracy,
+                           std::ostream* accuracy_binary,
+                           bool copy_detail_to_stdout,
                            bool copy_summary_to_stdout,
                            PerfClock::time_point log_origin) {
   std::unique_lock<std::mutex> lock(log_mutex_);
@@ -246,16 +249,24 @@ void AsyncLog::SetLogFiles(std::ostream* summary, std::ostream* detail,
   if (detail_out_) {
     detail_out_->flush();
   }
-  if (accuracy_out_ != &std::cerr) {
+  if (accuracy_out_ && accuracy_out_ != &std::cerr) {
     WriteAccuracyFooterLocked();
     accuracy_out_->flush();
   }
+  if (accuracy_binary_out_) {
+    WriteAccuracyBinaryFooterLocked();
+    accuracy_binary_out_->flush();
+  }
   summary_out_ = summary;
   detail_out_ = detail;
   accuracy_out_ = accuracy;
-  if (accuracy_out_ != &std::cerr) {
+  accuracy_binary_out_ = accuracy_binary;
+  if (accuracy_out_ && accuracy_out_ != &std::cerr) {
     WriteAccuracyHeaderLocked();
   }
+  if (accuracy_binary_out_) {
+    WriteAccuracyBinaryHeaderLocked();
+  }
   copy_detail_to_stdout_ = copy_detail_to_stdout;
   copy_summary_to_stdout_ = copy_summary_to_stdout;
   log_origin_ = log_origin;
@@ -281,6 +292,14 @@ void AsyncLog::StopTrace() {
 void AsyncLog::LogAccuracy(uint64_t seq_id, const QuerySampleIndex qsl_idx,
                            const LogBinaryAsHexString& response) {
   std::unique_lock<std::mutex> lock(log_mutex_);
+  if (accuracy_binary_out_) {
+    const std::vector<uint8_t>* token = nullptr;
+    if (use_tokens_ && needs_first_token_) {
+      const size_t i = seq_id - latencies_first_sample_sequence_id_;
+      token = token_records_[i].data;
+    }
+    WriteAccuracyBinaryRecordLocked(seq_id, qsl_idx, response.data, token);
+  }
   if (!accuracy_out_) {
     return;
   }
@@ -319,6 +338,9 @@ void AsyncLog::Flush() {
     if (accuracy_out_) {
       accuracy_out_->flush();
     }
+    if (accuracy_binary_out_) {
+      accuracy_binary_out_->flush();
+    }
   }
 
   {
@@ -336,6 +358,61 @@ void AsyncLog::WriteAccuracyHeaderLocked() {
 
 void AsyncLog::WriteAccuracyFooterLocked() { *accuracy_out_ << "\n]\n"; }
 
+void AsyncLog::WriteAccuracyBinaryHeaderLocked() {
+  // The header is rewritten with the final counts by the footer.
+  AccuracyLogBinaryHeader header = {};
+  std::memcpy(header.magic, kAccuracyLogBinaryMagic, sizeof(header.magic));
+  header.version = kAccuracyLogBinaryVersion;
+  accuracy_binary_out_->write(reinterpret_cast<const char*>(&header),
+                              sizeof(header));
+  accuracy_binary_index_.clear();
+  accuracy_binary_offset_ = sizeof(header);
+  accuracy_binary_has_tokens_ = false;
+}
+
+void AsyncLog::WriteAccuracyBinaryFooterLocked() {
+  AccuracyLogBinaryHeader header = {};
+  std::memcpy(header.magic, kAccuracyLogBinaryMagic, sizeof(header.magic));
+  header.version = kAccuracyLogBinaryVersion;
+  header.flags = accuracy_binary_has_tokens_ ? kAccuracyLogBinaryHasTokens : 0;
+  header.num_records = accuracy_binary_index_.size();
+  header.index_offset = accuracy_binary_offset_;
+
+  accuracy_binary_out_->write(
+      reinterpret_cast<const char*>(accuracy_binary_index_.data()),
+      accuracy_binary_index_.size() * sizeof(AccuracyLogBinaryRecord));
+  accuracy_binary_out_->seekp(0);
+  accuracy_binary_out_->write(reinterpret_cast<const char*>(&header),
+                              sizeof(header));
+  accuracy_binary_out_->seekp(0, std::ios::end);
+  accuracy_binary_index_.clear();
+}
+
+void AsyncLog::WriteAccuracyBinaryRecordLocked(
+    uint64_t seq_id, const QuerySampleIndex qsl_idx,
+    const std::vector<uint8_t>* response, const std::vector<uint8_t>* token) {
+  AccuracyLogBinaryRecord record = {};
+  record.seq_id = seq_id;
+  record.qsl_idx = qsl_idx;
+  record.offset = accuracy_binary_offset_;
+  if (response) {
+    record.size = response->size();
+    accuracy_binary_out_->write(
+        reinterpret_cast<const char*>(response->data()), record.size);
+  }
+  accuracy_binary_offset_ += record.size;
+
+  record.token_offset = accuracy_binary_offset_;
+  if (token) {
+    record.token_size = token->size();
+    accuracy_binary_out_->write(reinterpret_cast<const char*>(token->data()),
+                                record.token_size);
+    accuracy_binary_has_tokens_ = true;
+  }
+  accuracy_binary_offset_ += record.token_size;
+  accuracy_binary_index_.push_back(record);
+}
+
 void AsyncLog::RestartLatencyRecording(uint64_t first_sample_sequence_id,
                                        size_t latencies_to_reserve) {
   std::unique_lock<std::mutex> lock(latencies_mutex_);
@@ -802,10 +879,13 @@ void Logger::StopIOThread() {
 }
 
 void Logger::StartLogging(std::ostream* summary, std::ostream* detail,
-                          std::ostream* accuracy, bool copy_detail_to_stdout,
+                          std::ostream* accuracy,
+                          std::ostream* accuracy_binary,
+                          bool copy_detail_to_stdout,
                           bool copy_summary_to_stdout) {
-  async_logger_.SetLogFiles(summary, detail, accuracy, copy_detail_to_stdout,
-                            copy_summary_to_stdout, PerfClock::now());
+  async_logger_.SetLogFiles(summary, detail, accuracy, accuracy_binary,
+                            copy_detail_to_stdout, copy_summary_to_stdout,
+                            PerfClock::now());
 }
 
 void Logger::StopLogging() {
@@ -823,8 +903,8 @@ void Logger::StopLogging() {
   std::promise<void> io_thread_flushed_this_thread;
   Log([&](AsyncLog&) { io_thread_flushed_this_thread.set_value(); });
   io_thread_flushed_this_thread.get_future().wait();
-  async_logger_.SetLogFiles(&std::cerr, &std::cerr, &std::cerr, false, false,
-                            PerfClock::now());
+  async_logger_.SetLogFiles(&std::cerr, &std::cerr, &std::cerr, nullptr, false,
+                            false, PerfClock::now());
 }
 
 void Logger::StartNewTrace(std::ostream* trace_out,
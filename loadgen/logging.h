@@ -70,6 +70,36 @@ struct LogBinaryAsHexString {
   std::vector<uint8_t>* data;
 };
 
+/// \brief Header of the binary accuracy log.
+/// \details The file is laid out as:
+///   AccuracyLogBinaryHeader
+///   response payloads (and token payloads), back to back
+///   num_records x AccuracyLogBinaryRecord, starting at index_offset
+/// All fields are little-endian. Offsets are from the start of the file.
+struct AccuracyLogBinaryHeader {
+  char magic[8];
+  uint32_t version;
+  uint32_t flags;
+  uint64_t num_records;
+  uint64_t index_offset;
+};
+
+/// \brief One entry of the binary accuracy log index.
+struct AccuracyLogBinaryRecord {
+  uint64_t seq_id;
+  uint64_t qsl_idx;
+  uint64_t offset;
+  uint64_t size;
+  uint64_t token_offset;
+  uint64_t token_size;
+};
+
+constexpr char kAccuracyLogBinaryMagic[8] = {'M', 'L', 'P', 'A',
+                                             'C', 'C', 'B', '1'};
+constexpr uint32_t kAccuracyLogBinaryVersion = 1;
+/// \brief Set in AccuracyLogBinaryHeader::flags when records carry token data.
+constexpr uint32_t kAccuracyLogBinaryHasTokens = 1;
+
 /// \brief By default, print out the value directly.
 template <typename T>
 const T& ArgValueTransform(const T& value) {
@@ -216,8 +246,8 @@ class ChromeTracer {
 class AsyncLog {
  public:
   void SetLogFiles(std::ostream* summary, std::ostream* detail,
-                   std::ostream* accuracy, bool copy_detail_to_stdout,
-                   bool copy_summary_to_stdout,
+                   std::ostream* accuracy, std::ostream* accuracy_binary,
+                   bool copy_detail_to_stdout, bool copy_summary_to_stdout,
                    PerfClock::time_point log_origin);
   void StartNewTrace(std::ostream* trace_out, PerfClock::time_point origin);
   void StopTrace();
@@ -331,6 +361,12 @@ class AsyncLog {
  private:
   void WriteAccuracyHeaderLocked();
   void WriteAccuracyFooterLocked();
+  void WriteAccuracyBinaryHeaderLocked();
+  void WriteAccuracyBinaryFooterLocked();
+  void WriteAccuracyBinaryRecordLocked(uint64_t seq_id,
+                                       const QuerySampleIndex qsl_idx,
+                                       const std::vector<uint8_t>* response,
+                                       const std::vector<uint8_t>* token);
 
   void LogArgs(std::ostream*) {}
 
@@ -358,6 +394,10 @@ class AsyncLog {
   std::ostream* summary_out_ = &std::cerr;
   std::ostream* detail_out_ = &std::cerr;
   std::ostream* accuracy_out_ = &std::cerr;
+  std::ostream* accuracy_binary_out_ = nullptr;
+  std::vector<AccuracyLogBinaryRecord> accuracy_binary_index_;
+  uint64_t accuracy_binary_offset_ = 0;
+  bool accuracy_binary_has_tokens_ = false;
   // TODO: Instead of these bools, use a class that forwards to two streams.
   bool copy_detail_to_stdout_ = false;
   bool copy_summary_to_stdout_ = false;
@@ -408,8 +448,8 @@ class Logger {
   void StopIOThread();
 
   void StartLogging(std::ostream* summary, std::ostream* detail,
-                    std::ostream* accuracy, bool copy_detail_to_stdout,
-                    bool copy_summary_to_stdout);
+                    std::ostream* accuracy, std::ostream* accuracy_binary,
+                    bool copy_detail_to_stdout, bool copy_summary_to_stdout);
   void StopLogging();
 
   void StartNewTrace(std::ostream* trace_out, PerfClock::time_point origin);
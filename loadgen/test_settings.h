@@ -284,6 +284,25 @@ enum class LoggingMode {
   Synchronous,
 };
 
+///
+/// \enum AccuracyLogFormat
+/// Specifies how accuracy results are written.
+/// * **Json**
+///  + "<prefix>accuracy<suffix>.json": every response as a hex string in a
+///  JSON list. This is the format the submission tooling expects.
+/// * **Binary**
+///  + "<prefix>accuracy<suffix>.bin": the raw response bytes followed by a
+///  fixed-size index of (seq_id, qsl_idx, offset, size) records, which can be
+///  memory mapped for random access by qsl_idx. No JSON log is written; it can
+///  be regenerated with tools/accuracy_log/convert_accuracy_log.py.
+/// * **JsonAndBinary**
+///  + Both of the above.
+enum class AccuracyLogFormat {
+  Json,
+  Binary,
+  JsonAndBinary,
+};
+
 ///
 /// \brief Specifies where log outputs should go.
 ///
@@ -301,6 +320,7 @@ struct LogOutputSettings {
   bool prefix_with_datetime = false;
   bool copy_detail_to_stdout = false;
   bool copy_summary_to_stdout = false;
+  AccuracyLogFormat accuracy_log_format = AccuracyLogFormat::Json;
 };
 
 ///
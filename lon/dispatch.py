@@ -0,0 +1,96 @@
+# Copyright 2023 MLCommons. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+"""
+Multi-node dispatch policies for the LON node.
+
+A policy picks the SUT node that receives the next query. Policies read the
+counters that network_client.NodeClient keeps for every node (requests in
+flight, reported capacity), so a node that falls behind receives less work
+instead of accumulating a backlog:
+
+- round_robin       : rotate over the nodes regardless of their load.
+- least_outstanding : the node with the fewest requests in flight.
+- power_of_two      : the less loaded of two nodes sampled at random.
+- weighted          : the fewest requests in flight per unit of capacity, as
+                      reported by each node in its MSG_HEALTH answer.
+"""
+
+import random
+import threading
+
+
+class RoundRobin:
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.next_node = 0
+        self.lock = threading.Lock()
+
+    def select(self):
+        with self.lock:
+            node_id = self.next_node
+            self.next_node = (self.next_node + 1) % len(self.nodes)
+        return node_id
+
+
+class LeastOutstanding:
+    def __init__(self, nodes):
+        self.nodes = nodes
+        # Ties are broken round robin so that idle nodes share the load evenly
+        self.round_robin = RoundRobin(nodes)
+
+    def select(self):
+        start = self.round_robin.select()
+        order = [(start + i) % len(self.nodes) for i in range(len(self.nodes))]
+        return min(order, key=lambda i: self.nodes[i].inflight)
+
+
+class PowerOfTwoChoices:
+    def __init__(self, nodes, seed=None):
+        self.nodes = nodes
+        self.rng = random.Random(seed)
+
+    def select(self):
+        if len(self.nodes) == 1:
+            return 0
+        a, b = self.rng.sample(range(len(self.nodes)), 2)
+        return a if self.nodes[a].inflight <= self.nodes[b].inflight else b
+
+
+class WeightedLeastOutstanding:
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.round_robin = RoundRobin(nodes)
+        for node in nodes:
+            node.get_health()
+
+    def select(self):
+        start = self.round_robin.select()
+        order = [(start + i) % len(self.nodes) for i in range(len(self.nodes))]
+        return min(order, key=lambda i: (self.nodes[i].inflight + 1) / max(self.nodes[i].capacity, 1e-6))
+
+
+DISPATCH_POLICIES = {
+    "round_robin": RoundRobin,
+    "least_outstanding": LeastOutstanding,
+    "power_of_two": PowerOfTwoChoices,
+    "weighted": WeightedLeastOutstanding,
+}
+
+
+def get_policy(name, nodes):
+    if name not in DISPATCH_POLICIES:
+        raise ValueError("Unknown dispatch policy {!r}, expected one of {}".format(name, ", ".join(DISPATCH_POLICIES)))
+    return DISPATCH_POLICIES[name](nodes)
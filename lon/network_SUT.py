@@ -13,18 +13,33 @@
 # limitations under the License.
 # =============================================================================
 
-import array
-import json
+"""
+Network SUT node for LoadGen over the Network.
+
+An asyncio TCP server speaking the binary protocol of network_protocol.py.
+Requests carry a dict of tensors whose leading dimension is the number of
+samples in the request. Requests arriving from any connection within
+`batch_timeout_ms` of each other (up to `max_batch_size` samples) are
+concatenated and run through a single `backend.process_sample` call, and the
+outputs are split back per request.
+
+The backend contract is:
+    backend.process_sample(batch) -> np.ndarray
+where `batch` is a dict of name -> np.ndarray of shape [N, ...] and the
+returned array has the N samples on its leading dimension.
+"""
+
+import asyncio
+import concurrent.futures
 import os
 import sys
+import time
 sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import numpy as np
 
-import argparse
-from flask import Flask, request, jsonify
-
-
-app = Flask(__name__)
+import network_protocol as proto
 
 
 node = ""
@@ -33,6 +48,10 @@ def set_backend(b):
     global backend
     backend = b
 
+def set_node(n):
+    global node
+    node = n
+
 def preprocess(query):
     """[SUT Node] A dummy preprocess."""
     # Here may come for example batching, tokenization, resizing, normalization, etc.
@@ -53,15 +72,154 @@ def postprocess(query):
     return response
 
 
-@app.route('/predict/', methods=['POST'])
-def predict():
-    """Receives a query (e.g., a text) runs inference, and returns a prediction."""
-    query = request.get_json(force=True)['query']
-    result = postprocess(dnn_model(preprocess(query)))
-    return jsonify(result=result)
-
-
-@app.route('/getname/', methods=['POST', 'GET'])
-def getname():
+def get_name():
     """Returns the name of the SUT."""
-    return jsonify(name=f'Demo SUT (Network SUT) node' + (' ' + node) if node else '')
+    return 'Network SUT node' + (' ' + node if node else '')
+
+
+class Batcher:
+    """Coalesces concurrent requests into one backend call."""
+
+    def __init__(self, predict_fn, max_batch_size=32, batch_timeout_ms=2.0, num_workers=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.batch_timeout = batch_timeout_ms / 1000.0
+        self.queue = asyncio.Queue()
+        # Inference runs off the event loop so that the server keeps reading requests meanwhile
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+        self.inflight = asyncio.Semaphore(num_workers)
+
+        self.num_batches = 0
+        self.num_samples = 0
+
+    async def submit(self, tensors):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((tensors, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.inflight.acquire()
+            requests = [await self.queue.get()]
+            num_samples = _num_samples(requests[0][0])
+
+            # Keep collecting until the window closes or the batch is full
+            deadline = loop.time() + self.batch_timeout
+            while num_samples < self.max_batch_size:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    request = self.queue.get_nowait()
+                requests.append(request)
+                num_samples += _num_samples(request[0])
+
+            loop.create_task(self._run_batch(requests))
+
+    async def _run_batch(self, requests):
+        loop = asyncio.get_running_loop()
+        try:
+            sizes = [_num_samples(tensors) for tensors, _ in requests]
+            batch = {name: np.concatenate([tensors[name] for tensors, _ in requests])
+                     for name in requests[0][0]}
+            outputs = await loop.run_in_executor(self.executor, self.predict_fn, batch)
+            outputs = np.asarray(outputs)
+
+            self.num_batches += 1
+            self.num_samples += sum(sizes)
+
+            offset = 0
+            for (_, future), size in zip(requests, sizes):
+                future.set_result(outputs[offset:offset + size])
+                offset += size
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.inflight.release()
+
+
+def _num_samples(tensors):
+    return len(next(iter(tensors.values()))) if tensors else 0
+
+
+def get_health(batcher, capacity):
+    """Returns the MSG_HEALTH tensors of this node."""
+    return {"capacity": np.array([capacity], dtype=np.float64),
+            "queued": np.array([batcher.queue.qsize()], dtype=np.int64)}
+
+
+async def handle_connection(reader, writer, batcher, capacity):
+    """Serves one client connection. Requests are answered as they finish, tagged with their request id."""
+    pending = set()
+    write_lock = asyncio.Lock()
+
+    async def answer(request_id, tensors):
+        try:
+            msg_type, response = proto.MSG_RESULT, {"result": postprocess(await batcher.submit(preprocess(tensors)))}
+        except Exception as e:
+            msg_type, response = proto.MSG_ERROR, {"error": proto.encode_string(repr(e))}
+        async with write_lock:
+            proto.write_message(writer, msg_type, request_id, response)
+            await writer.drain()
+
+    try:
+        while True:
+            try:
+                msg_type, request_id, tensors = await proto.read_message(reader)
+            except asyncio.IncompleteReadError:
+                break
+
+            if msg_type == proto.MSG_PREDICT:
+                task = asyncio.get_running_loop().create_task(answer(request_id, tensors))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            elif msg_type == proto.MSG_GET_NAME:
+                async with write_lock:
+                    proto.write_message(writer, proto.MSG_NAME, request_id, {"name": proto.encode_string(get_name())})
+                    await writer.drain()
+            elif msg_type == proto.MSG_GET_HEALTH:
+                async with write_lock:
+                    proto.write_message(writer, proto.MSG_HEALTH, request_id, get_health(batcher, capacity))
+                    await writer.drain()
+            else:
+                raise proto.ProtocolError("Unexpected message type {}".format(msg_type))
+    finally:
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        writer.close()
+
+
+async def serve(host="0.0.0.0", port=8000, max_batch_size=32, batch_timeout_ms=2.0, num_workers=1, capacity=None):
+    """`capacity` is reported to the LON node for weighted dispatch; defaults to max_batch_size * num_workers."""
+    if capacity is None:
+        capacity = max_batch_size * num_workers
+    batcher = Batcher(dnn_model, max_batch_size=max_batch_size, batch_timeout_ms=batch_timeout_ms, num_workers=num_workers)
+    server = await asyncio.start_server(lambda r, w: handle_connection(r, w, batcher, capacity), host, port)
+    print("Serving '{}' on {}:{} (max batch size {}, batch window {} ms, capacity {})".format(
+        get_name(), host, port, max_batch_size, batch_timeout_ms, capacity))
+
+    start = time.time()
+    batcher_task = asyncio.get_running_loop().create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher_task.cancel()
+        if batcher.num_batches:
+            print("Served {} samples in {} batches ({:.2f} samples/batch) over {:.1f} s".format(
+                batcher.num_samples, batcher.num_batches, batcher.num_samples / batcher.num_batches, time.time() - start))
+
+
+def run(port=8000, host="0.0.0.0", max_batch_size=32, batch_timeout_ms=2.0, num_workers=1, capacity=None):
+    try:
+        asyncio.run(serve(host, port, max_batch_size, batch_timeout_ms, num_workers, capacity))
+    except KeyboardInterrupt:
+        pass
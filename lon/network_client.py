@@ -0,0 +1,225 @@
+# Copyright 2023 MLCommons. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+"""
+LON node side client for the network SUT nodes.
+
+Each SUT node gets a small pool of persistent TCP connections. Requests are
+pipelined: a connection carries many outstanding requests, each tagged with a
+request id, and a single receiver thread per connection dispatches responses
+to their completion callbacks as they arrive (in any order). The number of
+outstanding requests per node is capped, so a slow node applies back
+pressure instead of accumulating an unbounded backlog.
+
+No thread is created per request; the only threads are one receiver per
+connection.
+
+Every node keeps in-flight and latency counters. They drive the dispatch
+policies in dispatch.py and are reported by NetworkClient.stats().
+"""
+
+import itertools
+import threading
+import time
+
+import numpy as np
+
+import dispatch
+import network_protocol as proto
+
+
+class PipelinedConnection:
+    """One persistent connection with any number of requests in flight."""
+
+    def __init__(self, addr):
+        self.conn = proto.SocketConnection(addr)
+        self.send_lock = threading.Lock()
+        self.callbacks = {}
+        self.callbacks_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.closed = False
+
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receiver.start()
+
+    def submit(self, msg_type, tensors, callback):
+        """Sends a request. callback(tensors, error) runs on the receiver thread."""
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        with self.callbacks_lock:
+            self.callbacks[request_id] = callback
+        try:
+            with self.send_lock:
+                self.conn.send(msg_type, request_id, tensors)
+        except Exception:
+            with self.callbacks_lock:
+                self.callbacks.pop(request_id, None)
+            raise
+
+    def _receive_loop(self):
+        error = None
+        while not self.closed:
+            try:
+                msg_type, request_id, tensors = self.conn.read_message()
+            except Exception as e:
+                error = e
+                break
+
+            with self.callbacks_lock:
+                callback = self.callbacks.pop(request_id, None)
+            if callback is None:
+                continue
+            if msg_type == proto.MSG_ERROR:
+                callback(None, proto.ProtocolError(bytes(tensors["error"]).decode("utf-8")))
+            else:
+                callback(tensors, None)
+
+        # Fail whatever is still outstanding on this connection
+        with self.callbacks_lock:
+            callbacks, self.callbacks = self.callbacks, {}
+        if not self.closed:
+            for callback in callbacks.values():
+                callback(None, error or ConnectionError("Connection closed"))
+
+    def close(self):
+        self.closed = True
+        self.conn.close()
+
+
+class NodeClient:
+    """Connection pool and in-flight limit for one SUT node."""
+
+    def __init__(self, addr, num_connections=2, max_inflight=64):
+        self.addr = addr
+        self.connections = [PipelinedConnection(addr) for _ in range(num_connections)]
+        self.next_connection = itertools.cycle(self.connections)
+        self.next_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.capacity = 1.0
+
+        # Counters
+        self.stats_lock = threading.Lock()
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = []
+
+    def submit(self, msg_type, tensors, callback):
+        """Blocks while the node already has max_inflight outstanding requests."""
+        # Outstanding includes requests waiting for a slot, so that policies see the whole backlog
+        with self.stats_lock:
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+        self.slots.acquire()
+        start = time.perf_counter()
+
+        def done(result, error):
+            latency = time.perf_counter() - start
+            self.slots.release()
+            with self.stats_lock:
+                self.inflight -= 1
+                if error is None:
+                    self.completed += 1
+                    self.latencies.append(latency)
+                else:
+                    self.failed += 1
+            callback(result, error)
+
+        with self.next_lock:
+            connection = next(self.next_connection)
+        try:
+            connection.submit(msg_type, tensors, done)
+        except Exception:
+            self.slots.release()
+            with self.stats_lock:
+                self.inflight -= 1
+                self.failed += 1
+            raise
+
+    def request(self, msg_type, tensors=None):
+        """Blocking request/response, e.g. for MSG_GET_NAME."""
+        event = threading.Event()
+        response = {}
+
+        def callback(result, error):
+            response["result"], response["error"] = result, error
+            event.set()
+
+        self.submit(msg_type, tensors, callback)
+        event.wait()
+        if response["error"] is not None:
+            raise response["error"]
+        return response["result"]
+
+    def get_health(self):
+        """Queries MSG_GET_HEALTH and records the capacity reported by the node."""
+        health = self.request(proto.MSG_GET_HEALTH)
+        self.capacity = float(health["capacity"][0])
+        return {"capacity": self.capacity, "queued": int(health["queued"][0])}
+
+    def stats(self):
+        with self.stats_lock:
+            latencies = np.array(self.latencies) * 1000.0
+            stats = {"addr": self.addr,
+                     "capacity": self.capacity,
+                     "completed": self.completed,
+                     "failed": self.failed,
+                     "inflight": self.inflight,
+                     "peak_inflight": self.peak_inflight}
+        if len(latencies):
+            stats.update({"mean_latency_ms": round(float(latencies.mean()), 3),
+                          "p50_latency_ms": round(float(np.percentile(latencies, 50)), 3),
+                          "p99_latency_ms": round(float(np.percentile(latencies, 99)), 3),
+                          "max_latency_ms": round(float(latencies.max()), 3)})
+        return stats
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+class NetworkClient:
+    """Pooled, pipelined client for a list of SUT node addresses."""
+
+    def __init__(self, sut_server_addr, connections_per_node=2, max_inflight_per_node=64, policy="round_robin"):
+        self.nodes = [NodeClient(addr, connections_per_node, max_inflight_per_node) for addr in sut_server_addr]
+        self.policy = dispatch.get_policy(policy, self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def predict_async(self, node_id, tensors, callback):
+        """Sends tensors to a node. callback(result_tensors, error) runs when the response arrives."""
+        self.nodes[node_id].submit(proto.MSG_PREDICT, tensors, callback)
+
+    def predict(self, tensors, callback):
+        """Like predict_async, on the node chosen by the dispatch policy. Returns the node id."""
+        node_id = self.policy.select()
+        self.predict_async(node_id, tensors, callback)
+        return node_id
+
+    def get_name(self, node_id):
+        return bytes(self.nodes[node_id].request(proto.MSG_GET_NAME)["name"]).decode("utf-8")
+
+    def get_health(self, node_id):
+        return self.nodes[node_id].get_health()
+
+    def stats(self):
+        """Per-node counters, in the order of sut_server_addr."""
+        return [node.stats() for node in self.nodes]
+
+    def close(self):
+        for node in self.nodes:
+            node.close()
@@ -0,0 +1,182 @@
+# Copyright 2023 MLCommons. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+"""
+Binary wire protocol between the LON node (QDL) and the network SUT nodes.
+
+Every message is one frame:
+
+    header   : magic b"MLPN", message type (u8), request id (u32), tensor count (u16)
+    tensors  : for each tensor
+                 name length (u16), name (utf-8),
+                 dtype length (u8), numpy dtype string (e.g. "<f4"),
+                 ndim (u8), shape (ndim x u64),
+                 payload length (u64), raw little-endian payload
+
+All integers are little-endian. Tensors are sent as their raw buffers, so
+encoding and decoding never go through Python lists. Responses carry the
+request id of the request they answer, which lets a client keep several
+requests in flight on one connection.
+
+MSG_GET_HEALTH asks a SUT node for its current state; the MSG_HEALTH answer
+carries a "capacity" tensor (relative throughput of the node, used to weight
+dispatch) and a "queued" tensor (requests waiting for a batch).
+"""
+
+import socket
+import struct
+
+import numpy as np
+
+MAGIC = b"MLPN"
+
+MSG_PREDICT = 1
+MSG_RESULT = 2
+MSG_GET_NAME = 3
+MSG_NAME = 4
+MSG_ERROR = 5
+MSG_GET_HEALTH = 6
+MSG_HEALTH = 7
+
+_HEADER = struct.Struct("<4sBIH")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U64 = struct.Struct("<Q")
+
+
+class ProtocolError(RuntimeError):
+    pass
+
+
+def parse_address(addr, default_port=8000):
+    """Accepts 'host:port', 'host' or 'http://host:port' (the scheme is ignored)."""
+    if "://" in addr:
+        addr = addr.split("://", 1)[1]
+    addr = addr.rstrip("/")
+    host, _, port = addr.rpartition(":")
+    if not host:
+        return port, default_port
+    return host, int(port)
+
+
+def encode_message(msg_type, request_id, tensors=None):
+    """Returns the frame for `tensors` (a dict of name -> array) as a list of buffers."""
+    tensors = tensors or {}
+    buffers = [_HEADER.pack(MAGIC, msg_type, request_id, len(tensors))]
+    for name, value in tensors.items():
+        array = np.asarray(value)
+        if array.dtype.str[0] == ">":
+            array = array.astype(array.dtype.newbyteorder("<"))
+        array = np.ascontiguousarray(array)
+        name = name.encode("utf-8")
+        dtype = array.dtype.str.encode("ascii")
+        buffers.append(_U16.pack(len(name)) + name +
+                       _U8.pack(len(dtype)) + dtype +
+                       _U8.pack(array.ndim) + struct.pack("<{}Q".format(array.ndim), *array.shape) +
+                       _U64.pack(array.nbytes))
+        buffers.append(memoryview(array.reshape(-1).view(np.uint8)))
+    return buffers
+
+
+def _decode_tensors(read_exactly, count):
+    tensors = {}
+    for _ in range(count):
+        name = read_exactly(_U16.unpack(read_exactly(2))[0]).decode("utf-8")
+        dtype = np.dtype(read_exactly(_U8.unpack(read_exactly(1))[0]).decode("ascii"))
+        ndim = _U8.unpack(read_exactly(1))[0]
+        shape = struct.unpack("<{}Q".format(ndim), read_exactly(8 * ndim))
+        nbytes = _U64.unpack(read_exactly(8))[0]
+        tensors[name] = np.frombuffer(read_exactly(nbytes), dtype=dtype).reshape(shape)
+    return tensors
+
+
+def _check_header(header):
+    magic, msg_type, request_id, count = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError("Bad frame magic {!r}".format(magic))
+    return msg_type, request_id, count
+
+
+async def read_message(reader):
+    """Reads one frame from an asyncio StreamReader. Returns (msg_type, request_id, tensors)."""
+    msg_type, request_id, count = _check_header(await reader.readexactly(_HEADER.size))
+    tensors = {}
+    for _ in range(count):
+        name = (await reader.readexactly(_U16.unpack(await reader.readexactly(2))[0])).decode("utf-8")
+        dtype = np.dtype((await reader.readexactly(_U8.unpack(await reader.readexactly(1))[0])).decode("ascii"))
+        ndim = _U8.unpack(await reader.readexactly(1))[0]
+        shape = struct.unpack("<{}Q".format(ndim), await reader.readexactly(8 * ndim))
+        nbytes = _U64.unpack(await reader.readexactly(8))[0]
+        tensors[name] = np.frombuffer(await reader.readexactly(nbytes), dtype=dtype).reshape(shape)
+    return msg_type, request_id, tensors
+
+
+def write_message(writer, msg_type, request_id, tensors=None):
+    """Queues one frame on an asyncio StreamWriter. The caller awaits writer.drain()."""
+    writer.writelines(encode_message(msg_type, request_id, tensors))
+
+
+class SocketConnection:
+    """Blocking client side of the protocol over one persistent TCP connection."""
+
+    def __init__(self, addr, timeout=None):
+        self.addr = parse_address(addr)
+        self.sock = socket.create_connection(self.addr, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    def send(self, msg_type, request_id, tensors=None):
+        self.sock.sendall(b"".join(encode_message(msg_type, request_id, tensors)))
+
+    def read_message(self):
+        """Reads the next frame, whichever request it answers. Returns (msg_type, request_id, tensors)."""
+        msg_type, request_id, count = _check_header(self._read_exactly(_HEADER.size))
+        return msg_type, request_id, _decode_tensors(self._read_exactly, count)
+
+    def recv(self):
+        msg_type, request_id, tensors = self.read_message()
+        if msg_type == MSG_ERROR:
+            raise ProtocolError(bytes(tensors["error"]).decode("utf-8"))
+        return msg_type, request_id, tensors
+
+    def _read_exactly(self, n):
+        data = self.stream.read(n)
+        if len(data) != n:
+            raise ConnectionError("Connection to {}:{} closed".format(*self.addr))
+        return data
+
+    def request(self, msg_type, tensors=None, request_id=0):
+        """Sends one request and waits for its response."""
+        self.send(msg_type, request_id, tensors)
+        return self.recv()
+
+    def predict(self, tensors):
+        return self.request(MSG_PREDICT, tensors)[2]
+
+    def get_name(self):
+        return bytes(self.request(MSG_GET_NAME)[2]["name"]).decode("utf-8")
+
+    def close(self):
+        # Shut down first so that a thread blocked in read_message() returns before the stream is closed
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.stream.close()
+        self.sock.close()
+
+
+def encode_string(text):
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
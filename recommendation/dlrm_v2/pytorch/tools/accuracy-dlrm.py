@@ -9,11 +9,15 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
-import json
+import os
+import sys
 
 import numpy as np
 import sklearn.metrics
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import AccuracyLogReader
+
 # pylint: disable=missing-docstring
 
 def get_args():
@@ -72,8 +76,8 @@ def main():
         print("Assuming loadgen accuracy log does not contain ground truth labels.")
 
     print("Parsing loadgen accuracy log...")
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
+    # de-dupe in case loadgen sends the same sample multiple times
+    results = AccuracyLogReader(args.mlperf_accuracy_file, dtype_map[args.dtype], dedup=True)
 
     seen = set()
     good = 0
@@ -81,18 +85,10 @@ def main():
     all_results = []
     all_targets = []
     qsl_indices = []
-    for j in results:
-        idx = j['qsl_idx']
-
-        # de-dupe in case loadgen sends the same sample multiple times
-        if idx in seen:
-            continue
+    for _, idx, data in results:
         seen.add(idx)
         qsl_indices.append(idx)
 
-        # reconstruct label from mlperf accuracy log
-        data = np.frombuffer(bytes.fromhex(j['data']), dtype_map[args.dtype])
-
         # data stores both predictions and targets
         output_count = 2 if log_contains_gt else 1
         query_length = data.size // output_count
@@ -131,7 +127,7 @@ def main():
     acc = good / total
     print("AUC={:.3f}%, accuracy={:.3f}%, good={}, total={}, queries={}".format(100. * roc_auc, 100. * acc, good, total, len(seen)))
     if args.verbose:
-        print("found and ignored {} query dupes".format(len(results) - len(seen)))
+        print("found and ignored {} query dupes".format(results.num_duplicates))
 
 
 if __name__ == "__main__":
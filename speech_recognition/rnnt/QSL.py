@@ -2,6 +2,9 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.getcwd(), "pytorch"))
 
+import hashlib
+import json
+
 from parts.manifest import Manifest
 from parts.segment import AudioSegment
 
@@ -10,14 +13,75 @@ import numpy as np
 import mlperf_loadgen as lg
 
 
+class AudioCache:
+    """Decoded waveforms of a manifest, packed in one float32 file.
+
+    The first run decodes every sample and writes `<key>.f32` with all the
+    waveforms back to back and `<key>.npz` with the offset and length of
+    each of them. Later runs memory map the packed file instead of decoding
+    again. The key covers the audio files (path, size and modification
+    time) and the sample rate, so a changed dataset is decoded again.
+    """
+
+    def __init__(self, cache_dir, manifest, sample_rate):
+        files = []
+        for sample in manifest:
+            path = sample['audio_filepath'][0]
+            st = os.stat(path)
+            files.append([path, st.st_size, st.st_mtime_ns])
+        key = hashlib.sha256(json.dumps([sample_rate, files]).encode("utf-8")).hexdigest()[:16]
+        data_path = os.path.join(cache_dir, "audio_{}.f32".format(key))
+        index_path = os.path.join(cache_dir, "audio_{}.npz".format(key))
+        if not (os.path.exists(data_path) and os.path.exists(index_path)):
+            os.makedirs(cache_dir, exist_ok=True)
+            self._build(data_path, index_path, manifest, sample_rate)
+        else:
+            print("Using decoded audio from {}".format(data_path))
+
+        index = np.load(index_path)
+        self.offsets = index["offsets"]
+        self.lengths = index["lengths"]
+        # Copy on write, so that the waveforms are writable views without touching the file
+        self.data = np.memmap(data_path, dtype=np.float32, mode="c") if self.lengths.sum() else np.zeros(0, np.float32)
+
+    @staticmethod
+    def _build(data_path, index_path, manifest, sample_rate):
+        print("Decoding audio into {}".format(data_path))
+        offsets = np.zeros(len(manifest), dtype=np.int64)
+        lengths = np.zeros(len(manifest), dtype=np.int64)
+        offset = 0
+        tmp_path = data_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for i, sample in enumerate(manifest):
+                segment = AudioSegment.from_file(sample['audio_filepath'][0],
+                                                 target_sr=sample_rate)
+                waveform = segment.samples
+                assert isinstance(waveform, np.ndarray) and waveform.dtype == np.float32
+                f.write(waveform.tobytes())
+                offsets[i] = offset
+                lengths[i] = waveform.shape[0]
+                offset += waveform.shape[0]
+        np.savez(index_path + ".tmp.npz", offsets=offsets, lengths=lengths)
+        # The index is renamed last, a cache without index is decoded again
+        os.replace(tmp_path, data_path)
+        os.replace(index_path + ".tmp.npz", index_path)
+
+    def __getitem__(self, index):
+        offset = self.offsets[index]
+        return self.data[offset:offset + self.lengths[index]]
+
+
 class AudioQSL:
     def __init__(self, dataset_dir, manifest_filepath, labels,
-                 sample_rate=16000, perf_count=None):
+                 sample_rate=16000, perf_count=None, cache_dir=None):
         m_paths = [manifest_filepath]
         self.manifest = Manifest(dataset_dir, m_paths, labels, len(labels),
                                  normalize=True, max_duration=15.0)
         self.sample_rate = sample_rate
         self.count = len(self.manifest)
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = AudioCache(cache_dir, self.manifest, sample_rate)
         perf_count = self.count if perf_count is None else perf_count
         self.sample_id_to_sample = {}
         self.qsl = lg.ConstructQSL(self.count, perf_count,
@@ -38,6 +102,9 @@ class AudioQSL:
             del self.sample_id_to_sample[sample_id]
 
     def _load_sample(self, index):
+        if self.cache is not None:
+            # A view of the memory mapped cache, nothing is copied
+            return self.cache[index]
         sample = self.manifest[index]
         segment = AudioSegment.from_file(sample['audio_filepath'][0],
                                          target_sr=self.sample_rate)
@@ -56,9 +123,9 @@ class AudioQSL:
 # order to speed up execution of the benchmark.
 class AudioQSLInMemory(AudioQSL):
     def __init__(self, dataset_dir, manifest_filepath, labels,
-                 sample_rate=16000, perf_count=None):
+                 sample_rate=16000, perf_count=None, cache_dir=None):
         super().__init__(dataset_dir, manifest_filepath, labels,
-                         sample_rate, perf_count)
+                         sample_rate, perf_count, cache_dir)
         super().load_query_samples(range(self.count))
 
     def load_query_samples(self, sample_list):
@@ -1,21 +1,23 @@
 #!/usr/bin/env python
 
 import argparse
-import array
-import json
 import sys
 import os
 
+import numpy as np
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "pytorch"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools", "accuracy_log"))
 
 from helpers import process_evaluation_epoch, __gather_predictions
 from parts.manifest import Manifest
+from accuracy_log import read_accuracy_log
 
 dtype_map = {
-    "int8": 'b',
-    "int16": 'h',
-    "int32": 'l',
-    "int64": 'q',
+    "int8": np.int8,
+    "int16": np.int16,
+    "int32": np.int32,
+    "int64": np.int64,
 }
 
 def get_args():
@@ -24,6 +26,7 @@ def get_args():
     parser.add_argument("--dataset_dir", required=True)
     parser.add_argument("--manifest", required=True)
     parser.add_argument("--output_dtype", default="int64", choices=dtype_map.keys(), help="Output data type")
+    parser.add_argument("--num_workers", type=int, default=1, help="Number of processes used to score the utterances")
     args = parser.parse_args()
     return args
 
@@ -31,20 +34,19 @@ def main():
     args = get_args()
     labels = [" ", "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z", "'"]
     manifest = Manifest(args.dataset_dir, [args.manifest], labels, len(labels), normalize=True, max_duration=15.0)
-    with open(os.path.join(args.log_dir, "mlperf_log_accuracy.json")) as fh:
-        results = json.load(fh)
     hypotheses = []
     references = []
-    for result in results:
-        hypotheses.append(array.array(dtype_map[args.output_dtype], bytes.fromhex(result["data"])).tolist())
-        references.append(manifest[result["qsl_idx"]]["transcript"])
+    for _, qsl_idx, data in read_accuracy_log(os.path.join(args.log_dir, "mlperf_log_accuracy.json"),
+                                              dtype_map[args.output_dtype]):
+        hypotheses.append(data.tolist())
+        references.append(manifest[qsl_idx]["transcript"])
 
     references = __gather_predictions([references], labels=labels)
     hypotheses = __gather_predictions([hypotheses], labels=labels)
 
     d = dict(predictions=hypotheses,
              transcripts=references)
-    wer = process_evaluation_epoch(d)
+    wer = process_evaluation_epoch(d, num_workers=args.num_workers)
     print("Word Error Rate: {:}%, accuracy={:}%".format(wer * 100, (1 - wer) * 100))
 
 if __name__ == '__main__':
@@ -63,41 +63,51 @@ class ScriptGreedyDecoder(torch.nn.Module):
 
         logits, logits_lens = self._model.encoder(x, out_lens)
 
-        output: List[List[int]] = []
-        for batch_idx in range(logits.size(0)):
-            inseq = logits[batch_idx, :, :].unsqueeze(1).to(self.dev)
-            # inseq: TxBxF
-            logitlen = logits_lens[batch_idx]
-            sentence = self._greedy_decode(inseq, logitlen)
-            output.append(sentence)
+        output = self._greedy_decode(logits.to(self.dev), logits_lens)
 
         return logits, logits_lens, output
 
-    def _greedy_decode(self, x: torch.Tensor, out_len: torch.Tensor) -> List[int]:
-        hidden: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
-        label: List[int] = []
-        for time_idx in range(int(out_len.item())):
-            f = x[time_idx, :, :].unsqueeze(0).to(self.dev)
+    def _greedy_decode(self, x: torch.Tensor, out_lens: torch.Tensor) -> List[List[int]]:
+        """Decodes all the utterances of x (batch, seq_len, features) together.
 
-            not_blank = True
-            symbols_added = 0
+        Every time step runs the joint network on the rows that are still
+        inside their sequence and have not emitted blank for this step yet.
+        The output of the prediction network only depends on the last symbol
+        and hidden state of a row, so it is kept per row and only recomputed
+        for the rows that just emitted a symbol.
+        """
+        batch_size = x.size(0)
+        label: List[List[int]] = [[] for _ in range(batch_size)]
+        if batch_size == 0:
+            return label
+        out_lens = out_lens.to(self.dev)
+
+        # Every row starts from SOS with no hidden state, which gives the same output for all of them
+        g, hidden = self._pred_step(self._SOS, None)
+        g = g.expand(batch_size, -1, -1).contiguous()
+        h = hidden[0].expand(-1, batch_size, -1).contiguous()
+        c = hidden[1].expand(-1, batch_size, -1).contiguous()
+
+        for time_idx in range(int(out_lens.max().item())):
+            rows = (out_lens > time_idx).nonzero().squeeze(1)
+            f = x[:, time_idx, :].unsqueeze(1)
 
-            while not_blank and symbols_added < self._max_symbols_per_step:
-                g, hidden_prime = self._pred_step(
-                    self._get_last_symb(label),
-                    hidden
-                )
-                logp = self._joint_step(f, g, log_normalize=False)[0, :]
+            symbols_added = 0
+            while rows.numel() > 0 and symbols_added < self._max_symbols_per_step:
+                logp = self._joint_step(f[rows], g[rows], log_normalize=False)
 
                 # get index k, of max prob
-                v, k = logp.max(0)
-                k = k.item()
-
-                if k == self._blank_id:
-                    not_blank = False
-                else:
-                    label.append(k)
-                    hidden = hidden_prime
+                v, k = logp.max(1)
+                not_blank = k != self._blank_id
+                rows = rows[not_blank]
+                k = k[not_blank]
+                for row, symbol in zip(rows.tolist(), k.tolist()):
+                    label[row].append(symbol)
+                if rows.numel() > 0:
+                    g_prime, hidden_prime = self._pred_step_batch(k, (h[:, rows], c[:, rows]))
+                    g[rows] = g_prime
+                    h[:, rows] = hidden_prime[0]
+                    c[:, rows] = hidden_prime[1]
                 symbols_added += 1
 
         return label
@@ -110,6 +120,10 @@ class ScriptGreedyDecoder(torch.nn.Module):
         label = torch.tensor([[label]], dtype=torch.int64)
         return self._model.prediction(label, hidden)
 
+    def _pred_step_batch(self, labels: torch.Tensor, hidden: Tuple[torch.Tensor, torch.Tensor]) -> Tuple[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
+        labels = torch.where(labels > self._blank_id, labels - 1, labels)
+        return self._model.prediction(labels.unsqueeze(1), hidden)
+
     def _joint_step(self, enc: torch.Tensor, pred: torch.Tensor, log_normalize: bool=False) -> torch.Tensor:
         logits = self._model.joint(enc, pred)[:, 0, 0, :]
         if not log_normalize:
@@ -118,6 +132,3 @@ class ScriptGreedyDecoder(torch.nn.Module):
         probs = F.log_softmax(logits, dim=len(logits.shape) - 1)
 
         return probs
-
-    def _get_last_symb(self, labels: List[int]) -> int:
-        return self._SOS if len(labels) == 0 else labels[-1]
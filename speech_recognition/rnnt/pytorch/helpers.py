@@ -98,11 +98,12 @@ def process_evaluation_batch(tensors: dict, global_vars: dict, labels: list):
                                                        labels=labels)
 
 
-def process_evaluation_epoch(global_vars: dict, tag=None):
+def process_evaluation_epoch(global_vars: dict, tag=None, num_workers=1):
     """
     Processes results from each worker at the end of evaluation and combine to final result
     Args:
         global_vars: dictionary containing information of entire evaluation
+        num_workers: number of processes used to score the utterances
     Return:
         wer: final word error rate
         loss: final loss
@@ -111,7 +112,7 @@ def process_evaluation_epoch(global_vars: dict, tag=None):
     references = global_vars['transcripts']
 
     wer, scores, num_words = word_error_rate(
-        hypotheses=hypotheses, references=references)
+        hypotheses=hypotheses, references=references, num_workers=num_workers)
     return wer
 
 
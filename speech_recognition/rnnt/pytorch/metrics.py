@@ -12,32 +12,63 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import multiprocessing
 from typing import List
 
 
 def __levenshtein(a: List, b: List) -> int:
     """Calculates the Levenshtein distance between a and b.
+
+    Bit-parallel algorithm (Myers 1999, as formulated by Hyyro 2003): the
+    column of the distance matrix for the shorter sequence is kept as bit
+    vectors of +1/-1 vertical deltas in Python ints, and every element of
+    the longer sequence updates the whole column with a few integer
+    operations.
     """
     n, m = len(a), len(b)
     if n > m:
-        # Make sure n <= m, to use O(min(n,m)) space
+        # Make sure a is the shorter one, it sets the width of the bit vectors
         a, b = b, a
         n, m = m, n
+    if n == 0:
+        return m
+
+    # Bit j of peq[x] is set when a[j] == x
+    peq = {}
+    for j, x in enumerate(a):
+        peq[x] = peq.get(x, 0) | (1 << j)
+
+    full = (1 << n) - 1
+    last = 1 << (n - 1)
+    vp, vn = full, 0
+    distance = n
+    for x in b:
+        eq = peq.get(x, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        # The first row of the matrix grows by one per element of b
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
 
-    current = list(range(n + 1))
-    for i in range(1, m + 1):
-        previous, current = current, [i] + [0] * n
-        for j in range(1, n + 1):
-            add, delete = previous[j] + 1, current[j - 1] + 1
-            change = previous[j - 1]
-            if a[j - 1] != b[i - 1]:
-                change = change + 1
-            current[j] = min(add, delete, change)
+    return distance
 
-    return current[n]
 
+def __word_distance(pair):
+    h, r = pair
+    h_list = h.split()
+    r_list = r.split()
+    return __levenshtein(h_list, r_list), len(r_list)
 
-def word_error_rate(hypotheses: List[str], references: List[str]) -> float:
+
+def word_error_rate(hypotheses: List[str], references: List[str], num_workers: int = 1) -> float:
     """
     Computes Average Word Error rate between two texts represented as
     corresponding lists of string. Hypotheses and references must have same length.
@@ -45,6 +76,7 @@ def word_error_rate(hypotheses: List[str], references: List[str]) -> float:
     Args:
         hypotheses: list of hypotheses
         references: list of references
+        num_workers: number of processes the utterances are scored with
 
     Returns:
         (float) average word error rate
@@ -55,11 +87,15 @@ def word_error_rate(hypotheses: List[str], references: List[str]) -> float:
         raise ValueError("In word error rate calculation, hypotheses and reference"
                          " lists must have the same number of elements. But I got:"
                          "{0} and {1} correspondingly".format(len(hypotheses), len(references)))
-    for h, r in zip(hypotheses, references):
-        h_list = h.split()
-        r_list = r.split()
-        words += len(r_list)
-        scores += __levenshtein(h_list, r_list)
+    pairs = zip(hypotheses, references)
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers) as pool:
+            distances = pool.map(__word_distance, pairs, chunksize=256)
+    else:
+        distances = map(__word_distance, pairs)
+    for score, num_words in distances:
+        words += num_words
+        scores += score
     if words != 0:
         wer = (1.0 * scores) / words
     else:
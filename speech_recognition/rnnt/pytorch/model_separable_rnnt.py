@@ -83,6 +83,11 @@ class Encoder(torch.nn.Module):
 
     def forward(self, x_padded: torch.Tensor, x_lens: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
         x_padded, _ = self.pre_rnn(x_padded.to(self.dev), None)
+        # Zero the frames past the end of every sequence, as a lone sequence is
+        # zero padded by stack_time. Otherwise the last frame of an odd length
+        # sequence of a batch would be stacked with a padding frame.
+        mask = torch.arange(x_padded.size(0), device=x_padded.device).unsqueeze(1) < x_lens.to(x_padded.device).unsqueeze(0)
+        x_padded = x_padded * mask.unsqueeze(2).to(x_padded.dtype)
         x_padded, x_lens = self.stack_time(x_padded, x_lens)
         # (T, B, H)
         x_padded, _ = self.post_rnn(x_padded, None)
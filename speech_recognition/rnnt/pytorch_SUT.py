@@ -17,6 +17,7 @@ import os
 sys.path.insert(0, os.path.join(os.getcwd(), "pytorch"))
 
 import array
+import time
 import torch
 import numpy as np
 import toml
@@ -43,8 +44,13 @@ def load_and_migrate_checkpoint(ckpt_path):
 
 class PytorchSUT:
     def __init__(self, config_toml, checkpoint_path, dataset_dir,
-                 manifest_filepath, perf_count):
+                 manifest_filepath, perf_count, max_batch_size=1,
+                 max_padding_ratio=0.25, audio_cache_dir=None):
         config = toml.load(config_toml)
+        self.max_batch_size = max_batch_size
+        self.max_padding_ratio = max_padding_ratio
+        # One (batch size, padding ratio, audio seconds, wall seconds) entry per batch
+        self.batch_stats = []
 
         dataset_vocab = config['labels']['labels']
         rnnt_vocab = add_blank_label(dataset_vocab)
@@ -57,7 +63,8 @@ class PytorchSUT:
                                     manifest_filepath,
                                     dataset_vocab,
                                     featurizer_config["sample_rate"],
-                                    perf_count)
+                                    perf_count,
+                                    audio_cache_dir)
         self.audio_preprocessor = AudioPreprocessing(**featurizer_config)
         self.audio_preprocessor.eval()
         self.audio_preprocessor = torch.jit.script(self.audio_preprocessor)
@@ -86,29 +93,93 @@ class PytorchSUT:
 
         self.greedy_decoder = ScriptGreedyDecoder(len(rnnt_vocab) - 1, model)
 
-    def issue_queries(self, query_samples):
+    def make_batches(self, query_samples):
+        """Groups query samples of similar duration into batches.
+
+        Samples are sorted by duration from the manifest, longest first, and a
+        batch is closed when it holds max_batch_size samples or when adding
+        the next sample would make the padded fraction of the batch exceed
+        max_padding_ratio.
+        """
+        durations = {query_sample.index: self.qsl.manifest[query_sample.index]["duration"]
+                     for query_sample in query_samples}
+        query_samples = sorted(query_samples, key=lambda q: durations[q.index], reverse=True)
+        batches = []
+        batch = []
+        total = 0.0
         for query_sample in query_samples:
-            waveform = self.qsl[query_sample.index]
-            assert waveform.ndim == 1
-            waveform_length = np.array(waveform.shape[0], dtype=np.int64)
-            waveform = np.expand_dims(waveform, 0)
-            waveform_length = np.expand_dims(waveform_length, 0)
-            with torch.no_grad():
+            duration = durations[query_sample.index]
+            if batch:
+                longest = durations[batch[0].index]
+                padded = longest * (len(batch) + 1)
+                if len(batch) >= self.max_batch_size or \
+                        padded - total - duration > self.max_padding_ratio * padded:
+                    batches.append(batch)
+                    batch = []
+                    total = 0.0
+            batch.append(query_sample)
+            total += duration
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def issue_queries(self, query_samples):
+        for batch in self.make_batches(query_samples):
+            self.process_batch(batch)
+
+    def process_batch(self, batch):
+        start = time.time()
+        # Features are computed per waveform: the STFT padding, the frame
+        # splicing and the per utterance normalization would all see the
+        # zeros of a padded waveform batch and change the features.
+        features = []
+        with torch.no_grad():
+            for query_sample in batch:
+                waveform = self.qsl[query_sample.index]
+                assert waveform.ndim == 1
+                waveform_length = np.array(waveform.shape[0], dtype=np.int64)
+                waveform = np.expand_dims(waveform, 0)
+                waveform_length = np.expand_dims(waveform_length, 0)
                 waveform = torch.from_numpy(waveform)
                 waveform_length = torch.from_numpy(waveform_length)
                 feature, feature_length = self.audio_preprocessor.forward((waveform, waveform_length))
                 assert feature.ndim == 3
                 assert feature_length.ndim == 1
-                feature = feature.permute(2, 0, 1)
+                features.append(feature[0])
+
+            feature_length = torch.tensor([feature.shape[1] for feature in features], dtype=torch.int64)
+            feature = torch.zeros((len(features), features[0].shape[0], int(feature_length.max())), dtype=features[0].dtype)
+            for i, f in enumerate(features):
+                feature[i, :, :f.shape[1]] = f
+            feature = feature.permute(2, 0, 1)
 
-                _, _, transcript = self.greedy_decoder.forward(feature, feature_length)
+            _, _, transcripts = self.greedy_decoder.forward(feature, feature_length)
 
-            assert len(transcript) == 1
-            response_array = array.array('q', transcript[0])
+        assert len(transcripts) == len(batch)
+        responses = []
+        response_arrays = []
+        for query_sample, transcript in zip(batch, transcripts):
+            response_array = array.array('q', transcript)
             bi = response_array.buffer_info()
-            response = lg.QuerySampleResponse(query_sample.id, bi[0],
-                                              bi[1] * response_array.itemsize)
-            lg.QuerySamplesComplete([response])
+            responses.append(lg.QuerySampleResponse(query_sample.id, bi[0],
+                                                    bi[1] * response_array.itemsize))
+            response_arrays.append(response_array)
+        lg.QuerySamplesComplete(responses)
+
+        frames = int(feature_length.sum())
+        self.batch_stats.append((len(batch),
+                                 1.0 - frames / float(feature_length.max() * len(batch)),
+                                 sum(self.qsl.manifest[query_sample.index]["duration"] for query_sample in batch),
+                                 time.time() - start))
+
+    def report_batch_stats(self):
+        if not self.batch_stats:
+            return
+        sizes, padding, audio_seconds, seconds = zip(*self.batch_stats)
+        print("Batches: {}, mean size: {:.2f}, mean padding: {:.2%}, max padding: {:.2%}".format(
+            len(sizes), np.mean(sizes), np.mean(padding), np.max(padding)))
+        print("Throughput: {:.2f} samples/s, {:.2f} audio seconds/s".format(
+            sum(sizes) / sum(seconds), sum(audio_seconds) / sum(seconds)))
 
     def flush_queries(self):
         pass
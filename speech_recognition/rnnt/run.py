@@ -37,6 +37,9 @@ def get_args():
     parser.add_argument("--dataset_dir", required=True)
     parser.add_argument("--manifest", required=True)
     parser.add_argument("--perf_count", type=int, default=None)
+    parser.add_argument("--max_batch_size", type=int, default=1, help="Maximum number of samples run through the model together")
+    parser.add_argument("--max_padding_ratio", type=float, default=0.25, help="Maximum fraction of padding in a batch")
+    parser.add_argument("--audio_cache_dir", default=None, help="Directory where the decoded waveforms are cached between runs")
     parser.add_argument("--log_dir", required=True)
     args = parser.parse_args()
     return args
@@ -55,7 +58,9 @@ def main():
     if args.backend == "pytorch":
         from pytorch_SUT import PytorchSUT
         sut = PytorchSUT(args.pytorch_config_toml, args.pytorch_checkpoint,
-                         args.dataset_dir, args.manifest, args.perf_count)
+                         args.dataset_dir, args.manifest, args.perf_count,
+                         args.max_batch_size, args.max_padding_ratio,
+                         args.audio_cache_dir)
     else:
         raise ValueError("Unknown backend: {:}".format(args.backend))
 
@@ -79,6 +84,7 @@ def main():
 
     print("Running Loadgen test...")
     lg.StartTestWithLogSettings(sut.sut, sut.qsl.qsl, settings, log_settings, args.audit_conf)
+    sut.report_batch_stats()
 
     if args.accuracy:
         cmd = f"python3 accuracy_eval.py --log_dir {log_path} --dataset_dir {args.dataset_dir} --manifest {args.manifest}"
@@ -19,3 +19,12 @@ class Backend:
 
     def predict(self, feed):
         raise NotImplementedError("Backend:predict")
+
+    def encode(self, inputs):
+        raise NotImplementedError("Backend:encode")
+
+    def denoise(self, latents, embeds):
+        raise NotImplementedError("Backend:denoise")
+
+    def decode(self, latents):
+        raise NotImplementedError("Backend:decode")
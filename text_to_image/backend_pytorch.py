@@ -1,10 +1,12 @@
 from typing import Optional, List, Union
+import hashlib
 import os
 import torch
 import logging
 import backend
 from diffusers import StableDiffusionXLPipeline
 from diffusers import EulerDiscreteScheduler
+from transformers import BatchEncoding
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("backend-pytorch")
@@ -21,6 +23,7 @@ class BackendPytorch(backend.Backend):
         device="cuda",
         precision="fp32",
         negative_prompt="normal quality, low quality, worst quality, low res, blurry, nsfw, nude",
+        embedding_cache_dir=None,
     ):
         super(BackendPytorch, self).__init__()
         self.model_path = model_path
@@ -46,6 +49,12 @@ class BackendPytorch(backend.Backend):
         self.negative_prompt = negative_prompt
         self.max_length_neg_prompt = 77
         self.batch_size = batch_size
+        # Text encoder outputs of every caption, stored by the hash of its token ids
+        self.embedding_cache_dir = embedding_cache_dir
+        if self.embedding_cache_dir is not None:
+            os.makedirs(self.embedding_cache_dir, exist_ok=True)
+        self.embedding_cache_hits = 0
+        self.embedding_cache_misses = 0
 
     def version(self):
         return torch.__version__
@@ -106,6 +115,14 @@ class BackendPytorch(backend.Backend):
             truncation=True,
             return_tensors="pt",
         )
+        # The negative prompt is the same for every sample, encode it once
+        (
+            self.negative_prompt_embeds,
+            self.negative_pooled_prompt_embeds,
+        ) = self.encode_prompts(
+            self.negative_prompt_tokens.input_ids,
+            self.negative_prompt_tokens_2.input_ids,
+        )
         return self
 
     def convert_prompt(self, prompt, tokenizer):
@@ -316,70 +333,128 @@ class BackendPytorch(backend.Backend):
             negative_pooled_prompt_embeds,
         )
     
-    def prepare_inputs(self, inputs, i):
-        if self.batch_size == 1:
-            return self.encode_tokens(
-                self.pipe,
-                inputs[i]["input_tokens"],
-                inputs[i]["input_tokens_2"],
-                negative_prompt=self.negative_prompt_tokens,
-                negative_prompt_2=self.negative_prompt_tokens_2,
+    @torch.no_grad()
+    def encode_prompts(self, input_ids, input_ids_2):
+        """
+        Runs both text encoders on a batch of token ids at once, without autograd so that
+        the embeddings kept for later queries hold no graph.
+        Returns (prompt_embeds, pooled_prompt_embeds).
+        """
+        prompt_embeds, _, pooled_prompt_embeds, _ = self.encode_tokens(
+            self.pipe,
+            BatchEncoding({"input_ids": input_ids}),
+            BatchEncoding({"input_ids": input_ids_2}),
+            do_classifier_free_guidance=False,
+        )
+        return prompt_embeds, pooled_prompt_embeds
+
+    def embedding_cache_path(self, input_ids, input_ids_2):
+        key = hashlib.sha256()
+        key.update(f"{self.model_path or self.model_id}:{self.dtype}".encode())
+        key.update(input_ids.cpu().numpy().tobytes())
+        key.update(input_ids_2.cpu().numpy().tobytes())
+        return os.path.join(self.embedding_cache_dir, key.hexdigest() + ".pt")
+
+    def encode_prompts_cached(self, prompts):
+        """
+        Encodes the captions of a batch. With an embedding cache directory, captions
+        encoded in a previous run are read from it and only the others go through the
+        text encoders, which then are stored for the next runs.
+        """
+        input_ids = [prompt["input_tokens"].input_ids for prompt in prompts]
+        input_ids_2 = [prompt["input_tokens_2"].input_ids for prompt in prompts]
+        if self.embedding_cache_dir is None:
+            return self.encode_prompts(torch.cat(input_ids), torch.cat(input_ids_2))
+
+        paths = [self.embedding_cache_path(*ids) for ids in zip(input_ids, input_ids_2)]
+        embeds = [None] * len(prompts)
+        missing = []
+        for j, path in enumerate(paths):
+            if os.path.exists(path):
+                embeds[j] = torch.load(path, map_location=self.device)
+            else:
+                missing.append(j)
+        self.embedding_cache_hits += len(prompts) - len(missing)
+        self.embedding_cache_misses += len(missing)
+
+        if missing:
+            prompt_embeds, pooled_prompt_embeds = self.encode_prompts(
+                torch.cat([input_ids[j] for j in missing]),
+                torch.cat([input_ids_2[j] for j in missing]),
             )
-        else:
-            prompt_embeds = []
-            negative_prompt_embeds = []
-            pooled_prompt_embeds = []
-            negative_pooled_prompt_embeds = []
-            for prompt in inputs[i:min(i+self.batch_size, len(inputs))]:
-                assert isinstance(prompt, dict)
-                text_input = prompt["input_tokens"]
-                text_input_2 = prompt["input_tokens_2"]
-                (
-                    p_e,
-                    n_p_e,
-                    p_p_e,
-                    n_p_p_e,
-                ) = self.encode_tokens(
-                    self.pipe,
-                    text_input,
-                    text_input_2,
-                    negative_prompt=self.negative_prompt_tokens,
-                    negative_prompt_2=self.negative_prompt_tokens_2,
-                )
-                prompt_embeds.append(p_e)
-                negative_prompt_embeds.append(n_p_e)
-                pooled_prompt_embeds.append(p_p_e)
-                negative_pooled_prompt_embeds.append(n_p_p_e)
+            for k, j in enumerate(missing):
+                embeds[j] = (prompt_embeds[k : k + 1], pooled_prompt_embeds[k : k + 1])
+                # Write then rename so that concurrent runs never read a partial file
+                tmp_path = f"{paths[j]}.{os.getpid()}.tmp"
+                torch.save(tuple(e.cpu().clone() for e in embeds[j]), tmp_path)
+                os.replace(tmp_path, paths[j])
 
+        prompt_embeds = torch.cat([e[0] for e in embeds])
+        pooled_prompt_embeds = torch.cat([e[1] for e in embeds])
+        return prompt_embeds, pooled_prompt_embeds
 
-            prompt_embeds = torch.cat(prompt_embeds)
-            negative_prompt_embeds = torch.cat(negative_prompt_embeds)
-            pooled_prompt_embeds = torch.cat(pooled_prompt_embeds)
-            negative_pooled_prompt_embeds = torch.cat(negative_pooled_prompt_embeds)
-            return prompt_embeds, negative_prompt_embeds, pooled_prompt_embeds, negative_pooled_prompt_embeds
+    def prepare_inputs(self, inputs, i):
+        prompts = inputs[i:min(i + self.batch_size, len(inputs))]
+        assert all(isinstance(prompt, dict) for prompt in prompts)
+        prompt_embeds, pooled_prompt_embeds = self.encode_prompts_cached(prompts)
+        batch_size = prompt_embeds.shape[0]
+        negative_prompt_embeds = self.negative_prompt_embeds.expand(batch_size, -1, -1)
+        negative_pooled_prompt_embeds = self.negative_pooled_prompt_embeds.expand(batch_size, -1)
+        return prompt_embeds, negative_prompt_embeds, pooled_prompt_embeds, negative_pooled_prompt_embeds
+
+    def encode(self, inputs):
+        """
+        First stage of predict: text encoding of one batch.
+        Returns the latents and the text embeddings of the batch.
+        """
+        latents = torch.cat([item["latents"] for item in inputs]).to(self.device)
+        return latents, self.prepare_inputs(inputs, 0)
+
+    def denoise(self, latents, embeds):
+        """
+        Second stage of predict: runs all the denoising steps, returns the denoised latents.
+        """
+        (
+            prompt_embeds,
+            negative_prompt_embeds,
+            pooled_prompt_embeds,
+            negative_pooled_prompt_embeds,
+        ) = embeds
+        return self.pipe(
+            prompt_embeds=prompt_embeds,
+            negative_prompt_embeds=negative_prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
+            negative_pooled_prompt_embeds=negative_pooled_prompt_embeds,
+            guidance_scale=self.guidance,
+            num_inference_steps=self.steps,
+            output_type="latent",
+            latents=latents,
+        ).images
+
+    def decode(self, latents):
+        """
+        Last stage of predict: VAE decoding, the same as StableDiffusionXLPipeline does for output_type="pt".
+        """
+        pipe = self.pipe
+        # make sure the VAE is in float32 mode, as it overflows in float16
+        needs_upcasting = pipe.vae.dtype == torch.float16 and pipe.vae.config.force_upcast
+        if needs_upcasting:
+            pipe.upcast_vae()
+            latents = latents.to(next(iter(pipe.vae.post_quant_conv.parameters())).dtype)
+
+        image = pipe.vae.decode(latents / pipe.vae.config.scaling_factor, return_dict=False)[0]
+
+        # cast back to fp16 if needed
+        if needs_upcasting:
+            pipe.vae.to(dtype=torch.float16)
+        if pipe.watermark is not None:
+            image = pipe.watermark.apply_watermark(image)
+        return pipe.image_processor.postprocess(image, output_type="pt")
 
     def predict(self, inputs):
         images = []
         with torch.no_grad():
             for i in range(0, len(inputs), self.batch_size):
-                latents_input = [inputs[idx]["latents"] for idx in range(i, min(i+self.batch_size, len(inputs)))]
-                latents_input = torch.cat(latents_input).to(self.device)
-                (
-                    prompt_embeds,
-                    negative_prompt_embeds,
-                    pooled_prompt_embeds,
-                    negative_pooled_prompt_embeds,
-                ) = self.prepare_inputs(inputs, i)
-                generated = self.pipe(
-                    prompt_embeds=prompt_embeds,
-                    negative_prompt_embeds=negative_prompt_embeds,
-                    pooled_prompt_embeds=pooled_prompt_embeds,
-                    negative_pooled_prompt_embeds=negative_pooled_prompt_embeds,
-                    guidance_scale=self.guidance,
-                    num_inference_steps=self.steps,
-                    output_type="pt",
-                    latents=latents_input,
-                ).images
-                images.extend(generated)
+                latents, embeds = self.encode(inputs[i:min(i + self.batch_size, len(inputs))])
+                images.extend(self.decode(self.denoise(latents, embeds)))
         return images
-
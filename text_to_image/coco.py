@@ -15,8 +15,7 @@ import pandas as pd
 import dataset
 
 import torch
-from tools.clip.clip_encoder import CLIPEncoder
-from tools.fid.fid_score import compute_fid
+from tools.scoring import ListSource, compute_scores
 
 
 logging.basicConfig(level=logging.INFO)
@@ -137,7 +136,8 @@ class Coco(dataset.Dataset):
 
 class PostProcessCoco:
     def __init__(
-        self, device="cpu", dtype="uint8", statistics_path=os.path.join(os.path.dirname(__file__), "tools", "val2014.npz")
+        self, device="cpu", dtype="uint8", statistics_path=os.path.join(os.path.dirname(__file__), "tools", "val2014.npz"),
+        batch_size=32, num_workers=0,
     ):
         self.results = []
         self.good = 0
@@ -152,6 +152,9 @@ class PostProcessCoco:
         else:
             raise ValueError(f"dtype must be one of: uint8")
         self.statistics_path = statistics_path
+        # batch size of CLIP and Inception and number of DataLoader workers used by finalize
+        self.batch_size = batch_size
+        self.num_workers = num_workers
 
     def add_results(self, results):
         self.results.extend(results)
@@ -185,18 +188,19 @@ class PostProcessCoco:
         self.results = []
 
     def finalize(self, result_dict, ds=None, output_dir=None):
-        clip = CLIPEncoder(device=self.device)
-        dataset_size = len(self.results)
         log.info("Accumulating results")
-        for i in range(0, dataset_size):
-            caption = ds.get_caption(self.content_ids[i])
-            generated = Image.fromarray(self.results[i])
-            self.clip_scores.append(
-                100 * clip.get_clip_score(caption, generated).item()
-            )
-
-        fid_score = compute_fid(self.results, self.statistics_path, self.device)
-        result_dict["FID_SCORE"] = fid_score
-        result_dict["CLIP_SCORE"] = np.mean(self.clip_scores)
+        captions = {id: ds.get_caption(id) for id in set(self.content_ids)}
+        scores = compute_scores(
+            ListSource(self.content_ids, self.results),
+            captions,
+            self.statistics_path,
+            self.device,
+            batch_size=self.batch_size,
+            num_workers=self.num_workers,
+        )
+        self.clip_scores.extend(scores["clip_scores"])
+        self.fid_scores.append(scores["FID_SCORE"])
+        result_dict["FID_SCORE"] = scores["FID_SCORE"]
+        result_dict["CLIP_SCORE"] = scores["CLIP_SCORE"]
 
         return result_dict
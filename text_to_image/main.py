@@ -9,6 +9,7 @@ from __future__ import unicode_literals
 import argparse
 import array
 import collections
+import contextlib
 import json
 import logging
 import os
@@ -90,6 +91,11 @@ def get_args():
         help="max batch size in a single inference",
     )
     parser.add_argument("--threads", default=1, type=int, help="threads")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap text encoding, denoising and VAE decoding of consecutive batches (MultiStream, Server and Offline)",
+    )
     parser.add_argument("--accuracy", action="store_true", help="enable accuracy pass")
     parser.add_argument(
         "--find-peak-performance",
@@ -114,6 +120,10 @@ def get_args():
         choices=["cuda", "cpu"],
         help="device to run the benchmark",
     )
+    parser.add_argument(
+        "--text-embedding-cache",
+        help="directory caching the text encoder outputs of every caption across runs, don't use for official submission",
+    )
     parser.add_argument(
         "--latent-framework",
         default="torch",
@@ -239,16 +249,19 @@ class RunnerBase:
             # since post_process will not run, fake empty responses
             processed_results = [[]] * len(qitem.query_id)
         finally:
-            response_array_refs = []
-            response = []
-            for idx, query_id in enumerate(qitem.query_id):
-                response_array = array.array(
-                    "B", np.array(processed_results[idx], np.uint8).tobytes()
-                )
-                response_array_refs.append(response_array)
-                bi = response_array.buffer_info()
-                response.append(lg.QuerySampleResponse(query_id, bi[0], bi[1]))
-            lg.QuerySamplesComplete(response)
+            self.send_responses(qitem, processed_results)
+
+    def send_responses(self, qitem: Item, processed_results):
+        response_array_refs = []
+        response = []
+        for idx, query_id in enumerate(qitem.query_id):
+            response_array = array.array(
+                "B", np.array(processed_results[idx], np.uint8).tobytes()
+            )
+            response_array_refs.append(response_array)
+            bi = response_array.buffer_info()
+            response.append(lg.QuerySampleResponse(query_id, bi[0], bi[1]))
+        lg.QuerySamplesComplete(response)
 
     def enqueue(self, query_samples):
         idx = [q.index for q in query_samples]
@@ -313,6 +326,118 @@ class QueueRunner(RunnerBase):
             worker.join()
 
 
+class PipelineRunner(RunnerBase):
+    """
+    Runs every batch through three stages, each one in its own thread: text encoding,
+    denoising, then VAE decoding and post processing. While the UNet denoises a batch,
+    the next batch is encoded and the previous one is decoded. On CUDA every stage
+    issues its work on its own stream. Stages are connected by bounded queues.
+    """
+
+    STAGES = ["encode", "denoise", "decode"]
+
+    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128, queue_depth=2):
+        super().__init__(model, ds, threads, post_proc, max_batchsize)
+        # queues[i] holds the items waiting for stage i
+        self.queues = [Queue(maxsize=queue_depth) for _ in self.STAGES]
+        self.stage_timing = {stage: [] for stage in self.STAGES}
+        self.first_start = None
+        self.last_end = None
+        self.result_dict = {}
+        self.use_streams = torch.cuda.is_available() and str(model.device).startswith("cuda")
+        self.workers = []
+        for i in range(len(self.STAGES)):
+            worker = threading.Thread(target=self.handle_stage, args=(i,))
+            worker.daemon = True
+            self.workers.append(worker)
+            worker.start()
+
+    def start_run(self, result_dict, take_accuracy):
+        super().start_run(result_dict, take_accuracy)
+        self.stage_timing = {stage: [] for stage in self.STAGES}
+        self.first_start = None
+        self.last_end = None
+
+    def run_stage(self, i, qitem: Item, state):
+        stage = self.STAGES[i]
+        if stage == "encode":
+            return self.model.encode(qitem.inputs)
+        if stage == "denoise":
+            return self.model.denoise(*state)
+        results = self.model.decode(state)
+        processed_results = self.post_process(
+            results, qitem.content_id, qitem.inputs, self.result_dict
+        )
+        if self.take_accuracy:
+            self.post_process.add_results(processed_results)
+        self.result_timing.append(time.time() - qitem.start)
+        self.send_responses(qitem, processed_results)
+        return None
+
+    def handle_stage(self, i):
+        """Worker thread of stage i."""
+        stream = torch.cuda.Stream() if self.use_streams else None
+        while True:
+            qitem = self.queues[i].get()
+            if qitem is None:
+                # pass the exit request down the pipeline
+                if i + 1 < len(self.STAGES):
+                    self.queues[i + 1].put(None)
+                break
+            state = getattr(qitem, "state", None)
+            stream_context = torch.cuda.stream(stream) if stream else contextlib.nullcontext()
+            start = time.time()
+            try:
+                with torch.no_grad(), stream_context:
+                    qitem.state = self.run_stage(i, qitem, state)
+                    # the next stage runs on another stream, and state must stay
+                    # alive until the kernels reading it are done
+                    if stream:
+                        stream.synchronize()
+            except Exception as ex:  # pylint: disable=broad-except
+                src = [self.ds.get_item_loc(idx) for idx in qitem.content_id]
+                log.error("%s stage: failed on contentid=%s, %s", self.STAGES[i], src, ex)
+                # since post_process will not run, fake empty responses
+                self.send_responses(qitem, [[]] * len(qitem.query_id))
+                continue
+            end = time.time()
+            self.stage_timing[self.STAGES[i]].append(end - start)
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+            del state
+            if i + 1 < len(self.STAGES):
+                self.queues[i + 1].put(qitem)
+
+    def enqueue(self, query_samples):
+        idx = [q.index for q in query_samples]
+        query_id = [q.id for q in query_samples]
+        bs = self.max_batchsize
+        for i in range(0, len(idx), bs):
+            ie = i + bs
+            data, label = self.ds.get_samples(idx[i:ie])
+            self.queues[0].put(Item(query_id[i:ie], idx[i:ie], data, label))
+
+    def report_stage_timing(self):
+        if self.first_start is None:
+            return
+        wall = self.last_end - self.first_start
+        for stage in self.STAGES:
+            timing = self.stage_timing[stage]
+            busy = sum(timing)
+            log.info(
+                "{} stage: {} batches, {:.3f}s per batch, busy {:.1f}% of {:.1f}s".format(
+                    stage, len(timing), busy / max(len(timing), 1), 100 * busy / wall, wall
+                )
+            )
+
+    def finish(self):
+        # exit all threads, the request goes through the stages in order
+        self.queues[0].put(None)
+        for worker in self.workers:
+            worker.join()
+        self.report_stage_timing()
+
+
 def main():
     args = get_args()
 
@@ -324,7 +449,8 @@ def main():
         precision=args.dtype,
         device=args.device,
         model_path=args.model_path,
-        batch_size=args.max_batchsize
+        batch_size=args.max_batchsize,
+        embedding_cache_dir=args.text_embedding_cache,
     )
     if args.dtype == "fp16":
         dtype = torch.float16
@@ -407,6 +533,8 @@ def main():
         lg.TestScenario.Server: QueueRunner,
         lg.TestScenario.Offline: QueueRunner,
     }
+    if args.pipeline and scenario != lg.TestScenario.SingleStream:
+        runner_map[scenario] = PipelineRunner
     runner = runner_map[scenario](
         model, ds, args.threads, post_proc=post_proc, max_batchsize=args.max_batchsize
     )
@@ -476,6 +604,12 @@ def main():
         post_proc.save_images(saved_images_ids, ds)
 
     runner.finish()
+    if args.text_embedding_cache:
+        log.info(
+            "text embedding cache: {} hits, {} misses".format(
+                backend.embedding_cache_hits, backend.embedding_cache_misses
+            )
+        )
     lg.DestroyQSL(qsl)
     lg.DestroySUT(sut)
 
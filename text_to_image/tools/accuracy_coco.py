@@ -8,13 +8,16 @@ the images in coco's captions/captions.tsv.
 import argparse
 import json
 import os
+import sys
 
 from PIL import Image
 import numpy as np
 import pandas as pd
 import torch
-from clip.clip_encoder import CLIPEncoder
-from fid.fid_score import compute_fid
+from scoring import compute_scores
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools", "accuracy_log"))
+from accuracy_log import BinaryAccuracyLog, hex_to_array, is_binary_accuracy_log, iter_raw_records, parse_record
 
 
 
@@ -27,6 +30,8 @@ def get_args():
     parser.add_argument("--verbose", action="store_true", help="verbose messages")
     parser.add_argument("--output-file", default="coco-results.json", help="path to output file")
     parser.add_argument("--device", default="cpu", choices=["gpu", "cpu"])
+    parser.add_argument("--batch-size", type=int, default=32, help="images scored at once by CLIP and Inception")
+    parser.add_argument("--num-workers", type=int, default=4, help="DataLoader workers reading and preprocessing images")
     args = parser.parse_args()
     return args
 
@@ -41,18 +46,34 @@ def preprocess_image(img_dir, file_name):
         tensor = tensor.repeat(3,1,1)
     return tensor.unsqueeze(0)
 
+class AccuracyLogSource:
+    """Generated images of an accuracy log. Every worker reads its own part of the log."""
+
+    def __init__(self, path, image_shape=(1024, 1024, 3)):
+        self.path = path
+        self.image_shape = image_shape
+
+    def __call__(self, worker_id, num_workers):
+        if is_binary_accuracy_log(self.path):
+            log = BinaryAccuracyLog(self.path)
+            for i in range(worker_id, len(log), num_workers):
+                _, idx, data = log.record(i)
+                yield idx, data.reshape(self.image_shape)
+            return
+        size = os.path.getsize(self.path)
+        begin, stop = size * worker_id // num_workers, size * (worker_id + 1) // num_workers
+        with open(self.path, "rb") as f:
+            for raw in iter_raw_records(f, begin=begin, stop=stop):
+                fields = parse_record(raw)
+                yield fields["qsl_idx"], hex_to_array(fields["data"]).reshape(self.image_shape)
+
+
 def main():
     args = get_args()
 
-    result_dict = {}
-
     # Load dataset annotations
     df_captions = pd.read_csv(args.caption_path, sep="\t")
 
-    # Load model outputs
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
-
     # set device
     device = args.device if torch.cuda.is_available() else "cpu"
     if device == "gpu":
@@ -63,31 +84,20 @@ def main():
     if args.statistics_path is None:
         statistics_path = os.path.join(os.path.dirname(__file__), "val2014.npz")
 
-    # Load torchmetrics modules
-    clip = CLIPEncoder(device=device)
-    clip_scores = []
-    seen = set()
-    result_list = []
-    for j in results:
-        idx = j['qsl_idx']
-        if idx in seen:
-            continue
-        seen.add(idx)
-
-        # Load generated image
-        generated_img = np.frombuffer(bytes.fromhex(j['data']), np.uint8).reshape(1024, 1024, 3)
-        result_list.append(generated_img)
-        generated_img = Image.fromarray(generated_img)
-        # generated_img = torch.Tensor(generated_img).to(torch.uint8).to(device)
-        # Load Ground Truth
-        caption = df_captions.iloc[idx]["caption"]
-        clip_scores.append(
-            100 * clip.get_clip_score(caption, generated_img).item()
-        )
-    fid_score = compute_fid(result_list, statistics_path, device)
-
-    result_dict["FID_SCORE"] = fid_score
-    result_dict["CLIP_SCORE"] = np.mean(clip_scores)
+    # Model outputs are streamed in batches, only FID statistics and CLIP scores are kept.
+    # The log is split between the workers, so with duplicate records of a sample the one
+    # kept is the first to be scored rather than the first in the log.
+    scores = compute_scores(
+        AccuracyLogSource(args.mlperf_accuracy_file),
+        df_captions["caption"].tolist(),
+        statistics_path,
+        device,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        dedup=True,
+    )
+
+    result_dict = {"FID_SCORE": scores["FID_SCORE"], "CLIP_SCORE": scores["CLIP_SCORE"]}
     print(f"Accuracy Results: {result_dict}")
 
     with open(args.output_file, "w") as fp:
@@ -102,4 +102,31 @@ class CLIPEncoder(nn.Module):
         # Compute the similarity between the image and text features
         similarity = image_features @ text_features.T
 
-        return similarity
\ No newline at end of file
+        return similarity
+
+    @torch.no_grad()
+    def get_clip_scores(self, texts: List[str], images: torch.Tensor) -> torch.Tensor:
+        """
+        Computes the similarity score between every text and the image at the same position, for a whole batch at once.
+        
+        Parameters:
+        -----------
+        texts: List[str]
+            One text per image.
+        images: torch.Tensor
+            Batch of images already transformed with `preprocess`.
+            
+        Returns:
+        --------
+        torch.Tensor
+            The similarity score of every (text, image) pair.
+        """
+        image_features = self.model.encode_image(images.to(self.device)).float()
+        image_features /= image_features.norm(dim=-1, keepdim=True)
+
+        # All the texts of the batch are tokenized at once
+        text = open_clip.tokenize(list(texts)).to(self.device)
+        text_features = self.model.encode_text(text).float()
+        text_features /= text_features.norm(dim=-1, keepdim=True)
+
+        return (image_features * text_features).sum(dim=-1)
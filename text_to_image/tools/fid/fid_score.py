@@ -57,6 +57,12 @@ except ImportError:
 
 from inception import InceptionV3
 
+IMAGE_EXTENSIONS = {"bmp", "jpg", "jpeg", "pgm", "png", "ppm", "tif", "tiff", "webp"}
+
+# Inception models and reference statistics, loaded once per process
+_MODELS = {}
+_STATISTICS = {}
+
 
 class ImagesDataset(torch.utils.data.Dataset):
     def __init__(self, imgs, transforms=None):
@@ -68,11 +74,79 @@ class ImagesDataset(torch.utils.data.Dataset):
 
     def __getitem__(self, i):
         img = self.imgs[i]
+        if isinstance(img, (str, pathlib.Path)):
+            img = Image.open(img).convert("RGB")
         if self.transforms is not None:
             img = self.transforms(img)
         return img
     
 
+def get_inception_model(dims=2048, device="cpu"):
+    """InceptionV3 returning the activations of `dims` dimensions, created once per process and device."""
+    key = (dims, str(device))
+    if key not in _MODELS:
+        block_idx = InceptionV3.BLOCK_INDEX_BY_DIM[dims]
+        model = InceptionV3([block_idx]).to(device)
+        model.eval()
+        _MODELS[key] = model
+    return _MODELS[key]
+
+
+class ActivationStatistics:
+    """Running mean and covariance of Inception activations.
+
+    Only the sum and the sum of outer products of the activations are kept,
+    so memory does not depend on the number of images. Activations are
+    shifted by the mean of the first batch to keep the sums well conditioned.
+    """
+
+    def __init__(self, dims=2048):
+        self.dims = dims
+        self.count = 0
+        self.shift = None
+        self.sum = np.zeros(dims, dtype=np.float64)
+        self.sum_outer = np.zeros((dims, dims), dtype=np.float64)
+
+    def update(self, act):
+        """Adds a (num images, dims) array of activations."""
+        act = np.asarray(act, dtype=np.float64).reshape(-1, self.dims)
+        if len(act) == 0:
+            return
+        if self.shift is None:
+            self.shift = act.mean(axis=0)
+        act = act - self.shift
+        self.count += len(act)
+        self.sum += act.sum(axis=0)
+        self.sum_outer += act.T @ act
+
+    def mean_and_covariance(self):
+        """Returns (mu, sigma), what np.mean and np.cov give for all the activations added."""
+        if self.count < 2:
+            raise ValueError("at least 2 images are needed for the covariance")
+        mean = self.sum / self.count
+        sigma = (self.sum_outer - self.count * np.outer(mean, mean)) / (self.count - 1)
+        return mean + self.shift, sigma
+
+
+def images_to_tensor(images, device="cpu"):
+    """Converts a (batch, height, width, 3) uint8 array or tensor to the model input, as TF.ToTensor does."""
+    images = torch.as_tensor(images).to(device)
+    return images.permute(0, 3, 1, 2).float().div(255)
+
+
+def get_batch_activations(batch, model):
+    """Activations of the pool_3 layer for a batch of images already on the model device."""
+    with torch.no_grad():
+        pred = model(batch)[0]
+
+    # If model output is not scalar, apply global spatial average pooling.
+    # This happens if you choose a dimensionality not equal 2048.
+    if pred.size(2) != 1 or pred.size(3) != 1:
+        pred = adaptive_avg_pool2d(pred, output_size=(1, 1))
+
+    return pred.squeeze(3).squeeze(2).cpu().numpy()
+
+
 def get_activations(
     files, model, batch_size=50, dims=2048, device="cpu", num_workers=1
 ):
@@ -120,17 +194,7 @@ def get_activations(
     start_idx = 0
 
     for batch in tqdm(dataloader):
-        batch = batch.to(device)
-
-        with torch.no_grad():
-            pred = model(batch)[0]
-
-        # If model output is not scalar, apply global spatial average pooling.
-        # This happens if you choose a dimensionality not equal 2048.
-        if pred.size(2) != 1 or pred.size(3) != 1:
-            pred = adaptive_avg_pool2d(pred, output_size=(1, 1))
-
-        pred = pred.squeeze(3).squeeze(2).cpu().numpy()
+        pred = get_batch_activations(batch.to(device), model)
 
         pred_arr[start_idx : start_idx + pred.shape[0]] = pred
 
@@ -235,6 +299,12 @@ def compute_statistics_of_path(
     subset_size=None,
     shuffle_seed=None,
 ):
+    """Statistics of a .npz file or of the images of a directory.
+    They are cached for the rest of the process until the path is modified."""
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns, dims, subset_size, shuffle_seed)
+    if key in _STATISTICS:
+        return _STATISTICS[key]
+
     if path.endswith(".npz"):
         with np.load(path) as f:
             m, s = f["mu"][:], f["sigma"][:]
@@ -250,7 +320,8 @@ def compute_statistics_of_path(
             files, model, batch_size, dims, device, num_workers
         )
 
-    return m, s
+    _STATISTICS[key] = (m, s)
+    return _STATISTICS[key]
 
 
 def calculate_fid_given_paths(
@@ -261,9 +332,7 @@ def calculate_fid_given_paths(
         if not os.path.exists(p):
             raise RuntimeError("Invalid path: %s" % p)
 
-    block_idx = InceptionV3.BLOCK_INDEX_BY_DIM[dims]
-
-    model = InceptionV3([block_idx]).to(device)
+    model = get_inception_model(dims, device)
 
     m1, s1 = compute_statistics_of_path(
         paths[0],
@@ -298,9 +367,7 @@ def save_fid_stats(paths, batch_size, device, dims, num_workers=1):
     if os.path.exists(paths[1]):
         raise RuntimeError("Existing output file: %s" % paths[1])
 
-    block_idx = InceptionV3.BLOCK_INDEX_BY_DIM[dims]
-
-    model = InceptionV3([block_idx]).to(device)
+    model = get_inception_model(dims, device)
 
     print(f"Saving statistics for {paths[0]}")
 
@@ -311,6 +378,56 @@ def save_fid_stats(paths, batch_size, device, dims, num_workers=1):
     np.savez_compressed(paths[1], mu=m1, sigma=s1)
 
 
+class FIDAccumulator:
+    """FID against reference statistics, updated as images are added.
+
+    Only the running statistics of the activations are kept, so the FID of
+    the images added so far can be computed at any time, e.g. on the first
+    images of a long run. The model and the reference statistics come from
+    the process-wide caches.
+    """
+
+    def __init__(self, statistics_path, device="cpu", dims=2048, batch_size=50, num_workers=1):
+        self.device = torch.device(device if torch.cuda.is_available() else "cpu")
+        self.dims = dims
+        self.batch_size = batch_size
+        self.model = get_inception_model(dims, self.device)
+        self.reference = compute_statistics_of_path(
+            statistics_path, self.model, batch_size, dims, self.device, num_workers
+        )
+        self.statistics = ActivationStatistics(dims)
+
+    @property
+    def count(self):
+        return self.statistics.count
+
+    def add_batch(self, images):
+        """Adds a (batch, height, width, 3) uint8 array or tensor of images."""
+        self.statistics.update(
+            get_batch_activations(images_to_tensor(images, self.device), self.model)
+        )
+
+    def add_images(self, images):
+        """Adds an iterable of (height, width, 3) uint8 images, batch_size at a time."""
+        batch = []
+        for image in images:
+            batch.append(np.asarray(image))
+            if len(batch) == self.batch_size:
+                self.add_batch(np.stack(batch))
+                batch = []
+        if batch:
+            self.add_batch(np.stack(batch))
+
+    def compute(self):
+        """FID of all the images added so far, at least 2 are needed."""
+        m1, s1 = self.reference
+        m2, s2 = self.statistics.mean_and_covariance()
+        return calculate_frechet_distance(m1, s1, m2, s2)
+
+    def reset(self):
+        self.statistics = ActivationStatistics(self.dims)
+
+
 def compute_fid(
     results,
     statistics_path,
@@ -321,42 +438,10 @@ def compute_fid(
     subset_size=None,
     shuffle_seed=None
 ):
-    imgs = [Image.fromarray(e).convert("RGB") for e in results]
-    device = torch.device(device if torch.cuda.is_available() else "cpu")
-    if num_workers is None:
-        try:
-            num_cpus = len(os.sched_getaffinity(0))
-        except AttributeError:
-            # os.sched_getaffinity is not available under Windows, use
-            # os.cpu_count instead (which may not return the *available* number
-            # of CPUs).
-            num_cpus = os.cpu_count()
-
-        num_workers = min(num_cpus, 8) if num_cpus is not None else 0
-    else:
-        num_workers = num_workers
+    """FID of `results`, an iterable of (height, width, 3) uint8 images, against the
+    statistics in `statistics_path`. Images are read `batch_size` at a time and only
+    the running statistics of their activations are kept."""
     assert statistics_path.endswith(".npz")
-
-    block_idx = InceptionV3.BLOCK_INDEX_BY_DIM[dims]
-
-    model = InceptionV3([block_idx]).to(device)
-
-    m1, s1 = compute_statistics_of_path(
-        statistics_path,
-        model,
-        batch_size,
-        dims,
-        device,
-        num_workers,
-        subset_size,
-        shuffle_seed,
-    )
-
-    m2, s2 = calculate_activation_statistics(
-        imgs, model, batch_size, dims, device, num_workers
-    )
-
-    fid_value = calculate_frechet_distance(m1, s1, m2, s2)
-
-    return fid_value
-
+    fid = FIDAccumulator(statistics_path, device, dims, batch_size, num_workers)
+    fid.add_images(results)
+    return fid.compute()
@@ -0,0 +1,125 @@
+"""
+Streaming CLIP score and FID of generated images.
+
+Samples are read by DataLoader workers, which also run the CLIP image
+preprocessing. Batches then go through CLIP and Inception at once, and the
+FID statistics are accumulated batch by batch, so neither the images nor
+their activations are kept in memory. The CLIP and Inception models and the
+reference statistics are loaded once per process.
+
+A source is a picklable callable: source(worker_id, num_workers) yields the
+(sample index, (height, width, 3) uint8 image) pairs of one worker's share
+of the samples.
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+import torch
+from PIL import Image
+
+from clip.clip_encoder import CLIPEncoder
+from fid.fid_score import FIDAccumulator
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    def tqdm(x):
+        return x
+
+
+# CLIP encoders, loaded once per process
+_CLIP_ENCODERS = {}
+
+
+def get_clip_encoder(device="cpu"):
+    key = str(device)
+    if key not in _CLIP_ENCODERS:
+        _CLIP_ENCODERS[key] = CLIPEncoder(device=device)
+    return _CLIP_ENCODERS[key]
+
+
+class ListSource:
+    """Source over images kept in memory, split round robin between the workers."""
+
+    def __init__(self, indices, images):
+        assert len(indices) == len(images)
+        self.indices = indices
+        self.images = images
+
+    def __call__(self, worker_id, num_workers):
+        for i in range(worker_id, len(self.images), num_workers):
+            yield self.indices[i], self.images[i]
+
+
+class ScoringDataset(torch.utils.data.IterableDataset):
+    """Yields (sample index, CLIP input, uint8 image) for the samples of a source."""
+
+    def __init__(self, source, clip_preprocess):
+        self.source = source
+        self.clip_preprocess = clip_preprocess
+
+    def __iter__(self):
+        info = torch.utils.data.get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        for idx, image in self.source(worker_id, num_workers):
+            image = np.array(image, dtype=np.uint8)
+            yield idx, self.clip_preprocess(Image.fromarray(image)), torch.from_numpy(image)
+
+
+def compute_scores(
+    source,
+    captions,
+    statistics_path,
+    device="cpu",
+    batch_size=32,
+    num_workers=0,
+    dims=2048,
+    dedup=False,
+):
+    """
+    Returns the FID and mean CLIP score of the images of `source`, with the
+    CLIP score of every image in scoring order.
+    `captions[idx]` is the caption of sample idx. With `dedup`, only the first
+    image of every sample index that reaches the scorer is kept.
+    """
+    device = torch.device(device if torch.cuda.is_available() else "cpu")
+    clip = get_clip_encoder(device)
+    fid = FIDAccumulator(statistics_path, device, dims, batch_size)
+
+    loader = torch.utils.data.DataLoader(
+        ScoringDataset(source, clip.preprocess),
+        batch_size=batch_size,
+        num_workers=num_workers,
+    )
+    clip_scores = []
+    seen = set()
+    num_duplicates = 0
+    for indices, clip_images, images in tqdm(loader):
+        indices = indices.tolist()
+        if dedup:
+            keep = []
+            for j, idx in enumerate(indices):
+                if idx in seen:
+                    num_duplicates += 1
+                else:
+                    seen.add(idx)
+                    keep.append(j)
+            if not keep:
+                continue
+            indices = [indices[j] for j in keep]
+            clip_images, images = clip_images[keep], images[keep]
+
+        scores = clip.get_clip_scores([captions[idx] for idx in indices], clip_images)
+        clip_scores.extend((100 * scores).tolist())
+        fid.add_batch(images)
+
+    return {
+        "FID_SCORE": fid.compute(),
+        "CLIP_SCORE": np.mean(clip_scores),
+        "clip_scores": clip_scores,
+        "count": fid.count,
+        "duplicates": num_duplicates,
+    }
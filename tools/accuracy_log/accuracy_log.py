@@ -0,0 +1,286 @@
+# Copyright 2023 MLCommons. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+"""
+Streaming reader for mlperf_log_accuracy.json.
+
+The accuracy log is a JSON list with one record per completed sample:
+
+    [
+    { "seq_id" : 0, "qsl_idx" : 27, "data" : "000080BF" },
+    ...
+    ]
+
+Loading it with json.load keeps every hex string in memory at once, which
+for image outputs (e.g. 1024x1024x3 bytes per SDXL sample) means tens of GB.
+This reader scans the file in fixed-size chunks and yields one record at a
+time, so memory is bounded by the chunk size plus the largest record. The
+hex payload is decoded straight from the raw bytes of the file with
+binascii, without building a Python str for it.
+
+LoadGen can also write a binary accuracy log (mlperf_log_accuracy.bin, see
+AccuracyLogFormat in loadgen/test_settings.h): a header, the raw response
+payloads back to back, then a fixed-size index of (seq_id, qsl_idx, offset,
+size, token_offset, token_size) records. BinaryAccuracyLog memory maps it for
+random access by qsl_idx, and AccuracyLogReader reads either format.
+
+Usage:
+
+    from accuracy_log import read_accuracy_log
+
+    for seq_id, qsl_idx, data in read_accuracy_log(path, dtype=np.float32, dedup=True):
+        ...
+"""
+
+import binascii
+import collections
+import re
+import struct
+
+import numpy as np
+
+AccuracyRecord = collections.namedtuple("AccuracyRecord", ["seq_id", "qsl_idx", "data"])
+TokenAccuracyRecord = collections.namedtuple("TokenAccuracyRecord", ["seq_id", "qsl_idx", "data", "token_data"])
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+_FIELD = re.compile(rb'"(\w+)"\s*:\s*(?:"([^"]*)"|(-?\d+))')
+
+# Binary accuracy log layout, mirrors AccuracyLogBinaryHeader / AccuracyLogBinaryRecord in loadgen/logging.h
+BINARY_MAGIC = b"MLPACCB1"
+BINARY_VERSION = 1
+BINARY_HAS_TOKENS = 1
+_BINARY_HEADER = struct.Struct("<8sIIQQ")
+BINARY_RECORD = np.dtype([("seq_id", "<u8"), ("qsl_idx", "<u8"), ("offset", "<u8"), ("size", "<u8"),
+                          ("token_offset", "<u8"), ("token_size", "<u8")])
+
+
+def hex_to_array(hex_bytes, dtype=np.uint8):
+    """Decodes a hex payload (bytes or str) into a read-only array of `dtype`."""
+    if isinstance(hex_bytes, str):
+        hex_bytes = hex_bytes.encode("ascii")
+    return np.frombuffer(binascii.unhexlify(hex_bytes), dtype=dtype)
+
+
+def iter_raw_records(f, chunk_size=DEFAULT_CHUNK_SIZE, begin=0, stop=None):
+    """Yields the bytes between the braces of every record of an accuracy log opened in binary mode.
+
+    Only records whose opening brace lies in [begin, stop) of the file are
+    yielded, so that several workers can split one log between them.
+    """
+    f.seek(begin)
+    buffer = b""
+    buffer_offset = begin
+    pos = 0
+    while True:
+        start = buffer.find(b"{", pos)
+        if start >= 0 and stop is not None and buffer_offset + start >= stop:
+            return
+        end = buffer.find(b"}", start) if start >= 0 else -1
+        if end >= 0:
+            yield buffer[start + 1:end]
+            pos = end + 1
+            continue
+
+        if start < 0 and stop is not None and buffer_offset + len(buffer) >= stop:
+            return
+        chunk = f.read(chunk_size)
+        if not chunk:
+            if start >= 0:
+                raise ValueError("accuracy log ends inside a record")
+            return
+        # Keep only the incomplete record, if any
+        if start >= 0:
+            buffer_offset += start
+            buffer = buffer[start:] + chunk
+        else:
+            buffer_offset += len(buffer)
+            buffer = chunk
+        pos = 0
+
+
+def parse_record(raw):
+    """Returns the fields of one raw record as a dict of name -> int or hex bytes."""
+    fields = {}
+    for match in _FIELD.finditer(raw):
+        name = match.group(1).decode("ascii")
+        fields[name] = match.group(2) if match.group(2) is not None else int(match.group(3))
+    return fields
+
+
+def is_binary_accuracy_log(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+class BinaryAccuracyLog:
+    """Memory-mapped binary accuracy log.
+
+    `index` is a structured array of BINARY_RECORD in file order. Payloads are
+    returned as read-only views of the mapping, so nothing is copied until the
+    caller does.
+    """
+
+    def __init__(self, path, dtype=np.uint8):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        with open(path, "rb") as f:
+            header = f.read(_BINARY_HEADER.size)
+        if len(header) != _BINARY_HEADER.size:
+            raise ValueError("{} is too short for a binary accuracy log".format(path))
+        magic, version, flags, num_records, index_offset = _BINARY_HEADER.unpack(header)
+        if magic != BINARY_MAGIC:
+            raise ValueError("{} is not a binary accuracy log".format(path))
+        if version != BINARY_VERSION:
+            raise ValueError("Unsupported binary accuracy log version {}".format(version))
+
+        self.has_tokens = bool(flags & BINARY_HAS_TOKENS)
+        self.buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        index_end = index_offset + num_records * BINARY_RECORD.itemsize
+        if index_end > len(self.buffer):
+            raise ValueError("{} is truncated: the index ends past the end of the file".format(path))
+        self.index = self.buffer[index_offset:index_end].view(BINARY_RECORD)
+        self._first_by_qsl_idx = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def _payload(self, offset, size):
+        return self.buffer[offset:offset + size].view(self.dtype)
+
+    def record(self, i, token_data=False):
+        """Returns record number `i` (in file order) as an AccuracyRecord, or a TokenAccuracyRecord with `token_data`."""
+        entry = self.index[i]
+        data = self._payload(int(entry["offset"]), int(entry["size"]))
+        if not token_data:
+            return AccuracyRecord(int(entry["seq_id"]), int(entry["qsl_idx"]), data)
+        tokens = self._payload(int(entry["token_offset"]), int(entry["token_size"])) if self.has_tokens else None
+        return TokenAccuracyRecord(int(entry["seq_id"]), int(entry["qsl_idx"]), data, tokens)
+
+    def qsl_indices(self):
+        """Sorted unique qsl_idx values present in the log."""
+        return np.unique(self.index["qsl_idx"])
+
+    def get(self, qsl_idx):
+        """Payload of the first record of `qsl_idx`. Raises KeyError if the log has none."""
+        if self._first_by_qsl_idx is None:
+            qsl_indices, first = np.unique(self.index["qsl_idx"], return_index=True)
+            self._first_by_qsl_idx = dict(zip(qsl_indices.tolist(), first.tolist()))
+        return self.record(self._first_by_qsl_idx[qsl_idx]).data
+
+    def __iter__(self):
+        for i in range(len(self.index)):
+            yield self.record(i)
+
+
+class BinaryAccuracyLogWriter:
+    """Writes a binary accuracy log in the format LoadGen produces."""
+
+    def __init__(self, path):
+        self.f = open(path, "wb")
+        self.f.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0, 0))
+        self.offset = _BINARY_HEADER.size
+        self.records = []
+        self.has_tokens = False
+
+    def write(self, seq_id, qsl_idx, data, token_data=None):
+        """`data` and `token_data` are bytes-like payloads."""
+        data = memoryview(data).cast("B")
+        self.f.write(data)
+        record = [seq_id, qsl_idx, self.offset, len(data), self.offset + len(data), 0]
+        self.offset += len(data)
+        if token_data is not None:
+            token_data = memoryview(token_data).cast("B")
+            self.f.write(token_data)
+            record[5] = len(token_data)
+            self.offset += len(token_data)
+            self.has_tokens = True
+        self.records.append(tuple(record))
+
+    def close(self):
+        index = np.array(self.records, dtype=BINARY_RECORD)
+        self.f.write(index.tobytes())
+        self.f.seek(0)
+        self.f.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_HAS_TOKENS if self.has_tokens else 0,
+                                         len(self.records), self.offset))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AccuracyLogReader:
+    """Iterates over the records of a JSON or binary accuracy log as (seq_id, qsl_idx, data) tuples.
+
+    With `dedup`, only the first record of every qsl_idx is yielded; the
+    skipped ones are counted in `num_duplicates`. With `token_data`, records
+    also carry the decoded "token_data" field (None when absent).
+    """
+
+    def __init__(self, path, dtype=np.uint8, dedup=False, token_data=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.dtype = dtype
+        self.dedup = dedup
+        self.token_data = token_data
+        self.chunk_size = chunk_size
+
+        self.num_records = 0
+        self.num_duplicates = 0
+
+    def __iter__(self):
+        seen = set()
+        self.num_records = 0
+        self.num_duplicates = 0
+        for seq_id, qsl_idx, decode in self._records():
+            self.num_records += 1
+            if self.dedup:
+                if qsl_idx in seen:
+                    self.num_duplicates += 1
+                    continue
+                seen.add(qsl_idx)
+
+            # Payloads of skipped duplicates are never decoded
+            data, tokens = decode()
+            if self.token_data:
+                yield TokenAccuracyRecord(seq_id, qsl_idx, data, tokens)
+            else:
+                yield AccuracyRecord(seq_id, qsl_idx, data)
+
+    def _records(self):
+        """Yields (seq_id, qsl_idx, decode) where decode() returns (data, token_data)."""
+        if is_binary_accuracy_log(self.path):
+            log = BinaryAccuracyLog(self.path, self.dtype)
+            for i, entry in enumerate(log.index[["seq_id", "qsl_idx"]].tolist()):
+                yield entry[0], entry[1], lambda i=i: log.record(i, token_data=True)[2:]
+            return
+
+        with open(self.path, "rb") as f:
+            for raw in iter_raw_records(f, self.chunk_size):
+                fields = parse_record(raw)
+
+                def decode(fields=fields):
+                    tokens = fields.get("token_data") if self.token_data else None
+                    return (hex_to_array(fields["data"], self.dtype),
+                            None if tokens is None else hex_to_array(tokens, self.dtype))
+
+                yield fields["seq_id"], fields["qsl_idx"], decode
+
+
+def read_accuracy_log(path, dtype=np.uint8, dedup=False, token_data=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generator over the records of an accuracy log, see AccuracyLogReader."""
+    return iter(AccuracyLogReader(path, dtype, dedup, token_data, chunk_size))
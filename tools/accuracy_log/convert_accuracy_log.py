@@ -0,0 +1,79 @@
+# Copyright 2023 MLCommons. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+"""
+Converts an accuracy log between the JSON and the binary format.
+
+The direction is picked from the input file: a binary log is converted to
+JSON (byte for byte what LoadGen writes, so the submission checker and the
+truncation tool accept it) and a JSON log is converted to binary.
+"""
+
+import argparse
+import binascii
+
+import numpy as np
+
+from accuracy_log import AccuracyLogReader, BinaryAccuracyLog, BinaryAccuracyLogWriter, is_binary_accuracy_log
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="mlperf_log_accuracy.json or mlperf_log_accuracy.bin")
+    parser.add_argument("output", help="converted log")
+    args = parser.parse_args()
+    return args
+
+
+def _hex(data):
+    return binascii.hexlify(memoryview(data).cast("B")).upper()
+
+
+def binary_to_json(input_path, output_path):
+    log = BinaryAccuracyLog(input_path)
+    with open(output_path, "wb") as f:
+        f.write(b"[")
+        for i in range(len(log)):
+            seq_id, qsl_idx, data, tokens = log.record(i, token_data=True)
+            f.write(b",\n{ " if i else b"\n{ ")
+            f.write(b'"seq_id" : %d, "qsl_idx" : %d, "data" : "' % (seq_id, qsl_idx))
+            f.write(_hex(data))
+            if tokens is not None:
+                f.write(b'", "token_data" : "')
+                f.write(_hex(tokens))
+            f.write(b'" }')
+        f.write(b"\n]\n")
+    return len(log)
+
+
+def json_to_binary(input_path, output_path):
+    reader = AccuracyLogReader(input_path, np.uint8, token_data=True)
+    with BinaryAccuracyLogWriter(output_path) as writer:
+        for seq_id, qsl_idx, data, tokens in reader:
+            writer.write(seq_id, qsl_idx, data, tokens)
+    return reader.num_records
+
+
+def main():
+    args = get_args()
+    if is_binary_accuracy_log(args.input):
+        num_records = binary_to_json(args.input, args.output)
+    else:
+        num_records = json_to_binary(args.input, args.output)
+    print("Converted {} records from {} to {}".format(num_records, args.input, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,10 @@
 # limitations under the License.
 
 import argparse
+import bisect
 import json
 import logging
+import mmap
 import os
 import re
 import sys
@@ -23,62 +25,144 @@ import sys
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s %(filename)s:%(lineno)d %(levelname)s] %(message)s")
 
+# Logs from this size on (e.g. with trace logging enabled) are memory mapped
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# A message line, with its key when it comes first and has no escaped characters as LoadGen writes it
+_MESSAGE = re.compile(rb'^:::MLLOG((?:\s*\{\s*"key"\s*:\s*"([^"\\\n]*)")?[^\n]*)', re.MULTILINE)
+_FLAG_TRUE = {flag: re.compile(rb'"%s"\s*:\s*true' % flag.encode()) for flag in ["is_error", "is_warning"]}
+
 class MLPerfLog():
-    def __init__(self, log_path, strict=True):
+    def __init__(self, log_path, strict=True, mmap_threshold=MMAP_THRESHOLD):
         """
         Helper class to parse the detail logs.
         log_path: path to the detail log.
         strict: whether to ignore lines with :::MLLOG prefix but with invalid JSON format.
+        mmap_threshold: logs larger than this number of bytes are memory mapped instead of read.
+
+        The log is indexed in one pass: the key of every message is extracted
+        without decoding the rest of the line, and the JSON of a message is
+        only decoded the first time it is accessed. Lines whose JSON turns out
+        to be invalid are reported when they are decoded.
         """
         self.marker = ":::MLLOG"
         self.logger = logging.getLogger("MLPerfLog")
-        self.messages = []
-        with open(log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.rstrip()
-                if line.find(self.marker) == 0:
-                    try:
-                        self.messages.append(json.loads(line[len(self.marker):]))
-                    except:
-                        if strict:
-                            raise RuntimeError("Encountered invalid line: {:}".format(line))
-                        else:
-                            self.logger.warning("Skipping invalid line: {:}".format(line))
-        self.keys = set()
-        for message in self.messages:
-            self.keys.add(message["key"])
+        self.log_path = log_path
+        self.strict = strict
+        self._mmap = None
+        with open(log_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= mmap_threshold:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._buffer = self._mmap
+            else:
+                self._buffer = f.read()
+
+        # Offsets of the JSON of every message, key -> message numbers and decoded messages
+        self._begins = []
+        self._ends = []
+        self._index = {}
+        self._decoded = {}
+        for match in _MESSAGE.finditer(self._buffer):
+            begin, end = match.span(1)
+            key = match.group(2)
+            if key is not None:
+                key = key.decode("utf-8")
+            else:
+                # Unusual layout, fall back to decoding the message
+                message = self._decode(begin, end)
+                if message is None:
+                    continue
+                key = message["key"]
+            self._index.setdefault(key, []).append(len(self._begins))
+            self._begins.append(begin)
+            self._ends.append(end)
+
+        # Messages that may be flagged as errors or warnings, confirmed once decoded
+        self._flagged = {}
+        for flag, pattern in _FLAG_TRUE.items():
+            candidates = set()
+            for match in pattern.finditer(self._buffer):
+                i = bisect.bisect_right(self._begins, match.start()) - 1
+                if i >= 0 and match.start() < self._ends[i]:
+                    candidates.add(i)
+            self._flagged[flag] = sorted(candidates)
+        self.keys = self._index.keys()
         self.logger.info("Sucessfully loaded MLPerf log from {:}.".format(log_path))
 
+    def _decode(self, begin, end):
+        line = self._buffer[begin:end].decode("utf-8", errors="replace").rstrip()
+        try:
+            message = json.loads(line)
+            message["key"]
+            return message
+        except:
+            if self.strict:
+                raise RuntimeError("Encountered invalid line: {:}{:}".format(self.marker, line))
+            else:
+                self.logger.warning("Skipping invalid line: {:}{:}".format(self.marker, line))
+                return None
+
+    def _message(self, i):
+        if i not in self._decoded:
+            self._decoded[i] = self._decode(self._begins[i], self._ends[i])
+        return self._decoded[i]
+
+    def close(self):
+        """ Release the memory map of the log, if any. Messages that were not decoded yet can no longer be read. """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def __getitem__(self, key):
         """
         Get the value of the message with the specific key. If a key appears multiple times, the first one is used.
         """
-        if key not in self.keys:
+        if key not in self._index:
             return None
-        results = []
-        for message in self.messages:
-            if message["key"] == key:
-                results.append(message)
-        if len(results) != 1:
+        indices = self._index[key]
+        if len(indices) != 1:
             self.logger.warning("There are multiple messages with key {:} in the log. Emprically choosing the first one.".format(key))
-        return results[0]["value"]
+        for message in self.iter_key(key):
+            return message["value"]
+        return None
+
+    def iter_key(self, key):
+        """
+        Iterate over the messages with specific key in the log, decoding them one at a time.
+        """
+        for i in self._index.get(key, []):
+            message = self._message(i)
+            if message is not None:
+                yield message
 
     def get(self, key):
         """
         Get all the messages with specific key in the log.
         """
-        results = []
-        if key in self.keys:
-            for message in self.messages:
-                if message["key"] == key:
-                    results.append(message)
-        return results
+        return list(self.iter_key(key))
+
+    def __iter__(self):
+        for i in range(len(self._begins)):
+            message = self._message(i)
+            if message is not None:
+                yield message
 
     def get_messages(self):
         """
         Get all the messages in the log.
         """
-        return self.messages
+        return list(self)
+
+    @property
+    def messages(self):
+        return self.get_messages()
 
     def get_keys(self):
         """
@@ -91,38 +175,38 @@ class MLPerfLog():
         Get a dict representing the log. If a key appears multiple times, the first one is used.
         """
         result = {}
-        for message in self.messages:
-            if message["key"] not in result:
-                result[message["key"]] = message["value"]
-            else:
-                self.logger.warning("There are multiple messages with key {:} in the log. Emprically choosing the first one.".format(key))
+        for key in self._index:
+            value = self[key]
+            if value is not None:
+                result[key] = value
+        return result
 
     def dump(self, output_path):
         """
         Dump the entire log as a json file.
         """
-        with open(log_path, "w") as f:
-            json.dump(self.messages, f, indent=4)
+        with open(output_path, "w") as f:
+            json.dump(self.get_messages(), f, indent=4)
 
     def num_messages(self):
         """ Get number of messages (including errors and warnings) in the log. """
-        return len(self.messages)
+        return len(self._begins)
+
+    def _get_flagged(self, flag):
+        results = []
+        for i in self._flagged[flag]:
+            message = self._message(i)
+            if message is not None and message["metadata"][flag]:
+                results.append(message)
+        return results
 
     def num_errors(self):
         """ Get number of errors in the log. """
-        count = 0
-        for message in self.messages:
-            if message["metadata"]["is_error"]:
-                count += 1
-        return count
+        return len(self.get_errors())
 
     def num_warnings(self):
         """ Get number of warning in the log. """
-        count = 0
-        for message in self.messages:
-            if message["metadata"]["is_warning"]:
-                count += 1
-        return count
+        return len(self.get_warnings())
 
     def has_error(self):
         """ Check if the log contains any errors. """
@@ -136,21 +220,13 @@ class MLPerfLog():
         """
         Get all the error messages in the log.
         """
-        results = []
-        for message in self.messages:
-            if message["metadata"]["is_error"]:
-                results.append(message)
-        return results
+        return self._get_flagged("is_error")
 
     def get_warnings(self):
         """
         Get all the warning messages in the log.
         """
-        results = []
-        for message in self.messages:
-            if message["metadata"]["is_warning"]:
-                results.append(message)
-        return results
+        return self._get_flagged("is_warning")
 
 def get_args():
     """Parse commandline."""
@@ -0,0 +1,111 @@
+"""
+On-disk cache for the submission checker.
+
+Every scenario check is stored under a key derived from the content of the
+files it reads, the checker sources and the checker options. Re-running the
+checker after changing one directory only re-checks the scenarios whose
+inputs changed.
+
+Files are identified by their SHA-256. The hash of a file is reused without
+reading it again as long as its size and modification time are unchanged.
+"""
+
+import hashlib
+import json
+import os
+
+CACHE_FORMAT = 1
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path, salt):
+        """`salt` is folded into every key, e.g. a digest of the checker sources and options."""
+        self.path = os.path.abspath(path)
+        self.salt = salt
+        self.files = {}
+        self.checks = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    cache = json.load(f)
+                if cache.get("format") == CACHE_FORMAT:
+                    self.files = cache["files"]
+                    self.checks = cache["checks"]
+            except (OSError, ValueError, KeyError):
+                # A broken cache is only a slower run
+                pass
+
+    def file_digest(self, path):
+        st = os.stat(path)
+        abs_path = os.path.abspath(path)
+        entry = self.files.get(abs_path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = sha256_file(path)
+        self.files[abs_path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def fingerprint(self, trees=(), listings=()):
+        """Digest of the files under `trees` and of the entries directly under `listings`.
+
+        Files under a tree are hashed by content. A listing only records the
+        names and sizes of the entries of a directory, or the content if
+        the path is a file. Missing paths are part of the fingerprint too.
+        """
+        h = hashlib.sha256()
+        for tree in trees:
+            h.update(("T" + tree + "\0").encode("utf-8"))
+            if not os.path.isdir(tree):
+                h.update(b"missing\0")
+                continue
+            for root, dirs, files in os.walk(tree):
+                dirs.sort()
+                h.update(("D" + os.path.relpath(root, tree) + "\0").encode("utf-8"))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    digest = self.file_digest(path) if os.path.exists(path) else "broken"
+                    h.update((name + "\0" + digest + "\0").encode("utf-8"))
+        for listing in listings:
+            h.update(("L" + listing + "\0").encode("utf-8"))
+            if os.path.isfile(listing):
+                h.update(self.file_digest(listing).encode("ascii"))
+            elif os.path.isdir(listing):
+                for name in sorted(os.listdir(listing)):
+                    path = os.path.join(listing, name)
+                    size = os.path.getsize(path) if os.path.isfile(path) else -1
+                    h.update((name + "\0" + str(size) + "\0").encode("utf-8"))
+            else:
+                h.update(b"missing\0")
+        return h.hexdigest()
+
+    def key(self, *parts):
+        """Cache key of a check. `parts` must be JSON serializable."""
+        blob = json.dumps([self.salt] + list(parts), sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self.checks.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.checks[key] = value
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": CACHE_FORMAT, "files": self.files, "checks": self.checks}, f, default=str)
+        os.replace(tmp_path, self.path)
@@ -6,7 +6,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import concurrent.futures
 import datetime
+import hashlib
 import json
 import logging
 import os
@@ -15,6 +17,7 @@ import sys
 from glob import glob
 
 from log_parser import MLPerfLog
+from result_cache import ResultCache
 
 # pylint: disable=missing-docstring
 
@@ -1674,6 +1677,24 @@ class Config:
         return self.version not in ["v0.5", "v0.7", "v1.0"]
 
 
+def checker_digest(config):
+    """Digest of the checker sources and of the options not passed to the scenario checks, for the ResultCache."""
+    h = hashlib.sha256()
+    for source in ["submission_checker.py", "log_parser.py", "result_cache.py",
+                   "power/power_checker.py", "power/sources_checksums.json"]:
+        path = os.path.join(submission_checker_dir, source)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                h.update(f.read())
+    h.update(json.dumps([
+        config.extra_model_benchmark_map,
+        config.ignore_uncommited,
+        config.skip_power_check,
+        os.environ.get("INFER_SYSTEM_FILE", ""),
+    ]).encode("utf-8"))
+    return h.hexdigest()
+
+
 def get_args():
     """Parse commandline."""
     parser = argparse.ArgumentParser()
@@ -1727,6 +1748,17 @@ def get_args():
         action="store_true",
         help="skips the check of extra files inside the root submission dir",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes checking scenarios in parallel",
+    )
+    parser.add_argument(
+        "--cache",
+        help="cache file (outside of the submission directory) with the results of previous checks; "
+        "only the scenarios whose files changed are checked again",
+    )
     args = parser.parse_args()
     return args
 
@@ -2398,6 +2430,432 @@ def is_system_over_network(division, system_json, path):
     return is_network_system, is_valid
 
 
+def check_scenario_dir(
+    config,
+    division,
+    submitter,
+    system_desc,
+    system_type,
+    system_json,
+    model_name,
+    mlperf_model,
+    all_scenarios,
+    scenario,
+    skip_compliance,
+    debug=False,
+    skip_meaningful_fields_emptiness_check=False,
+    skip_empty_files_check=False,
+    skip_check_power_measure_files=False,
+):
+    """
+    Check results/$system_desc/$model/$scenario together with its
+    measurements and compliance directories.
+    Nothing outside of the returned dict is modified, so scenarios can be
+    checked in any order and in worker processes. The dict holds:
+        results - entries for the results of check_results_dir
+        errors - number of errors found
+        system_keys - "power" or "non_power" for every valid run
+        required_done - the scenario counts towards the required scenarios
+        row - the csv fields of the result, None if it is not reported
+    """
+    config.set_type(system_type)
+    results_path = os.path.join(division, submitter, "results")
+    is_closed_or_network = division in ["closed", "network"]
+    check = {
+        "results": {},
+        "errors": 0,
+        "system_keys": [],
+        "required_done": False,
+        "row": None,
+    }
+    results = check["results"]
+
+    # some submissions in v0.5 use lower case scenarios - map them for now
+    scenario_fixed = SCENARIO_MAPPING.get(scenario, scenario)
+
+    # we are looking at ./$division/$submitter/results/$system_desc/$model/$scenario,
+    #   ie ./closed/mlperf_org/results/t4-ort/bert/Offline
+    name = os.path.join(
+        results_path, system_desc, model_name, scenario
+    )
+    results[name] = None
+    if is_closed_or_network and scenario_fixed not in all_scenarios:
+        log.error(
+            "%s ignoring scenario %s (neither required nor optional)",
+            name,
+            scenario,
+        )
+        results[name] = None
+        check["errors"] += 1
+        return check
+
+    # check if this submission has power logs
+    power_path = os.path.join(name, "performance", "power")
+    has_power = os.path.exists(power_path)
+
+    if has_power:
+        log.info("Detected power logs for %s", name)
+        if config.version in [
+            "v1.0",
+            "v1.1",
+            "v2.0",
+            "v2.1",
+            "v3.0",
+            "v3.1"
+        ]:
+            pass  # Submission checker was not enforcing this
+        # The power related system_desc_fields are not used by submitters currently.
+        # Turning this check off for now
+        elif False and not check_system_desc_id_power(
+            name,
+            system_json,
+            submitter,
+            division,
+            config.version,
+            skip_meaningful_fields_emptiness_check,
+        ):
+            results[name] = None
+            check["errors"] += 1
+            return check
+
+    # check if measurement_dir is good.
+    measurement_dir = os.path.join(
+        division,
+        submitter,
+        "measurements",
+        system_desc,
+        model_name,
+        scenario,
+    )
+    if not os.path.exists(measurement_dir):
+        log.error("no measurement_dir for %s", measurement_dir)
+        results[measurement_dir] = None
+        check["errors"] += 1
+        return check
+    else:
+        if not check_measurement_dir(
+            measurement_dir,
+            name,
+            system_desc,
+            os.path.join(division, submitter),
+            model_name,
+            scenario,
+            has_power,
+            skip_meaningful_fields_emptiness_check,
+            skip_empty_files_check,
+            skip_check_power_measure_files,
+        ):
+            log.error(
+                "%s measurement_dir has issues", measurement_dir
+            )
+            results[measurement_dir] = None
+            check["errors"] += 1
+            return check
+
+    # check accuracy
+    accuracy_is_valid = False
+    acc_path = os.path.join(name, "accuracy")
+    if not os.path.exists(os.path.join(acc_path, "accuracy.txt")):
+        log.error(
+            "%s has no accuracy.txt. Generate it with accuracy-imagenet.py or accuracy-coco.py or "
+            "process_accuracy.py",
+            acc_path,
+        )
+    else:
+        diff = files_diff(list_files(acc_path), REQUIRED_ACC_FILES)
+        if diff:
+            log.error(
+                "%s has file list mismatch (%s)", acc_path, diff
+            )
+        accuracy_is_valid, acc = check_accuracy_dir(
+            config,
+            mlperf_model,
+            acc_path,
+            debug or is_closed_or_network,
+        )
+        if mlperf_model in REQUIRED_ACC_BENCHMARK:
+            if config.version in REQUIRED_ACC_BENCHMARK[mlperf_model]:
+                extra_files_pass, missing_files = check_extra_files(acc_path, REQUIRED_ACC_BENCHMARK[mlperf_model][config.version])
+                if not extra_files_pass:
+                    log.error(
+                        "%s expected to have the following extra files (%s)", acc_path, missing_files
+                    )
+                    accuracy_is_valid = False
+        if not accuracy_is_valid and not is_closed_or_network:
+            if debug:
+                log.warning(
+                    "%s, accuracy not valid but taken for open",
+                    acc_path,
+                )
+            accuracy_is_valid = True
+        if not accuracy_is_valid:
+            # a little below we'll not copy this into the results csv
+            check["errors"] += 1
+            log.error("%s, accuracy not valid", acc_path)
+
+    inferred = 0
+    if scenario in ["Server"] and config.version in [
+        "v0.5",
+        "v0.7",
+    ]:
+        n = ["run_1", "run_2", "run_3", "run_4", "run_5"]
+    else:
+        n = ["run_1"]
+
+    for i in n:
+        perf_path = os.path.join(name, "performance", i)
+        if not os.path.exists(perf_path):
+            log.error("%s is missing", perf_path)
+            is_valid, r = False, None
+            continue
+        if has_power:
+            required_perf_files = (
+                REQUIRED_PERF_FILES + REQUIRED_PERF_POWER_FILES
+            )
+        else:
+            required_perf_files = REQUIRED_PERF_FILES
+        diff = files_diff(
+            list_files(perf_path),
+            required_perf_files,
+            OPTIONAL_PERF_FILES,
+        )
+        if diff:
+            log.error(
+                "%s has file list mismatch (%s)", perf_path, diff
+            )
+            is_valid, r = False, None
+            continue
+
+        try:
+            is_valid, r, is_inferred = check_performance_dir(
+                config,
+                mlperf_model,
+                perf_path,
+                scenario_fixed,
+                division,
+                system_json,
+                has_power,
+            )
+            if is_inferred:
+                inferred = 1
+                log.info(
+                    "%s has inferred results, qps=%s", perf_path, r
+                )
+        except Exception as e:
+            log.error(
+                "%s caused exception in check_performance_dir: %s",
+                perf_path,
+                e,
+            )
+            is_valid, r = False, None
+
+        power_metric = 0
+        if has_power:
+            try:
+                ranging_path = os.path.join(
+                    name, "performance", "ranging"
+                )
+                (
+                    ranging_r
+                ) = get_performance_metric(
+                    config,
+                    mlperf_model,
+                    ranging_path,
+                    scenario_fixed,
+                    division,
+                    system_json,
+                    has_power,
+                )
+            except Exception as e:
+                log.error(
+                    "%s caused exception in check_ranging_dir: %s",
+                    ranging_path,
+                    e,
+                )
+                is_valid, r = False, None
+
+            try:
+                (
+                    power_is_valid,
+                    power_metric,
+                    power_efficiency,
+                ) = check_power_dir(
+                    power_path,
+                    ranging_path,
+                    perf_path,
+                    scenario_fixed,
+                    ranging_r,
+                    r,
+                    config,
+                )
+                if not power_is_valid:
+                    is_valid = False
+                    power_metric = 0
+            except Exception as e:
+                log.error(
+                    "%s caused exception in check_power_dir: %s",
+                    perf_path,
+                    e,
+                )
+                is_valid, r, power_metric = False, None, 0
+
+        if is_valid:
+            results[name] = (
+                r
+                if r is None or not has_power
+                else (
+                    "{:f} "
+                    "with "
+                    "power_metric"
+                    " = {:f} and power_efficiency (samples/J) = {:f}"
+                ).format(r, power_metric, power_efficiency)
+            )
+
+            check["system_keys"].append("power" if power_metric > 0 else "non_power")
+            check["required_done"] = True
+        else:
+            log.error("%s has issues", perf_path)
+            check["errors"] += 1
+            results[name] = None
+
+    # check if compliance dir is good for CLOSED division
+    compliance = 0 if is_closed_or_network else 1
+    if is_closed_or_network and not skip_compliance:
+        compliance_dir = os.path.join(
+            division,
+            submitter,
+            "compliance",
+            system_desc,
+            model_name,
+            scenario,
+        )
+        if not os.path.exists(compliance_dir) and "gptj" not in model_name:
+            log.error("no compliance dir for %s", name)
+            results[name] = None
+        else:
+            if not check_compliance_dir(
+                compliance_dir,
+                mlperf_model,
+                scenario_fixed,
+                config,
+                division,
+                system_json,
+            ):
+                log.error(
+                    "compliance dir %s has issues", compliance_dir
+                )
+                results[name] = None
+            else:
+                compliance = 1
+
+    if results.get(name):
+        if accuracy_is_valid:
+            # Written to the csv by the caller, which knows the errors of the other scenarios
+            check["row"] = {
+                "scenario_fixed": scenario_fixed,
+                "r": r,
+                "acc": acc,
+                "name": name,
+                "compliance": compliance,
+                "inferred": inferred,
+                "power_metric": power_metric,
+            }
+        else:
+            results[name] = None
+            log.error("%s is OK but accuracy has issues", name)
+
+    return check
+
+
+LOG_RECORD_ATTRS = [
+    "name", "msg", "levelname", "levelno", "pathname", "filename", "module",
+    "lineno", "funcName", "created", "msecs", "relativeCreated", "thread",
+    "threadName", "process", "processName",
+]
+
+
+class LogRecordCollector(logging.Handler):
+    """Keeps log records as plain dicts, to replay them in another process or from the cache."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        fields = {k: getattr(record, k, None) for k in LOG_RECORD_ATTRS}
+        fields["msg"] = record.getMessage()
+        self.records.append(fields)
+
+
+def replay_log_records(records):
+    for fields in records:
+        logging.getLogger(fields["name"]).handle(logging.makeLogRecord(fields))
+
+
+def check_scenario_task(config, task, options):
+    """check_scenario_dir with its log records collected in the returned dict under "log"."""
+    root = logging.getLogger()
+    collector = LogRecordCollector()
+    handlers, root.handlers = root.handlers, [collector]
+    try:
+        check = check_scenario_dir(config, *task, **options)
+    finally:
+        root.handlers = handlers
+    check["log"] = collector.records
+    return check
+
+
+def scenario_inputs(task):
+    """Files and directories check_scenario_dir reads for `task`, as (trees, listings) for ResultCache.fingerprint."""
+    division, submitter, system_desc, _, _, model_name, _, _, scenario = task
+    root = os.path.join(division, submitter)
+    trees = [
+        os.path.join(root, kind, system_desc, model_name, scenario)
+        for kind in ["results", "measurements", "compliance"]
+    ]
+    listings = [
+        os.path.join(root, "measurements", system_desc, model_name),
+        os.path.join(root, "measurements", system_desc),
+        os.path.join(root, "measurements"),
+        os.path.join(root, "code"),
+        os.path.join(root, "code", model_name),
+    ]
+    return trees, listings
+
+
+def run_scenario_checks(config, tasks, options, jobs=1, cache=None):
+    """
+    Yields the result of check_scenario_task for every task, in order.
+    Tasks whose inputs are unchanged since they were cached are not checked
+    again; the others are spread over `jobs` processes.
+    """
+    keys = [None] * len(tasks)
+    cached = [None] * len(tasks)
+    if cache:
+        for i, task in enumerate(tasks):
+            keys[i] = cache.key(config.version, task, options, cache.fingerprint(*scenario_inputs(task)))
+            cached[i] = cache.get(keys[i])
+        log.info("%d of %d scenarios unchanged since the last check", cache.hits, len(tasks))
+    todo = [task for task, check in zip(tasks, cached) if check is None]
+
+    pool = None
+    if jobs > 1 and len(todo) > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(min(jobs, len(todo)))
+        pending = pool.map(check_scenario_task, [config] * len(todo), todo, [options] * len(todo))
+    else:
+        pending = map(check_scenario_task, [config] * len(todo), todo, [options] * len(todo))
+    try:
+        for key, check in zip(keys, cached):
+            if check is None:
+                check = next(pending)
+                if cache:
+                    cache.put(key, check)
+            yield check
+    finally:
+        if pool:
+            pool.shutdown()
+
+
 def check_results_dir(
     config,
     filter_submitter,
@@ -2408,6 +2866,8 @@ def check_results_dir(
     skip_empty_files_check=False,
     skip_check_power_measure_files=False,
     skip_extra_files_in_root_check=False,
+    jobs=1,
+    cache=None,
 ):
     """
     Walk the results directory and do the checking.
@@ -2429,6 +2889,8 @@ def check_results_dir(
         if all was good, add the result to the results directory
         if there are errors write a None as result so we can report later what
         failed
+    The scenarios are checked last, by check_scenario_dir, in `jobs`
+    processes and through `cache` (a ResultCache) if given.
     """
     head = [
         "Organization",
@@ -2463,6 +2925,7 @@ def check_results_dir(
     csv.write(",".join(head) + "\n")
     results = {}
     systems = {}
+    models = []
 
     def log_result(
         submitter,
@@ -2799,338 +3262,114 @@ def check_results_dir(
                         results[name] = None
                         continue
 
-                    errors = 0
                     all_scenarios = set(
                         list(required_scenarios)
                         + list(config.get_optional(mlperf_model))
                     )
-                    for scenario in list_dir(results_path, system_desc, model_name):
-                        # some submissions in v0.5 use lower case scenarios - map them for now
-                        scenario_fixed = SCENARIO_MAPPING.get(scenario, scenario)
-
-                        # we are looking at ./$division/$submitter/results/$system_desc/$model/$scenario,
-                        #   ie ./closed/mlperf_org/results/t4-ort/bert/Offline
-                        name = os.path.join(
-                            results_path, system_desc, model_name, scenario
-                        )
-                        results[name] = None
-                        if is_closed_or_network and scenario_fixed not in all_scenarios:
-                            log.error(
-                                "%s ignoring scenario %s (neither required nor optional)",
-                                name,
-                                scenario,
-                            )
-                            results[name] = None
-                            errors += 1
-                            continue
+                    models.append(
+                        {
+                            "submitter": submitter,
+                            "available": available,
+                            "division": division,
+                            "system_type": system_type,
+                            "system_desc": system_desc,
+                            "system_json": system_json,
+                            "model_name": model_name,
+                            "mlperf_model": mlperf_model,
+                            "all_scenarios": sorted(all_scenarios),
+                            "required_scenarios": required_scenarios,
+                            "scenarios": list_dir(results_path, system_desc, model_name),
+                        }
+                    )
 
-                        # check if this submission has power logs
-                        power_path = os.path.join(name, "performance", "power")
-                        has_power = os.path.exists(power_path)
-
-                        if has_power:
-                            log.info("Detected power logs for %s", name)
-                            if config.version in [
-                                "v1.0",
-                                "v1.1",
-                                "v2.0",
-                                "v2.1",
-                                "v3.0",
-                                "v3.1"
-                            ]:
-                                pass  # Submission checker was not enforcing this
-                            # The power related system_desc_fields are not used by submitters currently.
-                            # Turning this check off for now
-                            elif False and not check_system_desc_id_power(
-                                name,
-                                system_json,
-                                submitter,
-                                division,
-                                config.version,
-                                skip_meaningful_fields_emptiness_check,
-                            ):
-                                results[name] = None
-                                errors += 1
-                                continue
-
-                        # check if measurement_dir is good.
-                        measurement_dir = os.path.join(
-                            division,
-                            submitter,
-                            "measurements",
-                            system_desc,
-                            model_name,
-                            scenario,
-                        )
-                        if not os.path.exists(measurement_dir):
-                            log.error("no measurement_dir for %s", measurement_dir)
-                            results[measurement_dir] = None
-                            errors += 1
-                            continue
-                        else:
-                            if not check_measurement_dir(
-                                measurement_dir,
-                                name,
-                                system_desc,
-                                os.path.join(division, submitter),
-                                model_name,
-                                scenario,
-                                has_power,
-                                skip_meaningful_fields_emptiness_check,
-                                skip_empty_files_check,
-                                skip_check_power_measure_files,
-                            ):
-                                log.error(
-                                    "%s measurement_dir has issues", measurement_dir
-                                )
-                                results[measurement_dir] = None
-                                errors += 1
-                                continue
-
-                        # check accuracy
-                        accuracy_is_valid = False
-                        acc_path = os.path.join(name, "accuracy")
-                        if not os.path.exists(os.path.join(acc_path, "accuracy.txt")):
-                            log.error(
-                                "%s has no accuracy.txt. Generate it with accuracy-imagenet.py or accuracy-coco.py or "
-                                "process_accuracy.py",
-                                acc_path,
-                            )
-                        else:
-                            diff = files_diff(list_files(acc_path), REQUIRED_ACC_FILES)
-                            if diff:
-                                log.error(
-                                    "%s has file list mismatch (%s)", acc_path, diff
-                                )
-                            accuracy_is_valid, acc = check_accuracy_dir(
-                                config,
-                                mlperf_model,
-                                acc_path,
-                                debug or is_closed_or_network,
-                            )
-                            if mlperf_model in REQUIRED_ACC_BENCHMARK:
-                                if config.version in REQUIRED_ACC_BENCHMARK[mlperf_model]:
-                                    extra_files_pass, missing_files = check_extra_files(acc_path, REQUIRED_ACC_BENCHMARK[mlperf_model][config.version])
-                                    if not extra_files_pass:
-                                        log.error(
-                                            "%s expected to have the following extra files (%s)", acc_path, missing_files
-                                        )
-                                        accuracy_is_valid = False
-                            if not accuracy_is_valid and not is_closed_or_network:
-                                if debug:
-                                    log.warning(
-                                        "%s, accuracy not valid but taken for open",
-                                        acc_path,
-                                    )
-                                accuracy_is_valid = True
-                            if not accuracy_is_valid:
-                                # a little below we'll not copy this into the results csv
-                                errors += 1
-                                log.error("%s, accuracy not valid", acc_path)
-
-                        inferred = 0
-                        if scenario in ["Server"] and config.version in [
-                            "v0.5",
-                            "v0.7",
-                        ]:
-                            n = ["run_1", "run_2", "run_3", "run_4", "run_5"]
-                        else:
-                            n = ["run_1"]
-
-                        for i in n:
-                            perf_path = os.path.join(name, "performance", i)
-                            if not os.path.exists(perf_path):
-                                log.error("%s is missing", perf_path)
-                                is_valid, r = False, None
-                                continue
-                            if has_power:
-                                required_perf_files = (
-                                    REQUIRED_PERF_FILES + REQUIRED_PERF_POWER_FILES
-                                )
-                            else:
-                                required_perf_files = REQUIRED_PERF_FILES
-                            diff = files_diff(
-                                list_files(perf_path),
-                                required_perf_files,
-                                OPTIONAL_PERF_FILES,
-                            )
-                            if diff:
-                                log.error(
-                                    "%s has file list mismatch (%s)", perf_path, diff
-                                )
-                                is_valid, r = False, None
-                                continue
-
-                            try:
-                                is_valid, r, is_inferred = check_performance_dir(
-                                    config,
-                                    mlperf_model,
-                                    perf_path,
-                                    scenario_fixed,
-                                    division,
-                                    system_json,
-                                    has_power,
-                                )
-                                if is_inferred:
-                                    inferred = 1
-                                    log.info(
-                                        "%s has inferred results, qps=%s", perf_path, r
-                                    )
-                            except Exception as e:
-                                log.error(
-                                    "%s caused exception in check_performance_dir: %s",
-                                    perf_path,
-                                    e,
-                                )
-                                is_valid, r = False, None
-
-                            power_metric = 0
-                            if has_power:
-                                try:
-                                    ranging_path = os.path.join(
-                                        name, "performance", "ranging"
-                                    )
-                                    (
-                                        ranging_r
-                                    ) = get_performance_metric(
-                                        config,
-                                        mlperf_model,
-                                        ranging_path,
-                                        scenario_fixed,
-                                        division,
-                                        system_json,
-                                        has_power,
-                                    )
-                                except Exception as e:
-                                    log.error(
-                                        "%s caused exception in check_ranging_dir: %s",
-                                        ranging_path,
-                                        e,
-                                    )
-                                    is_valid, r = False, None
-
-                                try:
-                                    (
-                                        power_is_valid,
-                                        power_metric,
-                                        power_efficiency,
-                                    ) = check_power_dir(
-                                        power_path,
-                                        ranging_path,
-                                        perf_path,
-                                        scenario_fixed,
-                                        ranging_r,
-                                        r,
-                                        config,
-                                    )
-                                    if not power_is_valid:
-                                        is_valid = False
-                                        power_metric = 0
-                                except Exception as e:
-                                    log.error(
-                                        "%s caused exception in check_power_dir: %s",
-                                        perf_path,
-                                        e,
-                                    )
-                                    is_valid, r, power_metric = False, None, 0
-
-                            if is_valid:
-                                results[name] = (
-                                    r
-                                    if r is None or not has_power
-                                    else (
-                                        "{:f} "
-                                        "with "
-                                        "power_metric"
-                                        " = {:f} and power_efficiency (samples/J) = {:f}"
-                                    ).format(r, power_metric, power_efficiency)
-                                )
-
-                                system_id = submitter + "_" + system_desc
-
-                                key = "power" if power_metric > 0 else "non_power"
-                                if system_id not in systems[division][key]:
-                                    systems[division][key][system_id] = 1
-                                else:
-                                    systems[division][key][system_id] += 1
-
-                                required_scenarios.discard(scenario_fixed)
-                            else:
-                                log.error("%s has issues", perf_path)
-                                errors += 1
-                                results[name] = None
-
-                        # check if compliance dir is good for CLOSED division
-                        compliance = 0 if is_closed_or_network else 1
-                        if is_closed_or_network and not skip_compliance:
-                            compliance_dir = os.path.join(
-                                division,
-                                submitter,
-                                "compliance",
-                                system_desc,
-                                model_name,
-                                scenario,
-                            )
-                            if not os.path.exists(compliance_dir) and "gptj" not in model_name:
-                                log.error("no compliance dir for %s", name)
-                                results[name] = None
-                            else:
-                                if not check_compliance_dir(
-                                    compliance_dir,
-                                    mlperf_model,
-                                    scenario_fixed,
-                                    config,
-                                    division,
-                                    system_json,
-                                ):
-                                    log.error(
-                                        "compliance dir %s has issues", compliance_dir
-                                    )
-                                    results[name] = None
-                                else:
-                                    compliance = 1
-
-                        if results.get(name):
-                            if accuracy_is_valid:
-                                log_result(
-                                    submitter,
-                                    available,
-                                    division,
-                                    system_type,
-                                    system_json.get("system_name"),
-                                    system_desc,
-                                    model_name,
-                                    mlperf_model,
-                                    scenario_fixed,
-                                    r,
-                                    acc,
-                                    system_json,
-                                    name,
-                                    compliance,
-                                    errors,
-                                    config,
-                                    inferred=inferred,
-                                    power_metric=power_metric,
-                                )
-                            else:
-                                results[name] = None
-                                log.error("%s is OK but accuracy has issues", name)
-
-                    if required_scenarios:
-                        name = os.path.join(results_path, system_desc, model_name)
-                        if is_closed_or_network:
-                            results[name] = None
-                            log.error(
-                                "%s does not have all required scenarios, missing %s",
-                                name,
-                                required_scenarios,
-                            )
-                        elif debug:
-                            log.warning(
-                                "%s ignoring missing scenarios in open division (%s)",
-                                name,
-                                required_scenarios,
-                            )
+    #
+    # Check the scenarios of every model, possibly in parallel or from the cache
+    #
+    tasks = [
+        (
+            m["division"],
+            m["submitter"],
+            m["system_desc"],
+            m["system_type"],
+            m["system_json"],
+            m["model_name"],
+            m["mlperf_model"],
+            m["all_scenarios"],
+            scenario,
+        )
+        for m in models
+        for scenario in m["scenarios"]
+    ]
+    options = {
+        "skip_compliance": skip_compliance,
+        "debug": debug,
+        "skip_meaningful_fields_emptiness_check": skip_meaningful_fields_emptiness_check,
+        "skip_empty_files_check": skip_empty_files_check,
+        "skip_check_power_measure_files": skip_check_power_measure_files,
+    }
+    checks = run_scenario_checks(config, tasks, options, jobs, cache)
+    for m in models:
+        division = m["division"]
+        submitter = m["submitter"]
+        system_desc = m["system_desc"]
+        system_json = m["system_json"]
+        model_name = m["model_name"]
+        required_scenarios = m["required_scenarios"]
+        errors = 0
+        for scenario in m["scenarios"]:
+            check = next(checks)
+            replay_log_records(check["log"])
+            results.update(check["results"])
+            errors += check["errors"]
+
+            system_id = submitter + "_" + system_desc
+            for key in check["system_keys"]:
+                if system_id not in systems[division][key]:
+                    systems[division][key][system_id] = 1
+                else:
+                    systems[division][key][system_id] += 1
+
+            if check["required_done"]:
+                required_scenarios.discard(SCENARIO_MAPPING.get(scenario, scenario))
+
+            row = check["row"]
+            if row:
+                log_result(
+                    submitter,
+                    m["available"],
+                    division,
+                    m["system_type"],
+                    system_json.get("system_name"),
+                    system_desc,
+                    model_name,
+                    m["mlperf_model"],
+                    row["scenario_fixed"],
+                    row["r"],
+                    row["acc"],
+                    system_json,
+                    row["name"],
+                    row["compliance"],
+                    errors,
+                    config,
+                    inferred=row["inferred"],
+                    power_metric=row["power_metric"],
+                )
+
+        if required_scenarios:
+            name = os.path.join(division, submitter, "results", system_desc, model_name)
+            if division in ["closed", "network"]:
+                results[name] = None
+                log.error(
+                    "%s does not have all required scenarios, missing %s",
+                    name,
+                    required_scenarios,
+                )
+            elif debug:
+                log.warning(
+                    "%s ignoring missing scenarios in open division (%s)",
+                    name,
+                    required_scenarios,
+                )
 
     return results, systems
 
@@ -3572,6 +3811,10 @@ def main():
         args.skip_empty_files_check = True
         args.skip_check_power_measure_files = True
 
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, checker_digest(config))
+
     with open(args.csv, "w") as csv:
         os.chdir(args.input)
         # check results directory
@@ -3584,8 +3827,12 @@ def main():
             args.skip_meaningful_fields_emptiness_check,
             args.skip_empty_files_check,
             args.skip_check_power_measure_files,
-            args.skip_extra_files_in_root_check
+            args.skip_extra_files_in_root_check,
+            args.jobs,
+            cache,
         )
+    if cache:
+        cache.save()
 
     # log results
     log.info("---")
@@ -21,6 +21,9 @@ import tensorflow as tf
 from nmt.utils import evaluation_utils as e_utils
 from nmt.scripts import bleu
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import read_accuracy_log
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
@@ -53,33 +56,17 @@ if __name__ == "__main__":
 
     runningBLUE = bleu.RunningBLEUScorer(4)
 
-    seen_sentence_ids = set()
-    with open(args.accuracy_log) as ifh:
-        for line in ifh:
-            ##
-            # @note: Simplistic way to extract records
-            # @note: This could be loaded in through json module,
-            # but it is an easy way to test incomplete log files
-            # without proper closure braces.
-            if not "{" in line:
-                continue
-            s_line = line.strip("\n").strip(",")
-            record = eval(s_line)
-
-            # Decode data to sentence
-            sentence = (bytes.fromhex(record["data"])).decode("utf-8")
-            trans = sentence.split(" ")
-            sent_id = record["qsl_idx"]
-
-            # Skip duplicates
-            if sent_id in seen_sentence_ids:
-                continue
-
-            # Keep track of the sentence IDs seen before
-            seen_sentence_ids.add(sent_id)
-
-            # Update the Running BLEU Scorer for this sentence
-            runningBLUE.add_sentence(ref[sent_id], trans)
+    ##
+    # @note: The log is streamed record by record, which also works for
+    # incomplete log files without proper closure braces.
+    # @note: Duplicate sentence IDs are skipped by the reader.
+    for _, sent_id, data in read_accuracy_log(args.accuracy_log, dedup=True):
+        # Decode data to sentence
+        sentence = data.tobytes().decode("utf-8")
+        trans = sentence.split(" ")
+
+        # Update the Running BLEU Scorer for this sentence
+        runningBLUE.add_sentence(ref[sent_id], trans)
 
 
     (bleu, _, _, _, _, _) = runningBLUE.calc_BLEU_score()
@@ -5,8 +5,11 @@ dataset related classes and methods
 # pylint: disable=unused-argument,missing-docstring
 
 import logging
+import os
 import sys
+import tempfile
 import time
+from multiprocessing import shared_memory
 
 import cv2
 import numpy as np
@@ -36,12 +39,97 @@ def usleep(sec):
         time.sleep(sec)
 
 
+class SampleStore():
+    """Preallocated, contiguous [capacity, *sample_shape] array of preprocessed samples.
+
+    Samples are written once into consecutive slots, and `slots[sample_id]`
+    maps a dataset sample id to its slot (-1 when not loaded), so a batch is
+    gathered with a single fancy index. The array lives in process memory, in
+    a named shared memory segment that other processes can `attach` to, or in
+    a memory-mapped file under `mmap_dir`.
+    """
+
+    def __init__(self, capacity, sample_shape, dtype, item_count, shared=False, mmap_dir=None):
+        self.capacity = capacity
+        self.sample_shape = tuple(sample_shape)
+        self.dtype = np.dtype(dtype)
+        self.shm = None
+        self.mmap_file = None
+
+        shape = (capacity,) + self.sample_shape
+        if shared:
+            nbytes = max(int(np.prod(shape)) * self.dtype.itemsize, 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.data = np.ndarray(shape, dtype=self.dtype, buffer=self.shm.buf)
+        elif mmap_dir:
+            fd, self.mmap_file = tempfile.mkstemp(suffix=".npy", dir=mmap_dir)
+            os.close(fd)
+            self.data = np.lib.format.open_memmap(self.mmap_file, mode="w+", dtype=self.dtype, shape=shape)
+        else:
+            self.data = np.empty(shape, dtype=self.dtype)
+
+        self.slots = np.full(item_count, -1, dtype=np.int64)
+        self.num_loaded = 0
+
+    @property
+    def name(self):
+        """Name of the shared memory segment, None unless the store is shared."""
+        return self.shm.name if self.shm else None
+
+    @staticmethod
+    def attach(name, capacity, sample_shape, dtype):
+        """Maps the data of a shared store created in another process. Returns (shm, array)."""
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, np.ndarray((capacity,) + tuple(sample_shape), dtype=np.dtype(dtype), buffer=shm.buf)
+
+    def fits(self, count, sample_shape, dtype):
+        return count <= self.capacity and tuple(sample_shape) == self.sample_shape and np.dtype(dtype) == self.dtype
+
+    def reset(self):
+        self.slots[:] = -1
+        self.num_loaded = 0
+
+    def put(self, sample_id, sample):
+        slot = self.num_loaded
+        self.data[slot] = sample
+        self.slots[sample_id] = slot
+        self.num_loaded += 1
+
+    def remove(self, sample_ids):
+        # The slots are only reused by the next load
+        self.slots[np.asarray(sample_ids, dtype=np.int64)] = -1
+
+    def get_slots(self, sample_ids):
+        slots = self.slots[np.asarray(sample_ids, dtype=np.int64)]
+        if (slots < 0).any():
+            raise KeyError("samples not loaded: {}".format(np.asarray(sample_ids)[slots < 0].tolist()))
+        return slots
+
+    def gather(self, sample_ids, out=None):
+        slots = self.get_slots(sample_ids)
+        if out is None:
+            return self.data[slots]
+        return np.take(self.data, slots, axis=0, out=out[:len(slots)])
+
+    def close(self):
+        self.data = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+        if self.mmap_file is not None:
+            os.remove(self.mmap_file)
+            self.mmap_file = None
+
+
 class Dataset():
     def __init__(self):
         self.arrival = None
         self.image_list = []
         self.label_list = []
-        self.image_list_inmemory = {}
+        self.store = None
+        self.shared_memory = False
+        self.mmap_dir = None
         self.last_loaded = -1
 
     def preprocess(self, use_cache=True):
@@ -53,27 +141,62 @@ class Dataset():
     def get_list(self):
         raise NotImplementedError("Dataset:get_list")
 
+    def set_sample_store(self, shared_memory=False, mmap_dir=None):
+        """Selects where loaded samples are kept: process memory (default), shared memory or a memory-mapped file."""
+        self.shared_memory = shared_memory
+        self.mmap_dir = mmap_dir
+
     def load_query_samples(self, sample_list):
-        self.image_list_inmemory = {}
-        for sample in sample_list:
-            self.image_list_inmemory[sample], _ = self.get_item(sample)
+        for i, sample in enumerate(sample_list):
+            img, _ = self.get_item(sample)
+            if i == 0:
+                self._prepare_store(len(sample_list), img)
+            self.store.put(sample, img)
         self.last_loaded = time.time()
 
+    def _prepare_store(self, count, img):
+        # Reuse the previous allocation when the new set of samples fits in it
+        if self.store is not None and self.store.fits(count, img.shape, img.dtype):
+            self.store.reset()
+            return
+        if self.store is not None:
+            self.store.close()
+        self.store = SampleStore(count, img.shape, img.dtype, self.get_item_count(),
+                                 shared=self.shared_memory, mmap_dir=self.mmap_dir)
+
     def unload_query_samples(self, sample_list):
+        if self.store is None:
+            return
         if sample_list:
-            for sample in sample_list:
-                if sample in self.image_list_inmemory :
-                    del self.image_list_inmemory[sample]
+            self.store.remove(sample_list)
         else:
-            self.image_list_inmemory = {}
+            self.store.reset()
 
-    def get_samples(self, id_list):
-        data = np.array([self.image_list_inmemory[id] for id in id_list])
+    def get_samples(self, id_list, out=None):
+        """Gathers the batch from the sample store. With `out`, the batch is written into out[:len(id_list)]."""
+        data = self.store.gather(id_list, out)
         return data, self.label_list[id_list]
 
+    def staging_buffer(self, batch_size, pin_memory=False):
+        """Returns a reusable [batch_size, *sample_shape] array for get_samples(out=...), optionally in pinned memory."""
+        shape = (batch_size,) + self.store.sample_shape
+        if pin_memory:
+            import torch
+            if torch.cuda.is_available():
+                buffer = torch.empty(shape, dtype=torch.from_numpy(np.empty(0, self.store.dtype)).dtype).pin_memory()
+                return buffer.numpy()
+            log.warning("pinned memory needs a CUDA device, using pageable memory for the staging buffer")
+        return np.empty(shape, dtype=self.store.dtype)
+
     def get_item_loc(self, id):
         raise NotImplementedError("Dataset:get_item_loc")
 
+    def close(self):
+        """Frees the sample store, unlinking its shared memory segment or file if any."""
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
 
 #
 # Post processing
@@ -7,15 +7,16 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
-import array
 import collections
 import json
 import logging
+import multiprocessing
 import os
 import sys
 import threading
 import time
-from queue import Queue
+import traceback
+from queue import Empty, Full, Queue
 
 import mlperf_loadgen as lg
 import numpy as np
@@ -233,11 +234,16 @@ def get_args():
     parser.add_argument("--backend", help="runtime to use")
     parser.add_argument("--model-name", help="name of the mlperf model, ie. resnet50")
     parser.add_argument("--threads", default=os.cpu_count(), type=int, help="threads")
+    parser.add_argument("--runner", choices=["thread", "process"], default="thread",
+                        help="run the MultiStream/Server/Offline workers as threads or as processes with their own backend")
     parser.add_argument("--qps", type=int, help="target qps")
     parser.add_argument("--cache", type=int, default=0, help="use cache")
     parser.add_argument("--cache_dir", type=str, default=None, help="dir path for caching")
     parser.add_argument("--preprocessed_dir", type=str, default=None, help="dir path for storing preprocessed images (overrides cache_dir)")
     parser.add_argument("--use_preprocessed_dataset", action="store_true", help="use preprocessed dataset instead of the original")
+    parser.add_argument("--shared-memory", action="store_true", help="keep the loaded samples in a shared memory segment")
+    parser.add_argument("--mmap-dir", type=str, default=None, help="keep the loaded samples in a memory-mapped file in this dir")
+    parser.add_argument("--pin-memory", action="store_true", help="gather SingleStream batches into a pinned staging buffer (needs torch)")
     parser.add_argument("--accuracy", action="store_true", help="enable accuracy pass")
     parser.add_argument("--find-peak-performance", action="store_true", help="enable finding peak performance pass")
     parser.add_argument("--debug", action="store_true", help="debug, turn traces on")
@@ -308,6 +314,17 @@ def get_backend(backend):
     return backend
 
 
+def setup_backend(args):
+    backend = get_backend(args.backend)
+
+     # If TVM, pass max_batchsize to the backend
+    if args.backend.startswith('tvm'):
+        backend.max_batchsize = args.max_batchsize
+        backend.arena_num = args.threads
+        backend.arena_size = 4
+    return backend
+
+
 class Item:
     """An item that we queue for processing by the thread pool."""
 
@@ -320,7 +337,7 @@ class Item:
 
 
 class RunnerBase:
-    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128):
+    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128, pin_memory=False):
         self.take_accuracy = False
         self.ds = ds
         self.model = model
@@ -329,6 +346,14 @@ class RunnerBase:
         self.take_accuracy = False
         self.max_batchsize = max_batchsize
         self.result_timing = []
+        # Batches are run one at a time here, so a single staging buffer can be reused for all of them
+        self.pin_memory = pin_memory
+        self.staging = None
+
+    def get_samples(self, idx):
+        if self.pin_memory and self.staging is None:
+            self.staging = self.ds.staging_buffer(self.max_batchsize, pin_memory=True)
+        return self.ds.get_samples(idx, out=self.staging)
 
     def handle_tasks(self, tasks_queue):
         pass
@@ -354,25 +379,19 @@ class RunnerBase:
             # since post_process will not run, fake empty responses
             processed_results = [[]] * len(qitem.query_id)
         finally:
-            response_array_refs = []
-            response = []
-            for idx, query_id in enumerate(qitem.query_id):
-                response_array = array.array("B", np.array(processed_results[idx], np.float32).tobytes())
-                response_array_refs.append(response_array)
-                bi = response_array.buffer_info()
-                response.append(lg.QuerySampleResponse(query_id, bi[0], bi[1]))
-            lg.QuerySamplesComplete(response)
-
-    def enqueue(self, query_samples):
-        idx = [q.index for q in query_samples]
-        query_id = [q.id for q in query_samples]
-        if len(query_samples) < self.max_batchsize:
-            data, label = self.ds.get_samples(idx)
+            # The responses point straight at the arrays; loadgen copies what it logs before returning
+            response_arrays = [np.array(processed_results[idx], np.float32) for idx in range(len(qitem.query_id))]
+            lg.QuerySamplesCompleteBuffers(qitem.query_id, response_arrays)
+
+    def enqueue(self, query_id, idx):
+        # query_id and idx are the uint64 arrays handed over by lg.ConstructArraySUT
+        if len(idx) < self.max_batchsize:
+            data, label = self.get_samples(idx)
             self.run_one_item(Item(query_id, idx, data, label))
         else:
             bs = self.max_batchsize
             for i in range(0, len(idx), bs):
-                data, label = self.ds.get_samples(idx[i:i+bs])
+                data, label = self.get_samples(idx[i:i+bs])
                 self.run_one_item(Item(query_id[i:i+bs], idx[i:i+bs], data, label))
 
     def finish(self):
@@ -380,7 +399,8 @@ class RunnerBase:
 
 
 class QueueRunner(RunnerBase):
-    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128):
+    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128, pin_memory=False):
+        # Queued batches are still in use when the next ones are gathered, so every batch gets its own array
         super().__init__(model, ds, threads, post_proc, max_batchsize)
         self.tasks = Queue(maxsize=threads * 4)
         self.workers = []
@@ -403,10 +423,8 @@ class QueueRunner(RunnerBase):
             self.run_one_item(qitem)
             tasks_queue.task_done()
 
-    def enqueue(self, query_samples):
-        idx = [q.index for q in query_samples]
-        query_id = [q.id for q in query_samples]
-        if len(query_samples) < self.max_batchsize:
+    def enqueue(self, query_id, idx):
+        if len(idx) < self.max_batchsize:
             data, label = self.ds.get_samples(idx)
             self.tasks.put(Item(query_id, idx, data, label))
         else:
@@ -424,6 +442,220 @@ class QueueRunner(RunnerBase):
             worker.join()
 
 
+def process_worker(args, model_path, tasks, completions):
+    """Worker process of ProcessRunner: owns a backend and post-processor, reads its inputs from the shared sample store.
+
+    Messages sent on `completions` are tagged with their kind: ("ready", pid) or
+    ("error", pid, traceback) once the model is loaded, ("start", pid, batch_id)
+    when a batch is taken and ("done", pid, batch_id, ...) when it is processed.
+    """
+    pid = os.getpid()
+    try:
+        backend = setup_backend(args)
+        model = backend.load(model_path, inputs=args.inputs, outputs=args.outputs)
+        post_proc = SUPPORTED_DATASETS[args.dataset][2]
+    except Exception:  # pylint: disable=broad-except
+        completions.put(("error", pid, traceback.format_exc()))
+        return
+    shm, store = None, None
+    completions.put(("ready", pid))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        batch_id, query_id, content_id, label, store_info, slots, start = task
+        completions.put(("start", pid, batch_id))
+        if shm is None or shm.name != store_info[0]:
+            if shm is not None:
+                shm.close()
+            shm, store = dataset.SampleStore.attach(*store_info)
+
+        processed_results = []
+        good, total = post_proc.good, post_proc.total
+        try:
+            results = model.predict({model.inputs[0]: store[slots]})
+            processed_results = post_proc(results, content_id, label, {})
+        except Exception as ex:  # pylint: disable=broad-except
+            log.error("process: failed on contentid=%s, %s", content_id, ex)
+            # fake empty responses
+            processed_results = [[]] * len(query_id)
+
+        # Hand the post-processor state of this batch over to the loadgen process
+        content_ids = getattr(post_proc, "content_ids", None)
+        if content_ids is not None:
+            post_proc.content_ids = []
+        responses = [np.array(r, np.float32) for r in processed_results]
+        completions.put(("done", pid, batch_id, query_id, responses, processed_results if args.accuracy else None,
+                         post_proc.good - good, post_proc.total - total, content_ids, start))
+
+    if shm is not None:
+        shm.close()
+
+
+class ProcessRunner(RunnerBase):
+    """Runs inference in `threads` worker processes, each with its own backend instance.
+
+    The loadgen process only resolves sample ids to slots of the shared memory
+    sample store and queues the batches; workers gather their inputs from the
+    store, run predict and the post-processor, and send the responses back.
+    A completion thread in the loadgen process merges the post-processor
+    counters and calls QuerySamplesComplete.
+
+    A worker failing to load its model makes the constructor raise. When a
+    worker dies during the run, the batch it was processing is completed with
+    empty responses; once no worker is left, so are all the pending batches.
+    """
+
+    # seconds between two checks of the worker processes while waiting on them
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, model, ds, threads, post_proc=None, max_batchsize=128, pin_memory=False, args=None, model_path=None):
+        super().__init__(model, ds, threads, post_proc, max_batchsize)
+        # spawn, not fork: the backend runtimes of this process are not fork safe
+        ctx = multiprocessing.get_context("spawn")
+        self.tasks = ctx.Queue(maxsize=threads * 4)
+        self.completions = ctx.Queue()
+        self.workers = []
+        for _ in range(self.threads):
+            worker = ctx.Process(target=process_worker, args=(args, model_path, self.tasks, self.completions))
+            worker.daemon = True
+            self.workers.append(worker)
+            worker.start()
+
+        # batch id -> query ids of the batches queued and not completed yet
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.next_batch_id = 0
+        # worker pid -> id of the batch it is processing
+        self.in_flight = {}
+        self.finishing = False
+        self.broken = False
+
+        # Wait for every worker to load its model before the test starts
+        self.wait_ready()
+        self.completion_thread = threading.Thread(target=self.handle_completions)
+        self.completion_thread.daemon = True
+        self.completion_thread.start()
+
+    def dead_workers(self):
+        return [worker for worker in self.workers if worker.exitcode is not None]
+
+    def terminate(self):
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def wait_ready(self):
+        ready = 0
+        while ready < len(self.workers):
+            try:
+                message = self.completions.get(timeout=self.POLL_INTERVAL)
+            except Empty:
+                dead = self.dead_workers()
+                if dead:
+                    self.terminate()
+                    raise RuntimeError("worker process {} exited with code {} while loading the model".format(
+                        dead[0].pid, dead[0].exitcode))
+                continue
+            if message[0] == "error":
+                self.terminate()
+                raise RuntimeError("worker process {} failed to load the model:\n{}".format(message[1], message[2]))
+            ready += 1
+
+    def complete_empty(self, batch_ids):
+        """Completes the given pending batches with empty responses."""
+        for batch_id in batch_ids:
+            with self.pending_lock:
+                query_id = self.pending.pop(batch_id, None)
+            if query_id is not None:
+                lg.QuerySamplesCompleteBuffers(query_id, [np.array([], np.float32)] * len(query_id))
+
+    def check_workers(self):
+        """Completes the batches that dead workers will never complete."""
+        if self.finishing:
+            return
+        alive = 0
+        for worker in self.workers:
+            if worker.exitcode is None:
+                alive += 1
+            elif worker.pid in self.in_flight:
+                batch_id = self.in_flight.pop(worker.pid)
+                log.error("process: worker %d exited with code %d during batch %d",
+                          worker.pid, worker.exitcode, batch_id)
+                self.complete_empty([batch_id])
+        if alive == 0 and not self.broken:
+            log.error("process: no worker process left, completing all pending queries with empty responses")
+            self.broken = True
+        if self.broken:
+            with self.pending_lock:
+                batch_ids = list(self.pending)
+            self.complete_empty(batch_ids)
+
+    def handle_completions(self):
+        last_check = time.time()
+        while True:
+            if time.time() - last_check >= self.POLL_INTERVAL:
+                self.check_workers()
+                last_check = time.time()
+            try:
+                message = self.completions.get(timeout=self.POLL_INTERVAL)
+            except Empty:
+                continue
+            if message is None:
+                break
+            if message[0] == "start":
+                self.in_flight[message[1]] = message[2]
+                continue
+            pid, batch_id, query_id, responses, processed_results, good, total, content_ids, start = message[1:]
+            self.in_flight.pop(pid, None)
+            with self.pending_lock:
+                if self.pending.pop(batch_id, None) is None:
+                    # already completed with empty responses
+                    continue
+            self.post_process.good += good
+            self.post_process.total += total
+            if content_ids is not None:
+                self.post_process.content_ids.extend(content_ids)
+            if self.take_accuracy:
+                self.post_process.add_results(processed_results)
+            self.result_timing.append(time.time() - start)
+            lg.QuerySamplesCompleteBuffers(query_id, responses)
+
+    def enqueue(self, query_id, idx):
+        store = self.ds.store
+        store_info = (store.name, store.capacity, store.sample_shape, store.dtype.str)
+        bs = self.max_batchsize
+        for i in range(0, len(idx), bs):
+            ie = i + bs
+            with self.pending_lock:
+                batch_id = self.next_batch_id
+                self.next_batch_id += 1
+                self.pending[batch_id] = query_id[i:ie]
+            task = (batch_id, query_id[i:ie], idx[i:ie], self.ds.label_list[idx[i:ie]],
+                    store_info, store.get_slots(idx[i:ie]), time.time())
+            # the queue is bounded, do not wait on it forever once the workers are gone
+            while not self.broken:
+                try:
+                    self.tasks.put(task, timeout=self.POLL_INTERVAL)
+                    break
+                except Full:
+                    pass
+            if self.broken:
+                self.complete_empty([batch_id])
+
+    def finish(self):
+        # exit all processes, then the completion thread
+        self.finishing = True
+        for worker in self.workers:
+            if worker.is_alive():
+                self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.completions.put(None)
+        self.completion_thread.join()
+
+
 def add_results(final_results, name, result_dict, result_list, took, show_accuracy=False):
     percentiles = [50., 80., 90., 95., 99., 99.9]
     buckets = np.percentile(result_list, percentiles).tolist()
@@ -466,13 +698,7 @@ def main():
     log.info(args)
 
     # find backend
-    backend = get_backend(args.backend)
-
-     # If TVM, pass max_batchsize to the backend
-    if args.backend.startswith('tvm'):
-        backend.max_batchsize = args.max_batchsize
-        backend.arena_num = args.threads
-        backend.arena_size = 4
+    backend = setup_backend(args)
 
     # override image format if given
     image_format = args.data_format if args.data_format else backend.image_format()
@@ -499,7 +725,10 @@ def main():
                         preprocessed_dir=args.preprocessed_dir,
                         threads=args.threads,
                         **kwargs)
+    # worker processes read their inputs from the shared sample store
+    ds.set_sample_store(shared_memory=args.shared_memory or args.runner == "process", mmap_dir=args.mmap_dir)
     # load model to backend
+    model_path = os.path.abspath(args.model)
     model = backend.load(args.model, inputs=args.inputs, outputs=args.outputs)
     final_results = {
         "runtime": model.name(),
@@ -545,10 +774,15 @@ def main():
         lg.TestScenario.Server: QueueRunner,
         lg.TestScenario.Offline: QueueRunner
     }
-    runner = runner_map[scenario](model, ds, args.threads, post_proc=post_proc, max_batchsize=args.max_batchsize)
+    if args.runner == "process" and scenario != lg.TestScenario.SingleStream:
+        runner = ProcessRunner(model, ds, args.threads, post_proc=post_proc, max_batchsize=args.max_batchsize,
+                               args=args, model_path=model_path)
+    else:
+        runner = runner_map[scenario](model, ds, args.threads, post_proc=post_proc, max_batchsize=args.max_batchsize,
+                                      pin_memory=args.pin_memory)
 
-    def issue_queries(query_samples):
-        runner.enqueue(query_samples)
+    def issue_queries(query_ids, query_indices):
+        runner.enqueue(query_ids, query_indices)
 
     def flush_queries():
         pass
@@ -591,7 +825,7 @@ def main():
         settings.multi_stream_expected_latency_ns = int(args.max_latency * NANO_SEC)
 
     performance_sample_count = args.performance_sample_count if args.performance_sample_count else min(count, 500)
-    sut = lg.ConstructSUT(issue_queries, flush_queries)
+    sut = lg.ConstructArraySUT(issue_queries, flush_queries)
     qsl = lg.ConstructQSL(count, performance_sample_count, ds.load_query_samples, ds.unload_query_samples)
 
     log.info("starting {}".format(scenario))
@@ -610,7 +844,8 @@ def main():
 
     runner.finish()
     lg.DestroyQSL(qsl)
-    lg.DestroySUT(sut)
+    lg.DestroyArraySUT(sut)
+    ds.close()
 
     #
     # write final results
@@ -11,12 +11,16 @@ from __future__ import unicode_literals
 import argparse
 import json
 import os
+import sys
 
 import numpy as np
 
 from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import AccuracyLogReader
+
 # pylint: disable=missing-docstring
 
 def get_args():
@@ -40,12 +44,11 @@ def main():
     if args.use_inv_map:
         inv_map = [0] + cocoGt.getCatIds() # First label in inv_map is not used
 
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
+    # de-dupe in case loadgen sends the same image multiple times
+    results = AccuracyLogReader(args.mlperf_accuracy_file, np.float32, dedup=True)
 
     detections = []
     image_ids = set()
-    seen = set()
     no_results = 0
     if args.remove_48_empty_images:        
         im_ids = []
@@ -56,18 +59,11 @@ def main():
     else:
         image_map = cocoGt.dataset["images"]
 
-    for j in results:
-        idx = j['qsl_idx']
-        # de-dupe in case loadgen sends the same image multiple times
-        if idx in seen:
-            continue
-        seen.add(idx)
-
+    for _, idx, data in results:
         # reconstruct from mlperf accuracy log
         # what is written by the benchmark is an array of float32's:
         # id, box[0], box[1], box[2], box[3], score, detection_class
         # note that id is a index into instances_val2017.json, not the actual image_id
-        data = np.frombuffer(bytes.fromhex(j['data']), np.float32)
         if len(data) < 7:
             # handle images that had no results
             image = image_map[idx]
@@ -115,10 +111,10 @@ def main():
 
     print("mAP={:.3f}%".format(100. * cocoEval.stats[0]))
     if args.verbose:
-        print("found {} results".format(len(results)))
+        print("found {} results".format(results.num_records))
         print("found {} images".format(len(image_ids)))
         print("found {} images with no results".format(no_results))
-        print("ignored {} dupes".format(len(results) - len(seen)))
+        print("ignored {} dupes".format(results.num_duplicates))
 
 
 if __name__ == "__main__":
@@ -8,10 +8,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
-import json
+import os
+import sys
 
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import AccuracyLogReader
+
 
 # pylint: disable=missing-docstring
 
@@ -40,24 +44,18 @@ def main():
             cols = line.strip().split()
             imagenet.append((cols[0], int(cols[1])))
 
-    with open(args.mlperf_accuracy_file, "r") as f:
-        results = json.load(f)
+    # de-dupe in case loadgen sends the same image multiple times
+    results = AccuracyLogReader(args.mlperf_accuracy_file, dtype_map[args.dtype], dedup=True)
 
     seen = set()
     good = 0
-    for j in results:
-        idx = j['qsl_idx']
-
-        # de-dupe in case loadgen sends the same image multiple times
-        if idx in seen:
-            continue
+    for _, idx, data in results:
         seen.add(idx)
 
         # get the expected label and image
         img, label = imagenet[idx]
 
         # reconstruct label from mlperf accuracy log
-        data = np.frombuffer(bytes.fromhex(j['data']), dtype_map[args.dtype])
         found = int(data[0])
         if label == found:
             good += 1
@@ -67,7 +65,7 @@ def main():
 
     print("accuracy={:.3f}%, good={}, total={}".format(100. * good / len(seen), good, len(seen)))
     if args.verbose:
-        print("found and ignored {} dupes".format(len(results) - len(seen)))
+        print("found and ignored {} dupes".format(results.num_duplicates))
 
 
 if __name__ == "__main__":
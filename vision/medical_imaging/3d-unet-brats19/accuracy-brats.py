@@ -15,17 +15,18 @@
 # limitations under the License.
 
 import argparse
-import json
 import numpy as np
 import os
 import pickle
 import sys
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "nnUnet"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
 
 from multiprocessing import Pool
 from nnunet.evaluation.region_based_evaluation import evaluate_regions, get_brats_regions
 from nnunet.inference.segmentation_export import save_segmentation_nifti_from_softmax
+from accuracy_log import AccuracyLogReader
 
 dtype_map = {
     "int8": np.int8,
@@ -79,24 +80,21 @@ def save_predictions_MLPerf(predictions, output_folder, output_files, dictionari
     del predictions
 
 def load_loadgen_log(log_file, result_dtype, dictionaries):
-    with open(log_file) as f:
-        predictions = json.load(f)
-
-    assert len(predictions) == len(dictionaries), "Number of predictions does not match number of samples in validation set!"
+    predictions = AccuracyLogReader(log_file, result_dtype)
 
     padded_shape = [224, 224, 160]
-    results = [None for i in range(len(predictions))]
-    for prediction in predictions:
-        qsl_idx = prediction["qsl_idx"]
-        assert qsl_idx >= 0 and qsl_idx < len(predictions), "Invalid qsl_idx!"
+    results = [None for i in range(len(dictionaries))]
+    for _, qsl_idx, result in predictions:
+        assert qsl_idx >= 0 and qsl_idx < len(dictionaries), "Invalid qsl_idx!"
         raw_shape = list(dictionaries[qsl_idx]["size_after_cropping"])
         # Remove the padded part
         pad_before = [(p - r) // 2 for p, r in zip(padded_shape, raw_shape)]
         pad_after = [-(p - r - b) for p, r, b in zip(padded_shape, raw_shape, pad_before)]
         result_shape = (4,) + tuple(padded_shape)
-        result = np.frombuffer(bytes.fromhex(prediction["data"]), result_dtype).reshape(result_shape).astype(np.float16)
+        result = result.reshape(result_shape).astype(np.float16)
         results[qsl_idx] = result[:, pad_before[0]:pad_after[0], pad_before[1]:pad_after[1], pad_before[2]:pad_after[2]]
 
+    assert predictions.num_records == len(dictionaries), "Number of predictions does not match number of samples in validation set!"
     assert all([i is not None for i in results]), "Missing some results!"
 
     return results
@@ -17,8 +17,9 @@
 
 
 import argparse
-import json
+import os
 import pickle
+import sys
 import numpy as np
 import nibabel as nib
 import pandas as pd
@@ -26,6 +27,9 @@ import pandas as pd
 from multiprocessing import Pool
 from pathlib import Path
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools", "accuracy_log"))
+from accuracy_log import AccuracyLogReader
+
 
 __doc__ = """
 Check accuracy of inference performed on KiTS19 dataset.
@@ -246,26 +250,21 @@ def load_loadgen_log(log_file, result_dtype, file_list, aux):
     Accuracy log has inference results in bitstream; needs split for each case using shape/dtype
     Format is assumed to be linear
     """
-    with open(log_file) as f:
-        predictions = json.load(f)
-
-    assert len(predictions) == len(aux.keys()),\
-        "Number of predictions does not match number of samples in validation set!"
+    predictions = AccuracyLogReader(log_file, result_dtype)
 
     results = dict()
-    for prediction in predictions:
-        qsl_idx = prediction["qsl_idx"]
+    for _, qsl_idx, result in predictions:
+        assert qsl_idx >= 0 and qsl_idx < len(file_list), "Invalid qsl_idx!"
         case = file_list[qsl_idx]
-        assert qsl_idx >= 0 and qsl_idx < len(predictions), "Invalid qsl_idx!"
         result_shape = np.array(list(aux[case]["image_shape"]))
-        result = np.frombuffer(bytes.fromhex(
-            prediction["data"]), result_dtype).reshape(result_shape)
         results[case] = {
             'qsl_idx': qsl_idx,
-            'prediction': result
+            'prediction': result.reshape(result_shape)
         }
 
-    assert len(results) == len(predictions), "Missing some results!"
+    assert predictions.num_records == len(aux.keys()),\
+        "Number of predictions does not match number of samples in validation set!"
+    assert len(results) == predictions.num_records, "Missing some results!"
 
     return results
 
@@ -44,6 +44,10 @@ class BASE_3DUNET_SUT:
         QSL in the context of LoadGen
     model_path: str or PosixPath object
         path to the model for backend
+    batch_size: int
+        number of sub-volumes gathered into one batch for the backend
+    norm_maps: dict
+        normalization map of every volume shape seen so far
 
     Methods
     -------
@@ -55,6 +59,8 @@ class BASE_3DUNET_SUT:
         performs backend specific inference upon input_tensor
     infer_single_query(data, mystr):
         performs inference upon data and summarize work in mystr
+    get_norm_map(image, norm_patch):
+        returns the normalization map for the shape of image
     issue_queries(query_samples):
         LoadGen calls this with query_samples, a vector containing series of queries
         SUT is to perform each query and calls back to LoadGen with QuerySamplesComplete()
@@ -62,7 +68,7 @@ class BASE_3DUNET_SUT:
         not used
     """
 
-    def __init__(self, preprocessed_data_dir, performance_count):
+    def __init__(self, preprocessed_data_dir, performance_count, batch_size=1):
         """
         Constructs all the necessary attributes for ONNX Runtime specific 3D UNet SUT
         Baseline SUT doesn't instantiate any 3D UNet model; backend specific SUT needs
@@ -74,7 +80,11 @@ class BASE_3DUNET_SUT:
                 path to directory containing preprocessed data
             performance_count: int
                 number of query samples guaranteed to fit in memory
+            batch_size: int
+                number of sub-volumes gathered into one batch for the backend
         """
+        self.batch_size = batch_size
+        self.norm_maps = dict()
         print("Constructing SUT...")
         self.sut = lg.ConstructSUT(self.issue_queries, self.flush_queries)
         print("Finished constructing SUT.")
@@ -117,44 +127,49 @@ class BASE_3DUNET_SUT:
         """
         # prepare arrays
         image = query[np.newaxis, ...]
-        result, norm_map, norm_patch = infu.prepare_arrays(image, ROI_SHAPE)
-        t_image, t_result, t_norm_map, t_norm_patch =\
-            self.to_tensor(image), self.to_tensor(result), self.to_tensor(
-                norm_map), self.to_tensor(norm_patch)
-
-        # sliding window inference
-        subvol_cnt = 0
-        for i, j, k in infu.get_slice_for_sliding_window(t_image, ROI_SHAPE, SLIDE_OVERLAP_FACTOR):
-            subvol_cnt += 1
-            result_slice = t_result[
-                ...,
-                i:(ROI_SHAPE[0] + i),
-                j:(ROI_SHAPE[1] + j),
-                k:(ROI_SHAPE[2] + k)]
-
-            input_slice = t_image[
-                ...,
-                i:(ROI_SHAPE[0] + i),
-                j:(ROI_SHAPE[1] + j),
-                k:(ROI_SHAPE[2] + k)]
-
-            norm_map_slice = t_norm_map[
-                ...,
-                i:(ROI_SHAPE[0] + i),
-                j:(ROI_SHAPE[1] + j),
-                k:(ROI_SHAPE[2] + k)]
-
-            result_slice += self.do_infer(input_slice) * t_norm_patch
-
-            norm_map_slice += t_norm_patch
-
-        result, norm_map = self.from_tensor(
-            t_result), self.from_tensor(t_norm_map)
+        result, _, norm_patch = infu.prepare_arrays(image, ROI_SHAPE)
+        norm_map = self.get_norm_map(image, norm_patch)
+        t_result, t_norm_patch = self.to_tensor(result), self.to_tensor(norm_patch)
+
+        # sliding window inference, batch_size sub-volumes at a time
+        slices = list(infu.get_slice_for_sliding_window(image, ROI_SHAPE, SLIDE_OVERLAP_FACTOR))
+        subvol_cnt = len(slices)
+        for start in range(0, subvol_cnt, self.batch_size):
+            batch_slices = slices[start:start + self.batch_size]
+            input_batch = np.concatenate([
+                image[
+                    ...,
+                    i:(ROI_SHAPE[0] + i),
+                    j:(ROI_SHAPE[1] + j),
+                    k:(ROI_SHAPE[2] + k)] for i, j, k in batch_slices])
+            output_batch = self.do_infer(self.to_tensor(input_batch))
+
+            for n, (i, j, k) in enumerate(batch_slices):
+                result_slice = t_result[
+                    ...,
+                    i:(ROI_SHAPE[0] + i),
+                    j:(ROI_SHAPE[1] + j),
+                    k:(ROI_SHAPE[2] + k)]
+
+                result_slice += output_batch[n:n + 1] * t_norm_patch
+
+        result = self.from_tensor(t_result)
 
         final_result = infu.finalize(result, norm_map)
         mystr += ", {:3} sub-volumes".format(subvol_cnt)
         return final_result, mystr
 
+    def get_norm_map(self, image, norm_patch):
+        """
+        Returns the normalization map for the shape of image, computed on its first use
+        The map has a single channel, so that the maps of all the volume shapes take
+        no more memory than the single channel volumes themselves
+        """
+        if image.shape not in self.norm_maps:
+            self.norm_maps[image.shape] = infu.prepare_norm_map(
+                image, norm_patch, ROI_SHAPE, SLIDE_OVERLAP_FACTOR)
+        return self.norm_maps[image.shape]
+
     def issue_queries(self, query_samples):
         """
         LoadGen calls this with query_samples, a vector containing series of queries
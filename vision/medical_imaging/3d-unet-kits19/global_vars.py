@@ -36,6 +36,9 @@ __all__ = [
     'TARGET_SPACING',
     'ROI_SHAPE',
     'SLIDE_OVERLAP_FACTOR',
+    'PACKED_VOLUME_FILE',
+    'PACKED_INDEX_FILE',
+    'PACKED_ALIGNMENT',
 ]
 
 # file pointers and sanity checks
@@ -52,6 +55,11 @@ assert CALIBRATION_CASE_FILE.is_file(), 'calibration_cases.json is not found'
 assert CHECKSUM_INFER_FILE.is_file(), 'checksum_inference.json is not found'
 assert CHECKSUM_CALIB_FILE.is_file(), 'checksum_calibration.json is not found'
 
+# packed volume file preprocess.py optionally writes for memory-mapped QSL
+PACKED_VOLUME_FILE = 'preprocessed_volumes.bin'
+PACKED_INDEX_FILE = 'preprocessed_volumes.pkl'
+PACKED_ALIGNMENT = 4096
+
 # cases used for inference and calibration
 TARGET_CASES = json.load(open(INFERENCE_CASE_FILE))
 CALIB_CASES = json.load(open(CALIBRATION_CASE_FILE))
@@ -40,6 +40,9 @@ finalize(image, norm_map):
 prepare_arrays(image, roi_shape):
     returns empty arrays required for sliding window inference upon roi_shape
 
+prepare_norm_map(image, norm_patch, roi_shape, overlap):
+    returns the sum of norm_patch over all the sub-volumes of the sliding window
+
 get_slice_for_sliding_window(image, roi_shape, overlap):
     returns indices for image stride, to fulfill sliding window inference
 
@@ -116,6 +119,23 @@ def prepare_arrays(image, roi_shape=ROI_SHAPE):
     return result, norm_map, norm_patch
 
 
+def prepare_norm_map(image, norm_patch, roi_shape=ROI_SHAPE, overlap=SLIDE_OVERLAP_FACTOR):
+    """
+    Returns the sum of norm_patch over all the sub-volumes of the sliding window
+    It only depends on the shape of image, and has a single channel that broadcasts
+    over the channels of the result
+    """
+    norm_map = np.zeros(shape=(1, 1, *image.shape[2:]), dtype=norm_patch.dtype)
+    for i, j, k in get_slice_for_sliding_window(image, roi_shape, overlap):
+        norm_map[
+            ...,
+            i:(roi_shape[0] + i),
+            j:(roi_shape[1] + j),
+            k:(roi_shape[2] + k)] += norm_patch
+
+    return norm_map
+
+
 def get_slice_for_sliding_window(image, roi_shape=ROI_SHAPE, overlap=SLIDE_OVERLAP_FACTOR):
     """
     Returns indices for image stride, to fulfill sliding window inference
@@ -17,10 +17,14 @@
 
 import pickle
 
+import numpy as np
+
 from pathlib import Path
 
 import mlperf_loadgen as lg
 
+from global_vars import PACKED_VOLUME_FILE, PACKED_INDEX_FILE
+
 
 class KiTS_2019_QSL:
     """
@@ -38,11 +42,16 @@ class KiTS_2019_QSL:
         total number of KiTS19 cases used in inference
     perf_count: int
         number of KiTS19 cases (or query samples) guaranteed to fit in memory
+    packed_volumes: np.memmap or None
+        preprocessed_volumes.bin mapped read-only, if preprocess.py packed the images
+    packed_index: dict
+        case -> (offset, shape) of its image in packed_volumes
 
     Methods
     -------
     load_query_samples(sample_list):
         opens preprocessed files (or query samples) and loads them into memory
+        with packed volumes, maps them instead and pages them in
     unload_query_samples(self, sample_list):
         deletes loaded query samples from memory
     get_features(self, sample_id):
@@ -70,11 +79,42 @@ class KiTS_2019_QSL:
         print("Found {:d} preprocessed files".format(self.count))
         print("Using performance count = {:d}".format(self.perf_count))
 
+        self.packed_volumes = None
+        self.packed_index = {}
+        packed_index_path = Path(self.preprocessed_data_dir, PACKED_INDEX_FILE)
+        if packed_index_path.is_file():
+            with open(packed_index_path, "rb") as f:
+                packed = pickle.load(f)
+            stale_file = self.find_stale_packed_volume(packed)
+            if stale_file is None:
+                self.packed_index = packed['volumes']
+                self.packed_volumes = np.memmap(Path(self.preprocessed_data_dir, PACKED_VOLUME_FILE),
+                                                dtype=np.uint8, mode="r")
+                self.packed_dtype = np.dtype(packed['dtype'])
+                print("Using packed volumes in {:}".format(PACKED_VOLUME_FILE))
+            else:
+                print("WARNING: {:} does not match {:}.pkl, loading the preprocessed pickles instead; "
+                      "rerun preprocess.py with --mode pack to repack".format(PACKED_VOLUME_FILE, stale_file))
+
         self.loaded_files = {}
         self.qsl = lg.ConstructQSL(
             self.count, self.perf_count, self.load_query_samples, self.unload_query_samples)
         print("Finished constructing QSL.")
 
+    def find_stale_packed_volume(self, packed):
+        """
+        Returns the first preprocessed file whose pickle differs in size or modification time from
+        the one that was packed, or is missing from the pack; None if the pack is up to date
+        """
+        sources = packed.get('sources', {})
+        for file_name in self.preprocess_files:
+            if file_name not in packed['volumes'] or file_name not in sources:
+                return file_name
+            stat = Path(self.preprocessed_data_dir, "{:}.pkl".format(file_name)).stat()
+            if (stat.st_size, stat.st_mtime_ns) != tuple(sources[file_name]):
+                return file_name
+        return None
+
     def load_query_samples(self, sample_list):
         """
         Opens preprocessed files (or query samples) and loads them into memory
@@ -82,9 +122,24 @@ class KiTS_2019_QSL:
         for sample_id in sample_list:
             file_name = self.preprocess_files[sample_id]
             print("Loading file {:}".format(file_name))
+            if self.packed_volumes is not None:
+                self.loaded_files[sample_id] = self.map_packed_volume(file_name)
+                continue
             with open(Path(self.preprocessed_data_dir, "{:}.pkl".format(file_name)), "rb") as f:
                 self.loaded_files[sample_id] = pickle.load(f)[0]
 
+    def map_packed_volume(self, file_name):
+        """
+        Returns the image of file_name as a read-only view of the packed volumes, with its pages read in
+        Processes mapping the same file share one copy of it in the page cache
+        """
+        offset, shape = self.packed_index[file_name]
+        size = int(np.prod(shape)) * self.packed_dtype.itemsize
+        volume = self.packed_volumes[offset:offset + size]
+        # one byte per page is enough to fault the whole volume in before the timed run
+        volume[::4096].sum()
+        return volume.view(self.packed_dtype).reshape(shape)
+
     def unload_query_samples(self, sample_list):
         """
         Deletes loaded query samples from memory
@@ -45,7 +45,7 @@ class _3DUNET_ONNXRuntime_SUT(BASE_3DUNET_SUT):
         Perform inference upon input_tensor with ONNX Runtime
     """
 
-    def __init__(self, model_path, preprocessed_data_dir, performance_count):
+    def __init__(self, model_path, preprocessed_data_dir, performance_count, batch_size=1):
         """
         Constructs all the necessary attributes for ONNX Runtime specific 3D UNet SUT
 
@@ -57,8 +57,10 @@ class _3DUNET_ONNXRuntime_SUT(BASE_3DUNET_SUT):
                 path to directory containing preprocessed data
             performance_count: int
                 number of query samples guaranteed to fit in memory            
+            batch_size: int
+                number of sub-volumes gathered into one batch for the backend
         """
-        super().__init__(preprocessed_data_dir, performance_count)
+        super().__init__(preprocessed_data_dir, performance_count, batch_size)
         print("Loading ONNX model...")
         assert Path(model_path).is_file(
         ), "Cannot find the model file {:}!".format(model_path)
@@ -72,11 +74,11 @@ class _3DUNET_ONNXRuntime_SUT(BASE_3DUNET_SUT):
         """
         Perform inference upon input_tensor with ONNX Runtime
         """
-        return self.sess.run(["output"], {"input": input_tensor})[0].squeeze(0)
+        return self.sess.run(["output"], {"input": input_tensor})[0]
 
 
-def get_sut(model_path, preprocessed_data_dir, performance_count):
+def get_sut(model_path, preprocessed_data_dir, performance_count, batch_size=1):
     """
     Redirect the call for instantiating SUT to ONNX Runtime specific SUT
     """
-    return _3DUNET_ONNXRuntime_SUT(model_path, preprocessed_data_dir, performance_count)
+    return _3DUNET_ONNXRuntime_SUT(model_path, preprocessed_data_dir, performance_count, batch_size)
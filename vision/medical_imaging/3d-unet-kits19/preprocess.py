@@ -53,6 +53,10 @@ Verify MD5 hashes stored from original run for data integrity check on inference
 Verify MD5 hashes stored from original run for data integrity check on calibration dataset
     python3 preprocess.py --raw_data_dir $(RAW_DATA_DIR) --results_dir $(PREPROCESSED_DATA_DIR) --mode verify --calibration
 
+Pack the preprocessed images of an already preprocessed dataset into a single memory-mappable volume file
+    python3 preprocess.py --raw_data_dir $(RAW_DATA_DIR) --results_dir $(PREPROCESSED_DATA_DIR) --mode pack
+
+Optionally, add --packed to --mode preprocess to pack the preprocessed images as well
 Optionally, add -num_proc=$(NUMBER_PROCESSES) to use as many processes as $(NUMBER_PROCESSES) to shorten the turnaround time
 """
 
@@ -486,6 +490,54 @@ def preprocess_with_multiproc(args):
     save_preprocessed_info(preproc.results_dir, aux, preproc.target_cases)
     p.join()
     p.close()
+    if args.packed:
+        pack_preprocessed_volumes(preproc.results_dir)
+    else:
+        remove_packed_volumes(preproc.results_dir)
+
+
+def pack_preprocessed_volumes(preproc_dir):
+    """
+    Packs the preprocessed images of all the cases in preprocessed_files.pkl into preprocessed_volumes.bin
+    Every image starts at a multiple of PACKED_ALIGNMENT bytes so that it can be mapped as is
+    Offset and shape of every image are saved into preprocessed_volumes.pkl, along with the size and
+    modification time of the case pickle it was packed from, so that a stale pack can be detected
+    """
+    with open(os.path.join(preproc_dir, 'preprocessed_files.pkl'), 'rb') as f:
+        file_list = pickle.load(f)['file_list']
+    index = {
+        'dtype': np.dtype(np.float32).str,
+        'alignment': PACKED_ALIGNMENT,
+        'volumes': dict(),
+        'sources': dict()
+    }
+    packed_file_path = os.path.join(preproc_dir, PACKED_VOLUME_FILE)
+    print(f"Packing preprocessed images into {packed_file_path}...")
+    with open(packed_file_path, 'wb') as packed:
+        for case in file_list:
+            case_file_path = os.path.join(preproc_dir, f"{case}.pkl")
+            with open(case_file_path, 'rb') as f:
+                image = pickle.load(f)[0].astype(np.float32, copy=False)
+            stat = os.stat(case_file_path)
+            index['sources'][case] = (stat.st_size, stat.st_mtime_ns)
+            offset = -(-packed.tell() // PACKED_ALIGNMENT) * PACKED_ALIGNMENT
+            packed.seek(offset)
+            packed.write(np.ascontiguousarray(image).tobytes())
+            index['volumes'][case] = (offset, image.shape)
+    with open(os.path.join(preproc_dir, PACKED_INDEX_FILE), 'wb') as f:
+        pickle.dump(index, f)
+    print(f"Packed {len(file_list)} images into {packed_file_path}")
+
+
+def remove_packed_volumes(preproc_dir):
+    """
+    Removes packed images left over from an earlier run, as they no longer match the case pickles
+    """
+    for file_name in [PACKED_INDEX_FILE, PACKED_VOLUME_FILE]:
+        file_path = os.path.join(preproc_dir, file_name)
+        if os.path.isfile(file_path):
+            print(f"Removing stale {file_path}")
+            os.remove(file_path)
 
 
 def generate_hash_from_volume(vol_path):
@@ -584,15 +636,20 @@ def parse_args():
                         help="Dir to store preprocessed data")
     PARSER.add_argument('--mode',
                         dest='mode',
-                        choices=["preprocess", "verify", "gen_hash"],
+                        choices=["preprocess", "verify", "gen_hash", "pack"],
                         default="preprocess",
                         help="""preprocess for generating inference dataset, 
                                 gen_hash for generating new checksum file, 
-                                verify for verifying the checksums against stored checksum file""")
+                                verify for verifying the checksums against stored checksum file, 
+                                pack for packing preprocessed images into a single volume file""")
     PARSER.add_argument('--calibration',
                         dest='calibration',
                         action='store_true',
                         help="Preprocess calibration dataset instead of inference dataset")
+    PARSER.add_argument('--packed',
+                        dest='packed',
+                        action='store_true',
+                        help="Also pack preprocessed images into a single volume file the QSL can memory-map")
     PARSER.add_argument('--num_proc',
                         dest='num_proc',
                         type=int,
@@ -621,6 +678,9 @@ def main():
     if args.mode == "verify":
         verify_dataset(args)
 
+    if args.mode == "pack":
+        pack_preprocessed_volumes(args.results_dir)
+
 
 if __name__ == '__main__':
     main()
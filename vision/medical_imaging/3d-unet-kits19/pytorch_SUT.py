@@ -52,7 +52,7 @@ class _3DUNET_PyTorch_SUT(BASE_3DUNET_SUT):
         Perform inference upon input_tensor with PyTorch/TorchScript
     """
 
-    def __init__(self, model_path, preprocessed_data_dir, performance_count):
+    def __init__(self, model_path, preprocessed_data_dir, performance_count, batch_size=1):
         """
         Constructs all the necessary attributes for PyTorch/TorchScript specific 3D UNet SUT
 
@@ -64,8 +64,10 @@ class _3DUNET_PyTorch_SUT(BASE_3DUNET_SUT):
                 path to directory containing preprocessed data
             performance_count: int
                 number of query samples guaranteed to fit in memory                
+            batch_size: int
+                number of sub-volumes gathered into one batch for the backend
         """
-        super().__init__(preprocessed_data_dir, performance_count)
+        super().__init__(preprocessed_data_dir, performance_count, batch_size)
         print("Loading PyTorch model...")
         assert Path(model_path).is_file(
         ), "Cannot find the model file {:}!".format(model_path)
@@ -94,8 +96,8 @@ class _3DUNET_PyTorch_SUT(BASE_3DUNET_SUT):
         return my_tensor.cpu().numpy().astype(float)
 
 
-def get_sut(model_path, preprocessed_data_dir, performance_count):
+def get_sut(model_path, preprocessed_data_dir, performance_count, batch_size=1):
     """
     Redirect the call for instantiating SUT to PyTorch/TorchScript specific SUT
     """
-    return _3DUNET_PyTorch_SUT(model_path, preprocessed_data_dir, performance_count)
+    return _3DUNET_PyTorch_SUT(model_path, preprocessed_data_dir, performance_count, batch_size)
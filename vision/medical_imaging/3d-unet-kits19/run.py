@@ -51,10 +51,13 @@ Performance run can be more specific as:
                     --mlperf_conf=$(MLPERF_CONF)
                     --user_conf=$(USER_CONF)
                     --performance_count=$(PERF_CNT)
+                    --batch_size=$(BATCH_SIZE)
 
 $(MLPERF_CONF) contains various configurations MLPerf-Inference needs and used to configure LoadGen
 $(USER_CONF) contains configurations such as target QPS for LoadGen and overrides part of $(MLPERF_CONF)
 $(PERF_CNT) sets number of query samples guaranteed to fit in memory
+$(BATCH_SIZE) sets number of sub-volumes of the sliding window inferred together;
+    onnxruntime needs the dynamic batch size model for a batch size above 1
 
 More info for the above LoadGen related configs can be found at:
 https://github.com/mlcommons/inference/tree/master/loadgen
@@ -98,6 +101,10 @@ def get_args():
                         type=int,
                         default=None,
                         help="performance count")
+    parser.add_argument("--batch_size",
+                        type=int,
+                        default=1,
+                        help="number of sub-volumes of the sliding window inferred together")
     args = parser.parse_args()
     return args
 
@@ -135,7 +142,7 @@ def main():
     else:
         raise ValueError("Unknown backend: {:}".format(args.backend))
     sut = get_sut(args.model, args.preprocessed_data_dir,
-                  args.performance_count)
+                  args.performance_count, args.batch_size)
 
     # setup LoadGen
     settings = lg.TestSettings()
@@ -46,7 +46,7 @@ class _3DUNET_TensorFlow_SUT(BASE_3DUNET_SUT):
         Perform inference upon input_tensor with TensorFlow
     """
 
-    def __init__(self, model_path, preprocessed_data_dir, performance_count):
+    def __init__(self, model_path, preprocessed_data_dir, performance_count, batch_size=1):
         """
         Constructs all the necessary attributes for TensorFlow specific 3D UNet SUT
 
@@ -58,8 +58,10 @@ class _3DUNET_TensorFlow_SUT(BASE_3DUNET_SUT):
                 path to directory containing preprocessed data
             performance_count: int
                 number of query samples guaranteed to fit in memory
+            batch_size: int
+                number of sub-volumes gathered into one batch for the backend
         """
-        super().__init__(preprocessed_data_dir, performance_count)
+        super().__init__(preprocessed_data_dir, performance_count, batch_size)
         print("Loading TensorFlow model...")
         assert Path(model_path, "saved_model.pb").is_file(),\
             "Cannot find the model file {:}!".format(model_path)
@@ -74,8 +76,8 @@ class _3DUNET_TensorFlow_SUT(BASE_3DUNET_SUT):
         return self.model(tf.constant(input_tensor))[self.output_name].numpy()
 
 
-def get_sut(model_path, preprocessed_data_dir, performance_count):
+def get_sut(model_path, preprocessed_data_dir, performance_count, batch_size=1):
     """
     Redirect the call for instantiating SUT to TensorFlow specific SUT
     """
-    return _3DUNET_TensorFlow_SUT(model_path, preprocessed_data_dir, performance_count)
+    return _3DUNET_TensorFlow_SUT(model_path, preprocessed_data_dir, performance_count, batch_size)